@@ -0,0 +1,107 @@
+import json
+import os
+import re
+
+# Budget de tokens du prompt par requête (historique ReAct complet)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+
+# Taille maximale d'un résultat d'outil générique une fois compacté
+COMPACT_MAX_CHARS = 600
+
+# Approximation tiktoken cl100k : ~4 caractères par token, + surcoût fixe par message
+CHARS_PAR_TOKEN = 4
+TOKENS_PAR_MESSAGE = 4
+
+LIEN_PATTERN = re.compile(r"\[([^\]]+)\]\((https?://[^)]+)\)")
+# Ligne de vol du résumé de rechercher_vols : "[V1] Air France 612 EUR, ..."
+VOL_PATTERN = re.compile(r"^\[V\d+\]")
+
+# --- RÉSUMÉS STRUCTURÉS ---
+
+def _texte_brut(contenu: str) -> str:
+    contenu = re.sub(r"[*#_`>]+", "", contenu)
+    return " ".join(contenu.split())
+
+def resumer_vols(contenu: str) -> str:
+    """Résumé de rechercher_vols réduit à l'en-tête et aux lignes de vols identifiées."""
+    lignes = contenu.splitlines()
+    vols = [ligne for ligne in lignes if VOL_PATTERN.match(ligne)]
+    if not vols:
+        return resumer_generique(contenu)
+    return "\n".join([lignes[0], *vols])
+
+def resumer_liens(contenu: str) -> str:
+    """Liste de liens web réduite à titre court + URL."""
+    liens = LIEN_PATTERN.findall(contenu)
+    if not liens:
+        return resumer_generique(contenu)
+    return "\n".join(f"{titre[:60]}: {url}" for titre, url in liens)
+
+def resumer_generique(contenu: str) -> str:
+    texte = _texte_brut(contenu)
+    return texte if len(texte) <= COMPACT_MAX_CHARS else texte[:COMPACT_MAX_CHARS] + "…"
+
+RESUMEURS = {
+    "rechercher_vols": resumer_vols,
+    "rechercher_infos_voyage": resumer_liens,
+}
+
+# --- GESTIONNAIRE DE CONTEXTE ---
+
+class GestionnaireContexte:
+    """Historique de la boucle ReAct sous budget de tokens.
+
+    Les résultats d'outils déjà lus par le modèle sont remplacés par un résumé
+    structuré, de sorte que le prompt ne grossit pas à chaque itération.
+    """
+
+    def __init__(self, messages: list, budget: int = CONTEXT_TOKEN_BUDGET):
+        self.messages = list(messages)
+        self.budget = budget
+        self._lus = 0
+        self._compactes = set()
+
+    @staticmethod
+    def estimer_tokens(message) -> int:
+        contenu = message.get("content") or ""
+        if message.get("tool_calls"):
+            contenu += json.dumps(message["tool_calls"], ensure_ascii=False)
+        return TOKENS_PAR_MESSAGE + len(contenu) // CHARS_PAR_TOKEN
+
+    def tokens_estimes(self) -> int:
+        return sum(self.estimer_tokens(m) for m in self.messages)
+
+    def ajouter(self, *messages):
+        self.messages.extend(messages)
+
+    def marquer_lus(self):
+        """À appeler après chaque réponse du modèle : tout l'historique actuel a été lu."""
+        self._lus = len(self.messages)
+
+    def _compacter(self, index: int):
+        message = self.messages[index]
+        resumeur = RESUMEURS.get(message.get("name"), resumer_generique)
+        resume = resumeur(message["content"])
+        if len(resume) < len(message["content"]):
+            self.messages[index] = {**message, "content": resume}
+        self._compactes.add(index)
+
+    def messages_pour_llm(self) -> list:
+        """Historique à envoyer : résultats lus compactés, puis compactage forcé si le budget est dépassé."""
+        for i in range(self._lus):
+            if self.messages[i].get("role") == "tool" and i not in self._compactes:
+                self._compacter(i)
+
+        if self.tokens_estimes() > self.budget:
+            for i, message in enumerate(self.messages):
+                if message.get("role") == "tool" and i not in self._compactes:
+                    self._compacter(i)
+                    if self.tokens_estimes() <= self.budget:
+                        break
+        return self.messages
+
+    def journaliser(self, iteration: int, usage=None):
+        estimes = self.tokens_estimes()
+        reels = f", {usage.prompt_tokens} réels" if usage else ""
+        alerte = " ⚠️ budget dépassé" if estimes > self.budget else ""
+        print(f"📏 Contexte itération {iteration} : ~{estimes} tokens estimés{reels} (budget {self.budget}){alerte}")
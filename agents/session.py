@@ -0,0 +1,94 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from core.flight_records import RechercheVols, enregistrer_recherche
+
+# --- CONFIGURATION ---
+
+# Durée (secondes) pendant laquelle un résultat d'outil de la session est réutilisé
+SESSION_TTL = float(os.getenv("SESSION_TTL", "900"))
+# Résultats d'outils conservés par session (les plus anciens sont oubliés)
+SESSION_MAX_OUTILS = 32
+# Résultats d'outils dégradés (échec, donnée introuvable, outil non configuré) : jamais réutilisés
+RESULTATS_DEGRADES = ("Erreur", "❌", "Météo introuvable", "Pas de clé API")
+
+# Champs comparés entre deux demandes (chemin dans VoyageRequest)
+CHAMPS_VOYAGE = (
+    "origin", "destination", "dates", "voyageurs.adultes", "voyageurs.enfants",
+    "preferences.style", "preferences.budget", "etapes"
+)
+# Un changement de trajet rend le plan précédent inutilisable comme base
+CHAMPS_REPLANIFICATION_COMPLETE = ("origin", "destination", "etapes")
+
+def _valeur(voyage, chemin: str):
+    for attribut in chemin.split("."):
+        voyage = getattr(voyage, attribut)
+    return voyage
+
+# --- SESSION ---
+
+class SessionPlanification:
+    """Mémoire d'un utilisateur entre deux demandes : dernière demande, dernier plan et
+    résultats d'outils indexés par (outil, arguments).
+
+    Passée à TravelAgent à chaque appel (l'agent, partagé, ne garde aucun état par requête).
+    """
+
+    def __init__(self, ttl: float = SESSION_TTL):
+        self.ttl = ttl
+        self.voyage = None
+        self.plan = None
+        self._outils = OrderedDict()
+
+    @staticmethod
+    def cle(fn_name: str, fn_args: dict) -> str:
+        return f"{fn_name}:{json.dumps(fn_args, sort_keys=True, ensure_ascii=False)}"
+
+    def champs_modifies(self, voyage) -> dict:
+        """{champ: (ancienne valeur, nouvelle valeur)} par rapport à la demande précédente."""
+        if self.voyage is None:
+            return {}
+        return {
+            champ: (_valeur(self.voyage, champ), _valeur(voyage, champ))
+            for champ in CHAMPS_VOYAGE
+            if _valeur(self.voyage, champ) != _valeur(voyage, champ)
+        }
+
+    def peut_editer(self, champs: dict) -> bool:
+        """Vrai si le plan précédent peut servir de base (même trajet)."""
+        return self.plan is not None and not any(c in champs for c in CHAMPS_REPLANIFICATION_COMPLETE)
+
+    def connait(self, fn_name: str, fn_args: dict) -> bool:
+        entree = self._outils.get(self.cle(fn_name, fn_args))
+        return entree is not None and time.monotonic() - entree[0] < self.ttl
+
+    def memoriser(self, fn_name: str, fn_args: dict, resultat: str, recherches: list):
+        """Garde le résultat d'un outil (et ses recherches de vols) s'il a abouti : ni les échecs,
+        ni les résultats dégradés (vols estimés faute de fournisseur, aucun vol trouvé)."""
+        if str(resultat).startswith(RESULTATS_DEGRADES):
+            return
+        if any(r.estimation or not r.vols for r in recherches):
+            return
+        cle = self.cle(fn_name, fn_args)
+        self._outils[cle] = (time.monotonic(), resultat, [r.to_dict() for r in recherches])
+        self._outils.move_to_end(cle)
+        while len(self._outils) > SESSION_MAX_OUTILS:
+            self._outils.popitem(last=False)
+
+    def rejouer(self, fn_name: str, fn_args: dict):
+        """Résultat mémorisé, ou None. Les vols sont réenregistrés pour la requête en cours :
+        le résumé est reconstruit avec leurs nouveaux identifiants ([V1]...)."""
+        if not self.connait(fn_name, fn_args):
+            return None
+        _, resultat, recherches = self._outils[self.cle(fn_name, fn_args)]
+        if recherches:
+            resultat = "\n\n".join(
+                enregistrer_recherche(RechercheVols.depuis_dict(r)).resume() for r in recherches
+            )
+        return resultat
+
+    def terminer(self, voyage, plan: str):
+        """Demande et plan de référence pour la prochaine modification."""
+        self.voyage = voyage
+        self.plan = plan
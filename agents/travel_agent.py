@@ -1,41 +1,268 @@
+import asyncio
 import json
-import datetime
-from openai import OpenAI
-from core.parse_input import analyze_travel_request
-from core.tools import AVAILABLE_TOOLS_MAP, TRAVEL_TOOL_SCHEMAS
+import queue
+import time
+from agents.context_manager import RESUMEURS, GestionnaireContexte, resumer_generique
+from core.boucle import boucle_partagee
+from core.parse_input import analyze_travel_request_async
+from core.flight_records import collecter_vols, ecouter_vols_partiels, file_vols_partiels, suivre_recherches
+from core.http import get_openai_async, limite_fournisseur_async
+from core.itineraire import ordonner_etapes, troncons
+from core.tracing import nouvelle_trace, span
+from core.tools import ASYNC_TOOLS_MAP, TRAVEL_TOOL_SCHEMAS
+
+# Délai maximal (secondes) par outil ; les vols ont déjà leur propre deadline fournisseurs
+TOOL_TIMEOUTS = {
+    "rechercher_vols": 20,
+    "consulter_meteo": 10,
+    "rechercher_infos_voyage": 10
+}
+DEFAULT_TOOL_TIMEOUT = 15
+
+# Attente max. (secondes) d'un résultat partiel avant de revérifier la fin des outils
+SONDE_OUTILS = 0.1
+
+# Messages d'étape affichés quand l'agent lance réellement un outil
+TOOL_STAGE_MESSAGES = {
+    "rechercher_vols": "✈️ Recherche des vols (Skyscanner/Google Flights)...",
+    "consulter_meteo": "⛅ Vérification de la météo...",
+    "rechercher_infos_voyage": "🔎 Recherche d'activités et d'hébergements...",
+    "itineraire": "🗺️ Optimisation de l'ordre des étapes..."
+}
+
+# "prefetch" : outils obligatoires lancés d'emblée, en parallèle, et injectés dans le premier prompt
+# "react" : le modèle demande lui-même chaque outil (boucle ReAct libre)
+PLANNING_MODES = ("prefetch", "react")
 
 class TravelAgent:
-    def __init__(self):
-        self.client = OpenAI()
+    """Pipeline asynchrone (process_request_async) ; les méthodes synchrones en sont des
+    enveloppes qui s'exécutent sur la boucle partagée du processus.
+
+    Une même instance peut servir des requêtes concurrentes : elle ne garde aucun état par requête.
+    """
+
+    def __init__(self, planning_mode: str = "prefetch"):
+        if planning_mode not in PLANNING_MODES:
+            raise ValueError(f"Mode de planification inconnu : {planning_mode}")
+        self.planning_mode = planning_mode
+
+    def process_request(self, user_input: str, session=None):
+        """Version bloquante : consomme le flux d'événements et renvoie le résultat final."""
+        result = None
+        for event in self.process_request_stream(user_input, session):
+            if event["type"] == "done":
+                result = event["result"]
+        return result
+
+    def process_request_stream(self, user_input: str, session=None):
+        """Version synchrone de process_request_stream_async (mêmes événements)."""
+        evenements = queue.Queue()
+
+        async def relayer():
+            try:
+                async for event in self.process_request_stream_async(user_input, session):
+                    evenements.put(event)
+            finally:
+                evenements.put(None)
+
+        future = asyncio.run_coroutine_threadsafe(relayer(), boucle_partagee())
+        try:
+            while (event := evenements.get()) is not None:
+                yield event
+            future.result()
+        finally:
+            # Consommateur parti avant la fin (ex: rerun Streamlit) : la requête est annulée
+            future.cancel()
+
+    async def process_request_async(self, user_input: str, session=None):
+        result = None
+        async for event in self.process_request_stream_async(user_input, session):
+            if event["type"] == "done":
+                result = event["result"]
+        return result
+
+    async def process_request_stream_async(self, user_input: str, session=None):
+        """Génère le plan sous forme de flux d'événements (générateur asynchrone).
+
+        Types d'événements :
+        - "stage" : étape réellement en cours (message affichable)
+        - "draft_token" : fragment du brouillon produit par la boucle ReAct
+        - "flights_partial" : vols reçus jusqu'ici d'un fournisseur pendant la recherche
+          ("fournisseur", "vols" : liste de core.flight_records.Vol, sans identifiant)
+        - "token" : fragment du plan final (self-correction)
+        - "done" : résultat complet, même dictionnaire que process_request
+
+        Le résultat porte la trace de la requête (result["trace"], core.tracing.Trace) et
+        les recherches de vols typées (result["vols"], core.flight_records.RechercheVols)
+        auxquelles le plan fait référence par identifiant ([V1], [V2]...).
+
+        Avec une session (agents.session.SessionPlanification), une demande modifiée ne relance
+        que les outils dont les arguments ont changé et le plan précédent est édité plutôt que
+        réécrit (result["replanification"] : champs modifiés, outils réutilisés et relancés).
+        """
+        evenements = asyncio.Queue()
+        # La requête tourne dans sa propre tâche (trace et collectes dans son contexte) ;
+        # les étapes y publient leurs événements, relayés ici au fil de l'eau
+        tache = asyncio.create_task(self._executer(user_input, evenements.put_nowait, session))
+        # Fin de tâche sans événement "done" (exception) : réveille le consommateur
+        tache.add_done_callback(lambda _: evenements.put_nowait(None))
+        try:
+            while (event := await evenements.get()) is not None:
+                yield event
+                if event["type"] == "done":
+                    return
+            tache.result()
+        finally:
+            tache.cancel()
+
+    async def _executer(self, user_input: str, emettre, session):
+        with nouvelle_trace("process_request") as trace, collecter_vols() as collecte, ecouter_vols_partiels():
+            result = await self._etapes(user_input, emettre, session)
+        result["trace"] = trace
+        # Ordre chronologique (circuits : un vol par tronçon, enregistrés dans l'ordre de réponse)
+        result["vols"] = sorted(collecte.recherches, key=lambda r: r.date_dep or "")
+        emettre({"type": "done", "result": result})
 
-    def process_request(self, user_input: str):
+    async def _etapes(self, user_input: str, emettre, session) -> dict:
+        debut = time.perf_counter()
+        timings = {}
         try:
-            trip_data = analyze_travel_request(user_input)
+            emettre({"type": "stage", "stage": "parse", "message": "🧠 Analyse de la demande..."})
+            with span("parse"):
+                trip_data = await analyze_travel_request_async(user_input)
+            timings["parse"] = time.perf_counter() - debut
+
+            if trip_data.multi_destinations and trip_data.ordre_libre:
+                emettre({"type": "stage", "stage": "itineraire", "message": TOOL_STAGE_MESSAGES["itineraire"]})
+                with span("itineraire", etapes=len(trip_data.etapes)):
+                    trip_data.etapes = await asyncio.to_thread(ordonner_etapes, trip_data.origin, trip_data.etapes)
+                trip_data.destination = trip_data.etapes[0]
+
+            champs = session.champs_modifies(trip_data) if session else {}
+            if session and session.peut_editer(champs):
+                return await self._replanifier(trip_data, champs, emettre, session, debut, timings)
             
             print("\n🧠 --- Démarrage ReAct ---")
-            initial_plan = self._run_reasoning_loop(trip_data)
+            with span("reasoning"):
+                initial_plan = await self._run_reasoning_loop(trip_data, emettre, session)
+            timings["reasoning"] = time.perf_counter() - debut - timings["parse"]
             
             print("\n✨ --- Démarrage Self-Correction ---")
-            final_plan = self._critique_and_correct(trip_data, initial_plan)
+            emettre({"type": "stage", "stage": "critique", "message": "✍️ Rédaction du plan et des conseils..."})
+            debut_critique = time.perf_counter()
+            with span("critique"):
+                final_plan = await self._critique_and_correct(trip_data, initial_plan, self._mesurer_ttft(emettre, debut, timings))
+            timings["critique"] = time.perf_counter() - debut_critique
+            timings["total"] = time.perf_counter() - debut
+            if session:
+                session.terminer(trip_data, final_plan)
             
-            return {
+            result = {
                 "success": True,
                 "data": trip_data,
                 "plan": final_plan,
                 "initial_plan": initial_plan,
+                "timings": timings,
                 "message": "Succès"
             }
 
         except Exception as e:
             print(f"❌ Erreur agent: {e}")
-            return {
+            result = {
                 "success": False,
                 "error": str(e),
                 "message": "Erreur lors du traitement de la demande."
             }
+        return result
+
+    def _mesurer_ttft(self, emettre, debut: float, timings: dict):
+        """Enveloppe `emettre` pour relever le délai du premier token du plan final."""
+        def emettre_plan(event):
+            if "ttft" not in timings:
+                timings["ttft"] = time.perf_counter() - debut
+                print(f"⚡ Premier token du plan après {timings['ttft']:.2f}s")
+            emettre(event)
+        return emettre_plan
+
+    async def _replanifier(self, trip_data, champs: dict, emettre, session, debut: float, timings: dict) -> dict:
+        """Demande modifiée sur le même trajet : seuls les outils dont les arguments ont changé
+        sont relancés, puis une passe unique édite le plan précédent (ni ReAct ni critique)."""
+        print(f"\n♻️ --- Replanification ({', '.join(champs) or 'demande inchangée'}) ---")
+        tool_calls = self._outils_obligatoires(trip_data)
+        relances = [
+            tc["function"]["name"] for tc in tool_calls
+            if not session.connait(tc["function"]["name"], json.loads(tc["function"]["arguments"]))
+        ]
+        for fn_name in dict.fromkeys(relances):
+            emettre({"type": "stage", "stage": fn_name, "message": TOOL_STAGE_MESSAGES.get(fn_name, f"🔧 {fn_name}...")})
+        with span("prefetch", relances=len(relances)):
+            tool_messages = await self._execute_tool_calls(tool_calls, emettre, session)
+        timings["outils"] = time.perf_counter() - debut - timings["parse"]
+
+        modifications = "\n".join(f"- {champ} : {avant} → {apres}" for champ, (avant, apres) in champs.items())
+        resultats = "\n\n".join(
+            f"### {m['name']}\n{RESUMEURS.get(m['name'], resumer_generique)(m['content'])}" for m in tool_messages
+        )
+        edition_prompt = f"""Tu es un Éditeur Expert en Voyages. Le voyageur a modifié sa demande : mets à jour son plan.
+
+📝 NOUVELLE DEMANDE :
+{trip_data.raw_input}
+
+🔄 MODIFICATIONS :
+{modifications or "- Aucune (nouvelle version du plan demandée)"}
+
+🛠️ RÉSULTATS DES OUTILS (À JOUR) :
+{resultats}
+
+📄 PLAN PRÉCÉDENT :
+{session.plan}
+
+🎯 TA MISSION :
+1. Garde la structure, le ton et tout ce qui reste valable
+2. Réécris uniquement ce qui dépend des champs modifiés (vols, nombre de voyageurs, style, budget, météo...)
+3. Cite les vols par identifiant ([V1]...) d'après les résultats ci-dessus : les anciens identifiants ne sont plus valables
+
+⚠️ RÈGLES ABSOLUES :
+- NE JAMAIS inventer de prix ni de vol
+- NE SUPPRIME AUCUN LIEN encore pertinent
+- Mentionne clairement que les prix affichés sont pour {trip_data.voyageurs.adultes + trip_data.voyageurs.enfants} voyageur(s)
+
+Renvoie uniquement le plan complet mis à jour.
+"""
+        emettre({"type": "stage", "stage": "edition", "message": "✍️ Mise à jour du plan précédent..."})
+        debut_edition = time.perf_counter()
+        with span("edition", champs=",".join(champs)):
+            final_plan, _, _ = await self._stream_completion(
+                self._mesurer_ttft(emettre, debut, timings), "token", "edition",
+                model="gpt-3.5-turbo-0125",
+                messages=[{"role": "user", "content": edition_prompt}],
+                temperature=0.3
+            )
+        timings["edition"] = time.perf_counter() - debut_edition
+        timings["total"] = time.perf_counter() - debut
+        print(f"✅ Plan mis à jour en {timings['total']:.2f}s ({len(relances)} outil(s) relancé(s))")
+
+        result = {
+            "success": True,
+            "data": trip_data,
+            "plan": final_plan,
+            "initial_plan": session.plan,
+            "timings": timings,
+            "message": "Succès",
+            "replanification": {
+                "champs": list(champs),
+                "outils_relances": relances,
+                "outils_reutilises": len(tool_calls) - len(relances)
+            }
+        }
+        session.terminer(trip_data, final_plan)
+        return result
 
-    def _run_reasoning_loop(self, trip_data):
-        """Boucle ReAct avec support voyageurs"""
+    async def _run_reasoning_loop(self, trip_data, emettre, session=None) -> str:
+        """Boucle ReAct avec support voyageurs.
+
+        Émet les événements d'étape et le brouillon en streaming, puis renvoie le plan brut.
+        """
         ville_depart = getattr(trip_data, 'origin', 'Paris')
         adultes = trip_data.voyageurs.adultes
         enfants = trip_data.voyageurs.enfants
@@ -44,7 +271,7 @@ class TravelAgent:
 
 🎯 DONNÉES DU VOYAGE :
 - Départ : {ville_depart}
-- Destination : {trip_data.destination}
+- Destination : {" → ".join(trip_data.etapes) if trip_data.multi_destinations else trip_data.destination}
 - Dates : {trip_data.dates}
 - Voyageurs : {adultes} adultes, {enfants} enfants
 - Style : {trip_data.preferences.style}
@@ -72,8 +299,8 @@ class TravelAgent:
 📋 STRUCTURE DE TA RÉPONSE FINALE :
 
 ## ✈️ Transport
-[Copie EXACTEMENT les vols avec prix TOTAL pour {adultes + enfants} personne(s)]
-[Garde TOUS les liens de réservation]
+[Recommande 1 à 3 vols en les citant par identifiant, ex: [V1], avec une phrase de justification]
+[Ne recopie ni le tableau des vols ni les liens : ils sont ajoutés automatiquement au plan]
 
 ## 🌤️ Météo & Conseils Valise
 [Résumé météo + conseils personnalisés selon températures]
@@ -82,71 +309,251 @@ class TravelAgent:
 [Suggestions adaptées au style "{trip_data.preferences.style}"]
 
 ⚠️ RÈGLES ABSOLUES :
-- NE JAMAIS inventer de prix
-- Garde TOUS les liens retournés par les outils
+- NE JAMAIS inventer de prix ni de vol : cite uniquement les identifiants [V…] retournés par rechercher_vols
+- Garde TOUS les liens retournés par les autres outils
 - Mentionne clairement que les prix affichés sont pour {adultes + enfants} voyageur(s)
 - Si un outil échoue, indique "Informations non disponibles"
 """
+        if trip_data.multi_destinations:
+            system_prompt += self._consignes_circuit(trip_data)
 
-        messages = [
+        contexte = GestionnaireContexte([
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": f"Planifie ce voyage : {trip_data.raw_input}"}
-        ]
+        ])
+
+        if self.planning_mode == "prefetch":
+            # Arguments déjà connus : une seule vague d'outils, sans aller-retour LLM
+            debut_prefetch = time.perf_counter()
+            tool_calls = self._outils_obligatoires(trip_data)
+            for fn_name in dict.fromkeys(tc["function"]["name"] for tc in tool_calls):
+                emettre({"type": "stage", "stage": fn_name, "message": TOOL_STAGE_MESSAGES.get(fn_name, f"🔧 {fn_name}...")})
+            contexte.ajouter({"role": "assistant", "content": None, "tool_calls": tool_calls})
+            with span("prefetch"):
+                contexte.ajouter(*await self._execute_tool_calls(tool_calls, emettre, session))
+            contexte.ajouter({
+                "role": "user",
+                "content": "Les outils obligatoires ont déjà été exécutés ci-dessus. "
+                           "Rédige directement le plan final ; n'appelle un outil que s'il manque une information."
+            })
+            print(f"⚡ Prefetch des outils : {time.perf_counter() - debut_prefetch:.2f}s")
         
         for iteration in range(8):
             print(f"🔄 ReAct - Itération {iteration + 1}/8")
+            debut_iteration = time.perf_counter()
+            with span("react.iteration", iteration=iteration + 1):
+                emettre({"type": "stage", "stage": "reasoning", "message": f"🤔 Raisonnement (itération {iteration + 1})..."})
             
-            try:
-                response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo-0125",
-                    messages=messages,
-                    tools=TRAVEL_TOOL_SCHEMAS,
-                    tool_choice="auto",
-                    temperature=0.7
-                )
-            except Exception as e:
-                print(f"❌ Erreur OpenAI: {e}")
-                return f"Erreur API OpenAI: {str(e)}"
+                try:
+                    content, tool_calls, usage = await self._stream_completion(
+                        emettre, "draft_token", "react",
+                        model="gpt-3.5-turbo-0125",
+                        messages=contexte.messages_pour_llm(),
+                        tools=TRAVEL_TOOL_SCHEMAS,
+                        tool_choice="auto",
+                        temperature=0.7
+                    )
+                except Exception as e:
+                    print(f"❌ Erreur OpenAI: {e}")
+                    return f"Erreur API OpenAI: {str(e)}"
 
-            message = response.choices[0].message
-            
-            if not message.tool_calls:
-                print("✅ Réponse finale générée")
-                return message.content
+                contexte.journaliser(iteration + 1, usage)
+                contexte.marquer_lus()
 
-            messages.append(message)
+                if not tool_calls:
+                    print("✅ Réponse finale générée")
+                    return content
 
-            for tool_call in message.tool_calls:
-                fn_name = tool_call.function.name
-                fn_args = json.loads(tool_call.function.arguments)
-                
-                print(f"  🔧 Appel : {fn_name}({fn_args})")
-                
-                func = AVAILABLE_TOOLS_MAP.get(fn_name)
-                
-                if func:
-                    try:
-                        tool_result = func(**fn_args)
-                        print(f"  ✅ Résultat obtenu ({len(str(tool_result))} caractères)")
-                    except Exception as e:
-                        tool_result = f"Erreur {fn_name}: {str(e)}"
-                        print(f"  ❌ {tool_result}")
-                else:
-                    tool_result = f"Outil {fn_name} non disponible"
-                    print(f"  ❌ {tool_result}")
-
-                messages.append({
-                    "tool_call_id": tool_call.id,
-                    "role": "tool",
-                    "name": fn_name,
-                    "content": str(tool_result)
-                })
+                contexte.ajouter({"role": "assistant", "content": content or None, "tool_calls": tool_calls})
+                for fn_name in dict.fromkeys(tc["function"]["name"] for tc in tool_calls):
+                    emettre({"type": "stage", "stage": fn_name, "message": TOOL_STAGE_MESSAGES.get(fn_name, f"🔧 {fn_name}...")})
+                contexte.ajouter(*await self._execute_tool_calls(tool_calls, emettre, session))
+                print(f"⏱️ Itération {iteration + 1} : {time.perf_counter() - debut_iteration:.2f}s")
 
         print("⚠️ Limite d'itérations atteinte")
         return "Le plan a atteint la limite de raisonnement. Relancez pour un résultat complet."
 
-    def _critique_and_correct(self, trip_data, initial_plan: str) -> str:
-        """Self-Correction"""
+    def _consignes_circuit(self, trip_data) -> str:
+        vols = "\n".join(
+            f"- Vol {i} : {t['depart']} → {t['arrivee']} le {t['date']}" for i, t in enumerate(troncons(trip_data), 1)
+        )
+        return f"""
+🗺️ CIRCUIT MULTI-DESTINATIONS ({len(trip_data.etapes)} étapes, dans cet ordre) :
+{vols}
+
+- Pour un circuit, appelle rechercher_vols pour CHAQUE vol ci-dessus (date_depart = date du vol, aller simple),
+  puis consulter_meteo et rechercher_infos_voyage pour CHAQUE étape : ces appels peuvent tous partir dans le même tour
+- Ajoute une section "## 🗺️ Itinéraire" avec une sous-partie par étape (dates, vol d'arrivée [V…], météo, activités)
+"""
+
+    def _outils_obligatoires(self, trip_data) -> list:
+        """tool_calls synthétiques des trois outils imposés par le prompt système
+        (un appel par vol et par étape pour un circuit multi-destinations)."""
+        if trip_data.multi_destinations:
+            voyageurs = {"adultes": trip_data.voyageurs.adultes, "enfants": trip_data.voyageurs.enfants}
+            appels = [
+                ("rechercher_vols", {"depart": t["depart"], "arrivee": t["arrivee"], "date_depart": t["date"], **voyageurs})
+                for t in troncons(trip_data)
+            ]
+            appels += [("consulter_meteo", {"destination": ville}) for ville in trip_data.etapes]
+            appels += [
+                ("rechercher_infos_voyage", {"requete": "meilleures activités", "destination": ville})
+                for ville in trip_data.etapes
+            ]
+        else:
+            appels = self._appels_aller_retour(trip_data)
+        return [
+            {
+                "id": f"prefetch_{fn_name}_{i}",
+                "type": "function",
+                "function": {"name": fn_name, "arguments": json.dumps(fn_args, ensure_ascii=False)}
+            }
+            for i, (fn_name, fn_args) in enumerate(appels)
+        ]
+
+    def _appels_aller_retour(self, trip_data) -> list:
+        return [
+            ("rechercher_vols", {
+                "depart": getattr(trip_data, 'origin', 'Paris'),
+                "arrivee": trip_data.destination,
+                "date_depart": trip_data.dates,
+                "adultes": trip_data.voyageurs.adultes,
+                "enfants": trip_data.voyageurs.enfants
+            }),
+            ("consulter_meteo", {"destination": trip_data.destination}),
+            ("rechercher_infos_voyage", {"requete": "meilleures activités", "destination": trip_data.destination})
+        ]
+
+    async def _stream_completion(self, emettre, event_type: str, etape: str, **kwargs):
+        """Appel chat.completions en streaming (client AsyncOpenAI de la boucle courante).
+
+        Émet chaque fragment de texte sous forme d'événement `event_type` et renvoie
+        (contenu, tool_calls, usage) une fois le flux terminé ; les tool_calls sont
+        reconstitués à partir des deltas, au format des messages OpenAI.
+        """
+        content = ""
+        tool_calls = {}
+        usage = None
+        # Concurrence OpenAI bornée pour toute la boucle (lots de planification)
+        async with limite_fournisseur_async("openai"):
+            with span(f"llm.{etape}", categorie="llm", model=kwargs.get("model")) as attributs:
+                debut = time.perf_counter()
+                stream = await get_openai_async().chat.completions.create(
+                    stream=True, stream_options={"include_usage": True}, **kwargs
+                )
+                async for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage
+                        attributs["prompt_tokens"] = usage.prompt_tokens
+                        attributs["completion_tokens"] = usage.completion_tokens
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if "ttft_ms" not in attributs and (delta.content or delta.tool_calls):
+                        attributs["ttft_ms"] = round((time.perf_counter() - debut) * 1000, 1)
+                    if delta.content:
+                        content += delta.content
+                        emettre({"type": event_type, "text": delta.content})
+                    for tc in delta.tool_calls or []:
+                        call = tool_calls.setdefault(tc.index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+                        if tc.id:
+                            call["id"] = tc.id
+                        if tc.function and tc.function.name:
+                            call["function"]["name"] += tc.function.name
+                        if tc.function and tc.function.arguments:
+                            call["function"]["arguments"] += tc.function.arguments
+        return content, [tool_calls[i] for i in sorted(tool_calls)], usage
+
+    async def _execute_tool_calls(self, tool_calls, emettre, session=None) -> list:
+        """Exécute les tool_calls d'un même tour en parallèle (une tâche par outil).
+
+        Relaie les vols partiels pendant l'attente, puis renvoie les messages "tool" dans
+        l'ordre d'origine des tool_call_id, quel que soit l'ordre de fin des outils.
+        """
+        debut = time.monotonic()
+        taches = [asyncio.create_task(self._run_tool(tool_call, session)) for tool_call in tool_calls]
+        # Les outils tournent en parallèle : le délai de chacun court depuis le lancement du lot
+        limites = {
+            tache: debut + TOOL_TIMEOUTS.get(tool_call["function"]["name"], DEFAULT_TOOL_TIMEOUT)
+            for tache, tool_call in zip(taches, tool_calls)
+        }
+        en_cours = set(taches)
+        while en_cours:
+            _, en_cours = await asyncio.wait(en_cours, timeout=SONDE_OUTILS)
+            self._relayer_vols_partiels(emettre)
+            maintenant = time.monotonic()
+            en_cours = {tache for tache in en_cours if limites[tache] > maintenant}
+        self._relayer_vols_partiels(emettre)
+
+        tool_messages = []
+        for tool_call, tache in zip(tool_calls, taches):
+            fn_name = tool_call["function"]["name"]
+            if tache.done():
+                tool_result = tache.result()
+            else:
+                tache.cancel()
+                tool_result = f"Erreur {fn_name}: délai de {TOOL_TIMEOUTS.get(fn_name, DEFAULT_TOOL_TIMEOUT)}s dépassé"
+                print(f"  ⏱️ {tool_result}")
+
+            tool_messages.append({
+                "tool_call_id": tool_call["id"],
+                "role": "tool",
+                "name": fn_name,
+                "content": str(tool_result)
+            })
+        return tool_messages
+
+    def _relayer_vols_partiels(self, emettre):
+        """Vols partiels publiés par les fournisseurs depuis le dernier relais."""
+        partiels = file_vols_partiels()
+        while partiels is not None:
+            try:
+                fournisseur, vols = partiels.get_nowait()
+            except queue.Empty:
+                return
+            emettre({"type": "flights_partial", "fournisseur": fournisseur, "vols": vols})
+
+    async def _run_tool(self, tool_call, session=None) -> str:
+        """Exécute un tool_call unique et renvoie son résultat (ou un message d'erreur).
+
+        Avec une session, un outil déjà appelé avec les mêmes arguments n'est pas relancé.
+        """
+        fn_name = tool_call["function"]["name"]
+        debut = time.perf_counter()
+
+        func = ASYNC_TOOLS_MAP.get(fn_name)
+        if not func:
+            tool_result = f"Outil {fn_name} non disponible"
+            print(f"  ❌ {tool_result}")
+            return tool_result
+
+        with span(f"tool.{fn_name}", categorie="tool") as attributs:
+            try:
+                fn_args = json.loads(tool_call["function"]["arguments"])
+                if session and (tool_result := session.rejouer(fn_name, fn_args)) is not None:
+                    print(f"  ♻️ {fn_name} : résultat de la session réutilisé")
+                    attributs["session"] = True
+                    attributs["caracteres"] = len(str(tool_result))
+                    return tool_result
+                print(f"  🔧 Appel : {fn_name}({fn_args})")
+                with suivre_recherches() as recherches:
+                    tool_result = await func(**fn_args)
+                print(f"  ✅ {fn_name} : {len(str(tool_result))} caractères en {time.perf_counter() - debut:.2f}s")
+                if session:
+                    session.memoriser(fn_name, fn_args, tool_result, recherches)
+            except Exception as e:
+                tool_result = f"Erreur {fn_name}: {str(e)}"
+                attributs["erreur"] = str(e)
+                print(f"  ❌ {tool_result}")
+            attributs["caracteres"] = len(str(tool_result))
+        return tool_result
+
+    async def _critique_and_correct(self, trip_data, initial_plan: str, emettre) -> str:
+        """Self-Correction en streaming.
+
+        Émet des événements "token" et renvoie le texte final (le brouillon initial
+        si la correction échoue).
+        """
         critique_prompt = f"""Tu es un Éditeur Expert en Voyages. 
 
 📄 PLAN BRUT :
@@ -162,6 +569,7 @@ class TravelAgent:
 ⚠️ RÈGLES ABSOLUES :
 - NE SUPPRIME AUCUN LIEN
 - NE MODIFIE PAS les prix
+- Garde les références de vols ([V1], [V2]...) telles quelles, sans y ajouter prix ni horaires
 - Mentionne clairement le nombre de voyageurs
 - Si un élément manque, indique "(Non disponible)"
 
@@ -169,16 +577,16 @@ class TravelAgent:
 """
         
         try:
-            response = self.client.chat.completions.create(
+            corrected_plan, _, _ = await self._stream_completion(
+                emettre, "token", "critique",
                 model="gpt-3.5-turbo-0125",
                 messages=[{"role": "user", "content": critique_prompt}],
                 temperature=0.3
             )
-            
-            corrected_plan = response.choices[0].message.content
             print("✅ Self-Correction terminée")
             return corrected_plan
             
         except Exception as e:
             print(f"⚠️ Erreur Self-Correction: {e}")
-            return initial_plan
\ No newline at end of file
+            # Le brouillon devient le plan final ; rien n'a forcément été émis
+            return initial_plan
@@ -0,0 +1,164 @@
+"""Planification par lots : JSONL en entrée, JSONL en sortie (écrit au fil de l'eau).
+
+Chaque ligne d'entrée : {"id": "promo-bali-01", "request": "Je veux aller à Bali ..."}
+(sans "id", le numéro de ligne est utilisé). Relancer la même commande après un
+arrêt reprend là où le lot s'était arrêté : les ids déjà présents dans la sortie
+sont ignorés (sauf échecs avec --retry-errors).
+
+Usage :
+    python app/batch_cli.py demandes.jsonl -o plans.jsonl -c 4 --limite serpapi=2 --limite openai=4
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+# Configuration des chemins
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(current_dir, '..'))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+DEFAULT_CONCURRENCE = 4
+# Outils par requête lancés en parallèle par l'agent (vols, météo, web)
+OUTILS_PAR_REQUETE = 3
+
+# --- ENTRÉE / SORTIE ---
+
+def lire_demandes(chemin: str) -> list:
+    """[(id, texte)] dans l'ordre du fichier ; les lignes vides ou invalides sont signalées et ignorées."""
+    demandes = []
+    with open(chemin, encoding="utf-8") as f:
+        for numero, ligne in enumerate(f, 1):
+            if not ligne.strip():
+                continue
+            try:
+                item = json.loads(ligne)
+                texte = item["request"]
+            except (json.JSONDecodeError, KeyError, TypeError) as e:
+                print(f"⚠️ Ligne {numero} ignorée : {e}")
+                continue
+            demandes.append((str(item.get("id", f"ligne-{numero}")), texte))
+    return demandes
+
+def lire_termines(chemin: str, retry_errors: bool) -> set:
+    """Ids déjà écrits dans la sortie (une ligne tronquée par un arrêt brutal est ignorée)."""
+    termines = set()
+    if not os.path.exists(chemin):
+        return termines
+    with open(chemin, encoding="utf-8") as f:
+        for ligne in f:
+            try:
+                item = json.loads(ligne)
+            except json.JSONDecodeError:
+                continue
+            if item.get("success") or not retry_errors:
+                termines.add(item["id"])
+    return termines
+
+class SortieJsonl:
+    """Ajout thread-safe d'une ligne par résultat, forcé sur disque pour survivre à un crash."""
+
+    def __init__(self, chemin: str):
+        # Termine une éventuelle ligne tronquée pour que la suite reste lisible
+        if os.path.exists(chemin) and os.path.getsize(chemin) > 0:
+            with open(chemin, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                tronquee = f.read(1) != b"\n"
+        else:
+            tronquee = False
+        self._fichier = open(chemin, "a", encoding="utf-8")
+        if tronquee:
+            self._fichier.write("\n")
+        self._lock = threading.Lock()
+
+    def ecrire(self, item: dict):
+        with self._lock:
+            self._fichier.write(json.dumps(item, ensure_ascii=False) + "\n")
+            self._fichier.flush()
+            os.fsync(self._fichier.fileno())
+
+    def fermer(self):
+        self._fichier.close()
+
+# --- EXÉCUTION ---
+
+def planifier(agent, id_demande: str, texte: str) -> dict:
+    from core.serialisation import resultat_vers_json
+
+    debut = time.perf_counter()
+    try:
+        result = agent.process_request(texte)
+    except Exception as e:
+        result = {"success": False, "error": str(e), "message": "Erreur lors du traitement de la demande."}
+
+    return {
+        "id": id_demande,
+        "request": texte,
+        "duree": round(time.perf_counter() - debut, 3),
+        "termine_le": datetime.now().isoformat(timespec="seconds"),
+        **resultat_vers_json(result),
+    }
+
+def executer_lot(demandes: list, sortie: SortieJsonl, concurrence: int) -> dict:
+    """Planifie les demandes avec `concurrence` agents en parallèle ; retourne un bilan."""
+    from agents.travel_agent import TravelAgent
+
+    # L'agent ne garde aucun état par requête : une instance (et un client OpenAI) pour tout le lot
+    agent = TravelAgent()
+    bilan = {"succes": 0, "echecs": 0}
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrence, thread_name_prefix="batch") as executor:
+        futures = {executor.submit(planifier, agent, id_demande, texte): id_demande for id_demande, texte in demandes}
+        for n, future in enumerate(as_completed(futures), 1):
+            item = future.result()
+            sortie.ecrire(item)
+            bilan["succes" if item["success"] else "echecs"] += 1
+            icone = "✅" if item["success"] else "❌"
+            print(f"{icone} [{n}/{len(demandes)}] {item['id']} ({item['duree']:.1f}s)")
+    bilan["duree"] = time.perf_counter() - debut
+    return bilan
+
+def _limite(valeur: str) -> tuple:
+    fournisseur, _, nombre = valeur.partition("=")
+    if not nombre.isdigit() or int(nombre) < 1:
+        raise argparse.ArgumentTypeError(f"format attendu fournisseur=N : {valeur}")
+    return fournisseur, int(nombre)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Planification de voyages par lots (JSONL).")
+    parser.add_argument("entree", help="Fichier JSONL des demandes")
+    parser.add_argument("-o", "--sortie", required=True, help="Fichier JSONL des résultats (complété, jamais écrasé)")
+    parser.add_argument("-c", "--concurrence", type=int, default=DEFAULT_CONCURRENCE, help="Demandes traitées en parallèle")
+    parser.add_argument("--limite", type=_limite, action="append", default=[], metavar="FOURNISSEUR=N",
+                        help="Requêtes simultanées max. pour un fournisseur (rapidapi, serpapi, open_meteo, nominatim, openai)")
+    parser.add_argument("--retry-errors", action="store_true", help="Relancer les demandes en échec lors d'une reprise")
+    args = parser.parse_args(argv)
+
+    # Threads de la boucle de l'agent (appels synchrones délégués), lus à l'import : ils suivent la concurrence du lot
+    os.environ.setdefault("TOOL_MAX_WORKERS", str(max(4, args.concurrence * OUTILS_PAR_REQUETE)))
+    from core.http import configurer_limite
+    for fournisseur, nombre in args.limite:
+        configurer_limite(fournisseur, nombre)
+
+    demandes = lire_demandes(args.entree)
+    termines = lire_termines(args.sortie, args.retry_errors)
+    restantes = [(i, t) for i, t in demandes if i not in termines]
+    print(f"📦 {len(demandes)} demandes, {len(demandes) - len(restantes)} déjà traitées, {len(restantes)} à planifier")
+    if not restantes:
+        return 0
+
+    sortie = SortieJsonl(args.sortie)
+    try:
+        bilan = executer_lot(restantes, sortie, args.concurrence)
+    finally:
+        sortie.fermer()
+    print(f"🏁 {bilan['succes']} succès, {bilan['echecs']} échecs en {bilan['duree']:.1f}s")
+    return 1 if bilan["echecs"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,388 @@
+"""Service HTTP de planification : file de travaux bornée, pool de workers, suivi en direct.
+
+Les interfaces (Streamlit avec PLANNER_SERVICE_URL, scripts...) soumettent une demande et
+suivent le travail ; les workers de planification se déploient indépendamment de l'UI.
+
+    POST   /jobs                {"request": "...", "session": "..."}  -> 202 {"id", "statut", "position"}
+                                                       429 + Retry-After si la file est pleine
+                                 "session" (optionnel) : identifiant choisi par le client ; les
+                                 demandes d'une même session réutilisent outils et plan précédent
+    GET    /jobs/<id>           statut : en_attente, en_cours, termine, annule (+ position, étape)
+    GET    /jobs/<id>/result    200 résultat (format core.serialisation), 202 si pas encore prêt
+    GET    /jobs/<id>/events    flux SSE des événements de TravelAgent (reprise via Last-Event-ID)
+    DELETE /jobs/<id>           annule le travail (en file ou en cours)
+    GET    /health              file, workers, santé des fournisseurs, p50/p95 par étape
+
+Usage :
+    python app/planning_service.py --port 8502 --workers 8 --file 32
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+# Configuration des chemins
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(current_dir, '..'))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+# --- CONFIGURATION ---
+
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8502"))
+# Requêtes planifiées simultanément
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", "8"))
+# Travaux en attente acceptés au-delà des workers occupés ; au-delà -> 429
+SERVICE_FILE_MAX = int(os.getenv("SERVICE_FILE_MAX", "32"))
+# Durée de conservation (secondes) d'un travail terminé, pour le polling du résultat
+SERVICE_RETENTION = float(os.getenv("SERVICE_RETENTION", "3600"))
+# Sessions de replanification conservées (les moins récemment utilisées sont oubliées)
+SERVICE_SESSIONS_MAX = int(os.getenv("SERVICE_SESSIONS_MAX", "1000"))
+MAX_SESSION_CHARS = 64
+# Commentaire SSE envoyé en l'absence d'événement, pour garder la connexion ouverte
+SSE_KEEPALIVE = 15
+MAX_REQUEST_CHARS = 4000
+
+EN_ATTENTE, EN_COURS, TERMINE, ANNULE = "en_attente", "en_cours", "termine", "annule"
+
+# --- TRAVAUX ---
+
+class Travail:
+    """Une demande et ses événements (sérialisés), consultables pendant et après l'exécution."""
+
+    def __init__(self, texte: str, session=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.texte = texte
+        self.session = session
+        self.statut = EN_ATTENTE
+        self.etape = None
+        self.evenements = []
+        self.resultat = None
+        self.cree_le = datetime.now().isoformat(timespec="seconds")
+        self.debut = None
+        self.fin = None
+        self.annule = False
+        self._condition = threading.Condition()
+
+    def publier(self, event: dict):
+        with self._condition:
+            self.evenements.append(event)
+            if event["type"] == "stage":
+                self.etape = event["message"]
+            self._condition.notify_all()
+
+    def demarrer(self) -> bool:
+        """Passe en cours, sauf si le travail a été annulé pendant son attente (False)."""
+        with self._condition:
+            if self.annule:
+                return False
+            self.statut = EN_COURS
+            self.debut = time.monotonic()
+            return True
+
+    def annuler(self) -> bool:
+        """Demande l'annulation ; True si le travail attendait encore (il est terminé sur-le-champ)."""
+        with self._condition:
+            if self.fin is not None:
+                return False
+            self.annule = True
+            if self.statut != EN_ATTENTE:
+                return False
+            self.terminer(ANNULE)
+            return True
+
+    def terminer(self, statut: str, resultat: dict = None):
+        with self._condition:
+            self.statut = statut
+            self.resultat = resultat
+            self.fin = time.monotonic()
+            self._condition.notify_all()
+
+    def attendre(self, depuis: int, timeout: float) -> tuple:
+        """(événements à partir de l'indice `depuis`, travail fini ?) ; bloque au plus `timeout` s."""
+        with self._condition:
+            self._condition.wait_for(lambda: len(self.evenements) > depuis or self.fin is not None, timeout)
+            return self.evenements[depuis:], self.fin is not None
+
+    def etat(self) -> dict:
+        etat = {
+            "id": self.id, "statut": self.statut, "etape": self.etape,
+            "evenements": len(self.evenements), "cree_le": self.cree_le
+        }
+        if self.debut is not None:
+            etat["duree"] = round((self.fin or time.monotonic()) - self.debut, 3)
+        return etat
+
+class ServicePlanification:
+    """File bornée + workers : au-delà de `file_max` travaux en attente, soumettre() refuse."""
+
+    def __init__(self, agent, workers: int = SERVICE_WORKERS, file_max: int = SERVICE_FILE_MAX,
+                 retention: float = SERVICE_RETENTION):
+        self.agent = agent
+        self.retention = retention
+        # maxsize=0 voudrait dire file illimitée : au moins une place
+        self._file = queue.Queue(maxsize=max(1, file_max))
+        self._travaux = OrderedDict()
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        # Durées récentes pour estimer le Retry-After des refus
+        self._durees = deque(maxlen=50)
+        self._workers = [
+            threading.Thread(target=self._boucle_worker, name=f"planif-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        self._occupes = 0
+        self.refus = 0
+
+    def demarrer(self):
+        for worker in self._workers:
+            worker.start()
+        return self
+
+    def soumettre(self, texte: str, id_session: str = None):
+        """Travail accepté, ou None si la file est pleine (contrôle d'admission)."""
+        self._purger()
+        with self._lock:
+            travail = Travail(texte, self._session(id_session) if id_session else None)
+            try:
+                self._file.put_nowait(travail)
+            except queue.Full:
+                self.refus += 1
+                return None
+            self._travaux[travail.id] = travail
+        return travail
+
+    def _session(self, id_session: str):
+        """Session de replanification (créée au premier usage) ; appelé sous self._lock."""
+        from agents.session import SessionPlanification
+
+        session = self._sessions.get(id_session)
+        if session is None:
+            session = self._sessions[id_session] = SessionPlanification()
+        self._sessions.move_to_end(id_session)
+        while len(self._sessions) > SERVICE_SESSIONS_MAX:
+            self._sessions.popitem(last=False)
+        return session
+
+    def travail(self, id_travail: str):
+        with self._lock:
+            return self._travaux.get(id_travail)
+
+    def position(self, travail: Travail) -> int:
+        """Rang dans la file (1 = prochain servi), 0 si le travail n'attend plus."""
+        if travail.statut != EN_ATTENTE:
+            return 0
+        with self._file.mutex:
+            attente = [t for t in self._file.queue if not t.annule]
+        return next((i for i, t in enumerate(attente, 1) if t is travail), 0)
+
+    def annuler(self, travail: Travail):
+        """En file : retiré aussitôt (sa place est libérée) ; en cours : le flux de l'agent est interrompu."""
+        if not travail.annuler():
+            return
+        with self._file.mutex:
+            try:
+                self._file.queue.remove(travail)
+            except ValueError:
+                # Déjà pris par un worker : il l'ignorera (Travail.demarrer)
+                return
+            self._file.not_full.notify()
+
+    def reessayer_dans(self) -> int:
+        """Attente suggérée (s) après un refus : temps pour écouler la file avec les workers."""
+        duree = sum(self._durees) / len(self._durees) if self._durees else 10
+        return max(1, round(duree * self._file.qsize() / len(self._workers)))
+
+    def metriques(self) -> dict:
+        return {
+            "workers": len(self._workers), "occupes": self._occupes,
+            "file": self._file.qsize(), "file_max": self._file.maxsize,
+            "refus": self.refus, "travaux_conserves": len(self._travaux), "sessions": len(self._sessions)
+        }
+
+    def _purger(self):
+        """Oublie les travaux terminés depuis plus de `retention` secondes."""
+        limite = time.monotonic() - self.retention
+        with self._lock:
+            for id_travail in [i for i, t in self._travaux.items() if t.fin is not None and t.fin < limite]:
+                del self._travaux[id_travail]
+
+    def _boucle_worker(self):
+        from core.serialisation import evenement_vers_json
+
+        while True:
+            travail = self._file.get()
+            if not travail.demarrer():
+                continue
+            with self._lock:
+                self._occupes += 1
+            resultat = None
+            try:
+                flux = self.agent.process_request_stream(travail.texte, travail.session)
+                for event in flux:
+                    if travail.annule:
+                        # Fermer le générateur annule la requête sur la boucle de l'agent
+                        flux.close()
+                        break
+                    donnees = evenement_vers_json(event)
+                    if event["type"] == "done":
+                        resultat = donnees["result"]
+                    travail.publier(donnees)
+            except Exception as e:
+                resultat = {"success": False, "error": str(e), "message": "Erreur lors du traitement de la demande."}
+                travail.publier({"type": "done", "result": resultat})
+            finally:
+                with self._lock:
+                    self._occupes -= 1
+            self._durees.append(time.monotonic() - travail.debut)
+            travail.terminer(ANNULE if travail.annule else TERMINE, resultat)
+            print(f"{'✅' if resultat and resultat['success'] else '❌'} Travail {travail.id} : {travail.statut} en {travail.etat()['duree']:.1f}s")
+
+# --- HTTP ---
+
+class _Gestionnaire(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    service = None
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, statut: int, corps, entetes: dict = None):
+        donnees = json.dumps(corps, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(statut)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(donnees)))
+        for nom, valeur in (entetes or {}).items():
+            self.send_header(nom, valeur)
+        self.end_headers()
+        self.wfile.write(donnees)
+
+    def _route(self):
+        """(travail ou None, sous-ressource) pour /jobs/<id>[/<sous-ressource>]."""
+        parties = urlparse(self.path).path.strip("/").split("/")
+        if len(parties) < 2 or parties[0] != "jobs":
+            return None, None
+        return self.service.travail(parties[1]), "/".join(parties[2:])
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip("/") != "/jobs":
+            return self._json(404, {"error": "ressource inconnue"})
+        try:
+            longueur = int(self.headers.get("Content-Length", 0))
+            corps = json.loads(self.rfile.read(longueur) or b"{}")
+            texte, id_session = corps["request"], corps.get("session")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return self._json(400, {"error": 'corps attendu : {"request": "..."}'})
+        if not isinstance(texte, str) or not texte.strip() or len(texte) > MAX_REQUEST_CHARS:
+            return self._json(400, {"error": f"demande vide ou trop longue (max. {MAX_REQUEST_CHARS} caractères)"})
+        if id_session is not None and (not isinstance(id_session, str) or not 0 < len(id_session) <= MAX_SESSION_CHARS):
+            return self._json(400, {"error": f"session : identifiant de 1 à {MAX_SESSION_CHARS} caractères"})
+
+        travail = self.service.soumettre(texte, id_session)
+        if travail is None:
+            attente = self.service.reessayer_dans()
+            return self._json(429, {"error": "file de planification pleine", "retry_after": attente},
+                              {"Retry-After": str(attente)})
+        self._json(202, {**travail.etat(), "position": self.service.position(travail)},
+                   {"Location": f"/jobs/{travail.id}"})
+
+    def do_DELETE(self):
+        travail, sous_ressource = self._route()
+        if travail is None or sous_ressource:
+            return self._json(404, {"error": "travail inconnu"})
+        self.service.annuler(travail)
+        self._json(200, travail.etat())
+
+    def do_GET(self):
+        if urlparse(self.path).path.rstrip("/") == "/health":
+            from core.http import etat_fournisseurs
+            from core.tracing import statistiques_spans
+            return self._json(200, {
+                "service": self.service.metriques(),
+                "fournisseurs": etat_fournisseurs(),
+                "etapes": statistiques_spans.percentiles()
+            })
+
+        travail, sous_ressource = self._route()
+        if travail is None:
+            return self._json(404, {"error": "travail inconnu"})
+        if sous_ressource == "":
+            return self._json(200, {**travail.etat(), "position": self.service.position(travail)})
+        if sous_ressource == "result":
+            if travail.fin is None:
+                return self._json(202, travail.etat())
+            if travail.resultat is None:
+                return self._json(410, {**travail.etat(), "error": "travail annulé"})
+            return self._json(200, travail.resultat)
+        if sous_ressource == "events":
+            return self._flux(travail)
+        self._json(404, {"error": "ressource inconnue"})
+
+    def _flux(self, travail: Travail):
+        """Server-Sent Events : id = indice de l'événement, rejoué depuis Last-Event-ID."""
+        try:
+            depuis = int(self.headers.get("Last-Event-ID", -1)) + 1
+        except ValueError:
+            depuis = 0
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            while True:
+                evenements, fini = travail.attendre(depuis, SSE_KEEPALIVE)
+                for event in evenements:
+                    donnees = json.dumps(event, ensure_ascii=False, default=str)
+                    self.wfile.write(f"id: {depuis}\nevent: {event['type']}\ndata: {donnees}\n\n".encode("utf-8"))
+                    depuis += 1
+                if fini and not evenements:
+                    if travail.statut == ANNULE:
+                        self.wfile.write(b"event: cancelled\ndata: {}\n\n")
+                    break
+                if not evenements:
+                    self.wfile.write(b": keep-alive\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client parti : il peut reprendre avec Last-Event-ID, le travail continue
+            pass
+
+def creer_serveur(service: ServicePlanification, hote: str = "127.0.0.1", port: int = SERVICE_PORT) -> ThreadingHTTPServer:
+    gestionnaire = type("Gestionnaire", (_Gestionnaire,), {"service": service})
+    serveur = ThreadingHTTPServer((hote, port), gestionnaire)
+    serveur.daemon_threads = True
+    return serveur
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Service HTTP de planification (file de travaux + workers).")
+    parser.add_argument("--hote", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS, help="Requêtes planifiées simultanément")
+    parser.add_argument("--file", type=int, default=SERVICE_FILE_MAX, help="Travaux en attente avant refus (429)")
+    parser.add_argument("--mode", choices=["prefetch", "react"], default="prefetch")
+    args = parser.parse_args(argv)
+
+    from agents.travel_agent import TravelAgent
+
+    service = ServicePlanification(TravelAgent(planning_mode=args.mode), args.workers, args.file).demarrer()
+    serveur = creer_serveur(service, args.hote, args.port)
+    print(f"🚀 Service de planification sur http://{args.hote}:{args.port} ({args.workers} workers, file {args.file})")
+    try:
+        serveur.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        serveur.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,11 @@
 import streamlit as st
 import sys
 import os
-import requests
+import json
+import uuid
 from datetime import datetime
+import altair as alt
+import pandas as pd
 
 # Configuration des chemins
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -10,28 +13,65 @@ parent_dir = os.path.abspath(os.path.join(current_dir, '..'))
 if parent_dir not in sys.path:
     sys.path.append(parent_dir)
 
+from agents.session import SessionPlanification
 from agents.travel_agent import TravelAgent
 from exports.pdf_export import generate_trip_pdf
-from core.tools import get_lat_lon # On réutilise votre fonction géo existante
+from core.flight_records import developper_references
+from core.weather import WEATHER_TTL, get_forecast_ville
+from core.tracing import statistiques_spans
+from core.http import etat_fournisseurs
+from core.service_client import PLANNER_SERVICE_URL, ClientPlanification, ServiceSature
+
+# Fraîcheur (secondes) des agrégats de santé du service distant : un appel HTTP au plus
+# par période, pas à chaque rerun de la page
+SANTE_TTL = 30
+
+# --- RESSOURCES PARTAGÉES (UNE FOIS PAR PROCESSUS) ---
+
+@st.cache_resource
+def get_agent():
+    """Agent (et son client OpenAI) partagé par toutes les sessions : il ne garde aucun état par requête."""
+    return TravelAgent()
+
+@st.cache_resource
+def get_client():
+    """Client du service de planification (PLANNER_SERVICE_URL) : l'UI ne planifie pas elle-même."""
+    return ClientPlanification(PLANNER_SERVICE_URL)
+
+def source_planification():
+    """Service distant si PLANNER_SERVICE_URL est défini, sinon agent dans le processus Streamlit."""
+    return get_client() if PLANNER_SERVICE_URL else get_agent()
+
+def session_planification():
+    """Mémoire de l'utilisateur entre deux demandes : outils réutilisés, plan précédent édité."""
+    if "session_planification" not in st.session_state:
+        # En mode service, la session vit côté service : l'UI n'en garde que l'identifiant
+        st.session_state["session_planification"] = uuid.uuid4().hex if PLANNER_SERVICE_URL else SessionPlanification()
+    return st.session_state["session_planification"]
+
+@st.cache_data(ttl=WEATHER_TTL, show_spinner=False)
+def charger_meteo(ville):
+    # Même prévision (cache partagé) que l'outil consulter_meteo de l'agent
+    prevision = get_forecast_ville(ville)
+    if prevision is None:
+        # Une exception n'est pas mise en cache : le rerun suivant réessaie
+        raise LookupError(f"Météo indisponible pour {ville}")
+    return prevision
+
+@st.cache_data(ttl=SANTE_TTL, show_spinner=False)
+def charger_sante():
+    # Une erreur n'est pas mise en cache : le rerun suivant réinterroge le service
+    return get_client().sante()
 
 # --- FONCTION D'AFFICHAGE MÉTÉO VISUELLE ---
 def afficher_widget_meteo(ville):
     """Récupère et affiche la météo avec des métriques Streamlit jolies"""
-    lat, lon = get_lat_lon(ville)
-    if not lat:
+    try:
+        response = charger_meteo(ville)
+    except LookupError:
         return
 
-    # Appel API (Similaire à tools.py mais pour l'UI)
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": lat, "longitude": lon,
-        "current": "temperature_2m,weather_code,wind_speed_10m",
-        "daily": "temperature_2m_max,temperature_2m_min",
-        "timezone": "auto"
-    }
-    
     try:
-        response = requests.get(url, params=params).json()
         curr = response['current']
         daily = response['daily']
 
@@ -61,6 +101,87 @@ def afficher_widget_meteo(ville):
     except Exception as e:
         print(f"Erreur widget météo: {e}")
 
+# --- VOLS (DONNÉES STRUCTURÉES) ---
+def afficher_vols(recherches):
+    """Tableaux des vols rendus depuis les enregistrements de l'outil, sans passer par le modèle."""
+    for recherche in recherches:
+        titre = f"#### ✈️ Vols {recherche.code_dep} → {recherche.code_arr} · prix total pour {recherche.voyageurs} voyageur(s)"
+        st.markdown(titre + (" · ⚠️ estimations" if recherche.estimation else ""))
+        if recherche.vols:
+            df = pd.DataFrame(recherche.to_dict()["vols"])
+            colonnes = ["id", "compagnie", "prix", "heure_dep", "heure_arr", "escales", "source"]
+            if recherche.flexibilite:
+                df["retour"] = df["retour"].fillna("aller simple")
+                st.caption(f"📅 Calendrier ±{recherche.flexibilite} jours : {recherche.couverture} combinaisons avec un prix")
+                st.dataframe(df.pivot_table(index="aller", columns="retour", values="prix", aggfunc="min"))
+                colonnes = ["id", "aller", "retour"] + colonnes[1:]
+            st.dataframe(df[colonnes], hide_index=True)
+        st.markdown(" · ".join(f"🔗 [{nom}]({url})" for nom, url in recherche.liens.items()))
+
+def afficher_vols_partiels(zone, vols_partiels):
+    vols = sorted((v for liste in vols_partiels.values() for v in liste), key=lambda v: v.prix)
+    with zone.container():
+        st.markdown(f"#### ⏳ Vols trouvés ({', '.join(vols_partiels)}) — recherche en cours")
+        st.dataframe(pd.DataFrame(
+            [{"compagnie": v.compagnie, "prix": v.prix, "heure_dep": v.heure_dep,
+              "heure_arr": v.heure_arr, "source": v.source} for v in vols]
+        ), hide_index=True)
+
+# --- TRACE D'EXÉCUTION ---
+def afficher_waterfall(trace):
+    """Cascade des spans de la requête (début et durée relatifs au lancement)."""
+    donnees = trace.to_dict()
+    spans = donnees["spans"]
+    if not spans:
+        return
+    lignes = []
+    for s in spans:
+        iteration = s["attributs"].get("iteration")
+        lignes.append({
+            "étape": f"{s['nom']} #{iteration}" if iteration else s["nom"],
+            "catégorie": s["categorie"],
+            "début (ms)": s["debut_ms"],
+            "fin (ms)": s["debut_ms"] + s["duree_ms"],
+            "durée (ms)": s["duree_ms"],
+            "détails": ", ".join(f"{k}={v}" for k, v in s["attributs"].items())
+        })
+    df = pd.DataFrame(lignes)
+    df["ordre"] = range(len(df))
+
+    chart = alt.Chart(df).mark_bar().encode(
+        x=alt.X("début (ms):Q", title="ms depuis le début de la requête"),
+        x2="fin (ms):Q",
+        y=alt.Y("étape:N", sort=alt.EncodingSortField(field="ordre"), title=None),
+        color="catégorie:N",
+        tooltip=["étape", "durée (ms)", "détails"]
+    ).properties(height=max(120, 22 * len(df)))
+    st.altair_chart(chart, use_container_width=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("⬇️ Trace JSON", json.dumps(donnees, ensure_ascii=False, default=str),
+                           file_name=f"trace_{trace.id}.json", mime="application/json")
+    with col2:
+        st.download_button("⬇️ Trace Chrome (Perfetto)", json.dumps(trace.to_chrome(), default=str),
+                           file_name=f"trace_{trace.id}.chrome.json", mime="application/json")
+
+    # Agrégats du processus qui planifie : le service distant le cas échéant
+    if PLANNER_SERVICE_URL:
+        try:
+            sante = charger_sante()
+        except Exception as e:
+            st.caption(f"Santé du service indisponible : {e}")
+            return
+        etapes, fournisseurs = sante["etapes"], sante["fournisseurs"]
+    else:
+        etapes, fournisseurs = statistiques_spans.percentiles(), etat_fournisseurs()
+
+    with st.expander("📊 p50 / p95 par étape (toutes les requêtes de ce serveur)"):
+        st.dataframe(pd.DataFrame(etapes).T)
+
+    with st.expander("🩺 Santé des fournisseurs (disjoncteurs et quotas)"):
+        st.dataframe(pd.DataFrame(fournisseurs).T)
+
 # --- APPLICATION PRINCIPALE ---
 def main():
     st.set_page_config(page_title="IA Travel Planner", page_icon="✈️", layout="wide")
@@ -78,55 +199,117 @@ def main():
         )
         generate_btn = st.button("🚀 Générer l'itinéraire", type="primary")
 
+    # Le plan terminé vit dans la session : les reruns (ex: clic sur le bouton PDF)
+    # ré-affichent depuis la mémoire, sans appel réseau ni nouveau rendu PDF
     if generate_btn and user_input:
-        agent = TravelAgent()
-        
-        # 1. Barre de progression
-        with st.status("🤖 L'agent travaille...", expanded=True) as status:
-            st.write("🧠 Analyse de la demande...")
-            # On lance le processus
-            result = agent.process_request(user_input)
+        st.session_state["resultat"] = planifier(user_input)
+
+    result = st.session_state.get("resultat")
+    if result is not None:
+        afficher_resultat(result)
+
+def planifier(user_input):
+    """Exécute l'agent (local ou service) en affichant la progression en direct ; retourne le résultat final."""
+    source = source_planification()
+    result = None
+    
+    # 1. Progression en direct : étapes réelles + plan affiché au fil des tokens
+    status = st.status("🤖 L'agent travaille...", expanded=True)
+    zone_vols = st.empty()
+    zone_plan = st.empty()
+    texte = ""
+    brouillon = True
+    vols_partiels = {}
+    
+    try:
+        for event in source.process_request_stream(user_input, session_planification()):
+            if event["type"] == "stage":
+                status.write(event["message"])
+            elif event["type"] == "flights_partial":
+                # Section vols remplie au fil des réponses fournisseurs (Skyscanner par lots)
+                vols_partiels[event["fournisseur"]] = event["vols"]
+                afficher_vols_partiels(zone_vols, vols_partiels)
+            elif event["type"] == "draft_token":
+                texte += event["text"]
+                zone_plan.markdown(texte)
+            elif event["type"] == "token":
+                if brouillon:
+                    # Le plan final remplace le brouillon ReAct
+                    texte, brouillon = "", False
+                texte += event["text"]
+                zone_plan.markdown(texte)
+            elif event["type"] == "done":
+                result = event["result"]
+    except ServiceSature as e:
+        # Contrôle d'admission du service : rien n'a été lancé, l'utilisateur peut réessayer
+        result = {"success": False, "message": str(e)}
+    if result is None:
+        result = {"success": False, "message": "Planification interrompue avant la fin."}
+    
+    zone_vols.empty()
+    zone_plan.empty()
+    if result["success"]:
+        status.update(label="✅ Voyage planifié !", state="complete", expanded=False)
+    else:
+        status.update(label="❌ Erreur", state="error")
+    return result
+
+def afficher_resultat(result):
+    # 2. Affichage des Résultats
+    if result["success"]:
+        trip = result["data"]
+        final_plan = result["plan"]
+        vols = result.get("vols", [])
+
+        # --- A. WIDGET MÉTÉO (NOUVEAU) ---
+        afficher_widget_meteo(trip.destination)
+        if trip.multi_destinations:
+            st.markdown(f"**🗺️ Circuit :** {' → '.join([trip.origin, *trip.etapes, trip.origin])}")
+
+        # --- B. ONGLETS ---
+        tab_plan, tab_details = st.tabs(["📝 Itinéraire & Conseils", "🔍 Détails Techniques"])
+
+        with tab_plan:
+            afficher_vols(vols)
+            st.markdown(developper_references(final_plan, vols))
             
-            if result["success"]:
-                st.write("✈️ Recherche des vols (Amadeus/Google)...")
-                st.write("⛅ Vérification de la météo...")
-                st.write("✍️ Rédaction du plan et des conseils...")
-                status.update(label="✅ Voyage planifié !", state="complete", expanded=False)
+            # Bouton PDF (mis en cache par generate_trip_pdf selon le contenu du plan) ;
+            # le premier rendu est ajouté à la trace de la requête
+            if "trace" in result and not result.get("pdf_trace"):
+                with result["trace"].activer():
+                    pdf_bytes = generate_trip_pdf(trip, final_plan, vols)
+                result["pdf_trace"] = True
             else:
-                status.update(label="❌ Erreur", state="error")
-
-        # 2. Affichage des Résultats
-        if result["success"]:
-            trip = result["data"]
-            final_plan = result["plan"]
-
-            # --- A. WIDGET MÉTÉO (NOUVEAU) ---
-            afficher_widget_meteo(trip.destination)
-
-            # --- B. ONGLETS ---
-            tab_plan, tab_details = st.tabs(["📝 Itinéraire & Conseils", "🔍 Détails Techniques"])
-
-            with tab_plan:
-                st.markdown(final_plan)
-                
-                # Bouton PDF
-                pdf_bytes = generate_trip_pdf(trip, final_plan)
-                st.download_button(
-                    label="📄 Télécharger le PDF",
-                    data=pdf_bytes,
-                    file_name=f"Voyage_{trip.destination}.pdf",
-                    mime="application/pdf"
-                )
+                pdf_bytes = generate_trip_pdf(trip, final_plan, vols)
+            st.download_button(
+                label="📄 Télécharger le PDF",
+                data=pdf_bytes,
+                file_name=f"Voyage_{trip.destination}.pdf",
+                mime="application/pdf"
+            )
 
-            with tab_details:
-                st.json(trip.model_dump())
-                st.warning("Trace brute du raisonnement :")
-                st.text(result["initial_plan"])
+        with tab_details:
+            timings = result.get("timings", {})
+            if "ttft" in timings:
+                st.metric("⚡ Premier token", f"{timings['ttft']:.1f} s", f"Total {timings['total']:.1f} s", delta_color="off")
+            replanification = result.get("replanification")
+            if replanification:
+                st.caption(
+                    f"♻️ Plan précédent mis à jour ({', '.join(replanification['champs']) or 'demande inchangée'}) : "
+                    f"{replanification['outils_reutilises']} outil(s) réutilisé(s), "
+                    f"relancés : {', '.join(replanification['outils_relances']) or 'aucun'}"
+                )
+            if "trace" in result:
+                st.markdown("**⏱️ Cascade d'exécution**")
+                afficher_waterfall(result["trace"])
+            st.json(trip.model_dump())
+            st.warning("Trace brute du raisonnement :")
+            st.text(result["initial_plan"])
 
-        else:
-            st.error(f"Oups ! {result['message']}")
-            if 'error' in result:
-                st.code(result['error'])
+    else:
+        st.error(f"Oups ! {result['message']}")
+        if 'error' in result:
+            st.code(result['error'])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
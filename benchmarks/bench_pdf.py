@@ -0,0 +1,61 @@
+"""Benchmark de l'export PDF sur des plans longs (plusieurs pages).
+
+Usage : python benchmarks/bench_pdf.py [nb_jours ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from models.trip_models import VoyageRequest
+from exports.pdf_export import generate_trip_pdf, rendre_pdf
+
+REPETITIONS = 5
+
+def plan_long(nb_jours: int) -> str:
+    """Plan synthétique au format produit par l'agent : titres, listes, gras, liens, emojis, tableau."""
+    lignes = [
+        "# 🌴 Votre voyage à Bali",
+        "## ✈️ Vols",
+        "| Aller \\ Retour | 20/12 | 21/12 | 22/12 |",
+        "|---|---|---|---|",
+        "| 13/12 | 435 | 594 | **402** |",
+        "| 14/12 | 846 | — | 645 |",
+        "🔗 [Comparer sur Skyscanner](https://www.skyscanner.fr/transport/vols/par/dps)",
+        "---",
+    ]
+    for jour in range(1, nb_jours + 1):
+        lignes += [
+            f"### 📅 Jour {jour} – Ubud & rizières",
+            "- **Matin** : visite du temple, environ 15 € l'entrée… prévoir *un sarong*",
+            "- **Midi** : warung local – nasi goreng, jus frais",
+            "  - Option végétarienne : [Clear Café](https://example.com/clear-cafe)",
+            "- **Soir** : spectacle de danse Kecak au coucher du soleil 🌅",
+            "",
+            "Conseil : réservez la veille, les places partent vite en haute saison.",
+        ]
+    return "\n".join(lignes)
+
+def mesurer(fonction, *args) -> float:
+    debut = time.perf_counter()
+    for _ in range(REPETITIONS):
+        resultat = fonction(*args)
+    return (time.perf_counter() - debut) / REPETITIONS * 1000, resultat
+
+if __name__ == "__main__":
+    trip = VoyageRequest(
+        origin="Paris", destination="Bali", dates="du 15 au 30 décembre",
+        voyageurs={"adultes": 2, "enfants": 1},
+        preferences={"style": "détente", "budget": "moyen"},
+        raw_input="benchmark"
+    )
+    tailles = [int(n) for n in sys.argv[1:]] or [7, 30, 90]
+    print(f"{'jours':>6} {'pages':>6} {'ko':>7} {'rendu (ms)':>11} {'cache (ms)':>11}")
+    for nb_jours in tailles:
+        plan = plan_long(nb_jours)
+        ms_rendu, pdf_bytes = mesurer(rendre_pdf, trip, plan)
+        generate_trip_pdf(trip, plan)
+        ms_cache, _ = mesurer(generate_trip_pdf, trip, plan)
+        pages = pdf_bytes.count(b"/Type /Page\n") or pdf_bytes.count(b"/Type /Page")
+        print(f"{nb_jours:>6} {pages:>6} {len(pdf_bytes) / 1024:>7.0f} {ms_rendu:>11.1f} {ms_cache:>11.3f}")
@@ -0,0 +1,288 @@
+"""Services externes simulés pour les benchmarks hors-ligne.
+
+Un seul serveur HTTP local répond pour tous les fournisseurs, chacun sous son préfixe :
+    /openai/v1/chat/completions               OpenAI (JSON ou streaming SSE, tool_calls scriptés)
+    /serpapi/search.json                      SerpAPI (engine=google_flights ou google)
+    /skyscanner/v3/flights/live/search/create Skyscanner (RapidAPI) : premiers itinéraires, statut incomplet
+    /skyscanner/v3/flights/live/search/poll/<token>   Skyscanner : tous les itinéraires, statut complet
+    /open-meteo/v1/forecast                   Open-Meteo
+    /nominatim/search                         Nominatim
+
+Chaque service a une latence, une gigue et un taux d'erreur (HTTP 503) configurables.
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# --- CONFIGURATION ---
+
+@dataclass
+class ProfilService:
+    latence: float = 0.0  # secondes
+    gigue: float = 0.0  # écart max. ajouté ou retiré à la latence
+    erreurs: float = 0.0  # probabilité de répondre 503
+
+    def attendre(self):
+        delai = self.latence + random.uniform(-self.gigue, self.gigue)
+        if delai > 0:
+            time.sleep(delai)
+
+    def echoue(self) -> bool:
+        return random.random() < self.erreurs
+
+# Latences ordinaires observées en production (ordre de grandeur)
+PROFILS_DEFAUT = {
+    "openai": ProfilService(latence=0.4, gigue=0.1),
+    "serpapi": ProfilService(latence=1.2, gigue=0.4),
+    "skyscanner": ProfilService(latence=1.5, gigue=0.5),
+    "open_meteo": ProfilService(latence=0.15, gigue=0.05),
+    "nominatim": ProfilService(latence=0.3, gigue=0.1),
+}
+
+# Délai entre deux fragments d'une réponse OpenAI en streaming
+OPENAI_DELAI_FRAGMENT = 0.01
+
+PLAN_SIMULE = """## 🌴 Votre voyage
+
+### ✈️ Vols
+- Recommandé : [V1], le moins cher ; alternative [V2]
+
+### 📅 Jour 1
+- **Matin** : arrivée et installation
+- **Soir** : dîner au marché local
+
+### 🎒 Conseils valise
+- Vêtements légers, crème solaire
+"""
+
+# Villes reconnues comme étapes d'un circuit dans les demandes simulées
+VILLES_CIRCUIT = ["Bangkok", "Phuket", "Kuala Lumpur", "Singapour", "Bali", "Hanoi", "Tokyo", "Seoul"]
+
+COMPAGNIES = ["Air France", "KLM", "Emirates", "Qatar Airways", "Lufthansa", "Turkish Airlines"]
+CODES_IATA = ["AF", "KL", "EK", "QR", "LH", "TK"]
+
+def _horaires(i: int) -> tuple:
+    """(départ, arrivée, numéro, escales, durée) du vol i : identiques chez les deux fournisseurs,
+    pour que le classement fusionne les mêmes vols."""
+    return f"{8 + i:02d}:30", f"{18 + i % 5:02d}:10", f"{CODES_IATA[i]} {100 + i}", i % 3 == 2, 900 + 60 * (i % 4)
+
+# --- RÉPONSES ---
+
+def _vols_serpapi(params: dict) -> dict:
+    vols = []
+    for i, compagnie in enumerate(COMPAGNIES):
+        depart, arrivee, numero, escale, duree = _horaires(i)
+        segments = [{
+            "airline": compagnie, "flight_number": numero,
+            "departure_airport": {"id": params.get("departure_id", "CDG"), "time": f"2025-12-15 {depart}"},
+            "arrival_airport": {"id": params.get("arrival_id", "DPS"), "time": f"2025-12-16 {arrivee}"},
+        }]
+        if escale:
+            segments[0]["arrival_airport"] = {"id": "DOH", "time": "2025-12-15 23:50"}
+            segments.append({
+                "airline": compagnie, "flight_number": f"{numero}1",
+                "departure_airport": {"id": "DOH", "time": "2025-12-16 01:20"},
+                "arrival_airport": {"id": params.get("arrival_id", "DPS"), "time": f"2025-12-16 {arrivee}"},
+            })
+        vols.append({"flights": segments, "total_duration": duree, "price": random.randint(450, 1400)})
+    return {"best_flights": vols[:3], "other_flights": vols[3:]}
+
+def _resultats_web(params: dict) -> dict:
+    return {"organic_results": [
+        {"title": f"{params.get('q', '')} - guide {i}", "link": f"https://example.com/guide-{i}"}
+        for i in range(1, 4)
+    ]}
+
+def _itineraires_skyscanner(chemin: str) -> dict:
+    """create -> la moitié des itinéraires (incomplet) ; poll -> tous (complet).
+    Les prix d'une session sont tirés du token : un poll reprend ceux du create."""
+    poll = "/poll/" in chemin
+    token = chemin.rsplit("/", 1)[-1] if poll else uuid.uuid4().hex
+    tirage = random.Random(token)
+    nombre = len(COMPAGNIES) if poll else len(COMPAGNIES) // 2
+    itineraires, compagnies, segments = {}, {}, {}
+    for i, compagnie in enumerate(COMPAGNIES[:nombre]):
+        depart, arrivee, numero, escale, duree = _horaires(i)
+        compagnies[str(i)] = {"name": compagnie, "iata": CODES_IATA[i]}
+        numeros = [numero.split()[1]] + ([f"{numero.split()[1]}1"] if escale else [])
+        for n, vol in enumerate(numeros):
+            segments[f"seg-{i}-{n}"] = {"marketingCarrierId": str(i), "marketingFlightNumber": vol}
+        itineraires[f"itin-{i}"] = {
+            "pricingOptions": [{"price": {"amount": tirage.randint(450, 1400) * 1000}}],
+            "legs": [{"carriers": {"marketing": [str(i)]}, "departure": depart, "arrival": arrivee,
+                      "segmentIds": [f"seg-{i}-{n}" for n in range(len(numeros))],
+                      "stopCount": int(escale), "durationInMinutes": duree}]
+        }
+    return {
+        "sessionToken": token,
+        "status": "RESULT_STATUS_COMPLETE" if poll else "RESULT_STATUS_INCOMPLETE",
+        "content": {"results": {"itineraries": itineraires, "carriers": compagnies, "segments": segments}}
+    }
+
+def _meteo() -> dict:
+    return {
+        "current": {"temperature_2m": 28.4, "weather_code": 2, "wind_speed_10m": 12.0},
+        "daily": {"temperature_2m_max": [31.0, 30.5, 29.8], "temperature_2m_min": [24.1, 23.9, 24.0]}
+    }
+
+def _extraction_voyage(demande: str) -> dict:
+    """Voyage Paris -> Bali ; circuit si la demande cite plusieurs villes de VILLES_CIRCUIT."""
+    etapes = sorted((v for v in VILLES_CIRCUIT if v in demande), key=demande.index)
+    return {
+        "origin": "Paris", "destination": etapes[0] if len(etapes) > 1 else "Bali", "dates": "du 15 au 30 décembre",
+        "voyageurs": {"adultes": 2, "enfants": 0},
+        "preferences": {"style": "détente", "budget": "moyen"},
+        "etapes": etapes if len(etapes) > 1 else [], "ordre_libre": "ordre" in demande
+    }
+
+def _appels_outils(messages: list) -> list:
+    """Mode ReAct : premier tour -> les trois outils ; ensuite -> plan final."""
+    if any(m.get("role") == "tool" for m in messages):
+        return []
+    arguments = [
+        ("rechercher_vols", {"depart": "Paris", "arrivee": "Bali", "date_depart": "du 15 au 30 décembre", "adultes": 2, "enfants": 0}),
+        ("consulter_meteo", {"destination": "Bali"}),
+        ("rechercher_infos_voyage", {"requete": "meilleures activités", "destination": "Bali"}),
+    ]
+    return [
+        {"index": i, "id": f"call_{i}", "type": "function",
+         "function": {"name": nom, "arguments": json.dumps(args, ensure_ascii=False)}}
+        for i, (nom, args) in enumerate(arguments)
+    ]
+
+# --- SERVEUR ---
+
+class _Gestionnaire(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    profils = PROFILS_DEFAUT
+    compteurs = None
+
+    def log_message(self, *args):
+        pass
+
+    def _service(self, chemin: str):
+        for prefixe, service in (("/openai/", "openai"), ("/serpapi/", "serpapi"), ("/skyscanner/", "skyscanner"),
+                                 ("/open-meteo/", "open_meteo"), ("/nominatim/", "nominatim")):
+            if chemin.startswith(prefixe):
+                return service
+        return None
+
+    def _json(self, statut: int, corps):
+        donnees = json.dumps(corps).encode("utf-8")
+        self.send_response(statut)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(donnees)))
+        self.end_headers()
+        self.wfile.write(donnees)
+
+    def _traiter(self, corps: dict = None):
+        url = urlparse(self.path)
+        service = self._service(url.path)
+        if service is None:
+            return self._json(404, {"error": "service inconnu"})
+        profil = self.profils[service]
+        self.compteurs[service] = self.compteurs.get(service, 0) + 1
+        profil.attendre()
+        if profil.echoue():
+            return self._json(503, {"error": "erreur simulée"})
+
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if service == "openai":
+            return self._openai(corps or {})
+        if service == "serpapi":
+            return self._json(200, _vols_serpapi(params) if params.get("engine") == "google_flights" else _resultats_web(params))
+        if service == "skyscanner":
+            return self._json(200, _itineraires_skyscanner(url.path))
+        if service == "open_meteo":
+            return self._json(200, _meteo())
+        return self._json(200, [{"lat": "48.85", "lon": "2.35"}])
+
+    def _openai(self, corps: dict):
+        if not corps.get("stream"):
+            demande = corps.get("messages", [{}])[-1].get("content", "")
+            message = {"role": "assistant", "content": json.dumps(_extraction_voyage(demande), ensure_ascii=False)}
+            return self._json(200, {
+                "id": "fake", "object": "chat.completion", "created": 0, "model": corps.get("model", "fake"),
+                "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 120, "completion_tokens": 60, "total_tokens": 180}
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def envoyer(delta: dict = None, usage: dict = None):
+            chunk = {"id": "fake", "object": "chat.completion.chunk", "created": 0, "model": "fake",
+                     "choices": [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": None}]}
+            if usage:
+                chunk["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        appels = _appels_outils(corps.get("messages", [])) if corps.get("tools") else []
+        if appels:
+            for appel in appels:
+                envoyer({"tool_calls": [appel]})
+        else:
+            for ligne in PLAN_SIMULE.splitlines(keepends=True):
+                time.sleep(OPENAI_DELAI_FRAGMENT)
+                envoyer({"content": ligne})
+        envoyer(usage={"prompt_tokens": 900, "completion_tokens": 150, "total_tokens": 1050})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def do_GET(self):
+        self._traiter()
+
+    def do_POST(self):
+        longueur = int(self.headers.get("Content-Length", 0))
+        corps = json.loads(self.rfile.read(longueur) or b"{}")
+        self._traiter(corps)
+
+class ServicesSimules:
+    """Serveur local (thread d'arrière-plan) ; `variables_env()` donne les URLs à injecter."""
+
+    def __init__(self, profils: dict = None, port: int = 0):
+        gestionnaire = type("Gestionnaire", (_Gestionnaire,), {
+            "profils": {**PROFILS_DEFAUT, **(profils or {})},
+            "compteurs": {}
+        })
+        self.gestionnaire = gestionnaire
+        self.serveur = ThreadingHTTPServer(("127.0.0.1", port), gestionnaire)
+        self.serveur.daemon_threads = True
+        self._thread = threading.Thread(target=self.serveur.serve_forever, name="fake-services", daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.serveur.server_address[1]}"
+
+    @property
+    def compteurs(self) -> dict:
+        return dict(self.gestionnaire.compteurs)
+
+    def variables_env(self) -> dict:
+        return {
+            "OPENAI_BASE_URL": f"{self.url}/openai/v1",
+            "OPENAI_API_KEY": "fake",
+            "SERPAPI_URL": f"{self.url}/serpapi/search.json",
+            "SERPAPI_API_KEY": "fake",
+            "SKYSCANNER_API_URL": f"{self.url}/skyscanner/v3/flights/live/search/create",
+            "SKYSCANNER_POLL_URL": f"{self.url}/skyscanner/v3/flights/live/search/poll",
+            "RAPIDAPI_KEY": "fake",
+            "OPEN_METEO_URL": f"{self.url}/open-meteo/v1/forecast",
+            "NOMINATIM_URL": f"{self.url}/nominatim/search",
+        }
+
+    def demarrer(self):
+        self._thread.start()
+        return self
+
+    def arreter(self):
+        self.serveur.shutdown()
+        self.serveur.server_close()
@@ -0,0 +1,219 @@
+"""Benchmarks hors-ligne : bout en bout (process_request) et micro-benchmarks.
+
+Tous les services externes sont simulés (benchmarks/fake_services.py) et les caches
+disque pointent vers un dossier temporaire : les mesures sont reproductibles.
+
+Usage :
+    python benchmarks/run_benchmarks.py                       # compare à baseline.json
+    python benchmarks/run_benchmarks.py --save-baseline       # enregistre la référence
+    python benchmarks/run_benchmarks.py --concurrence 1 4 8 --requetes 16 --mode react
+    python benchmarks/run_benchmarks.py --service serpapi=2.0:0.5:0.1   # latence:gigue:erreurs
+
+Code de sortie 1 si une mesure régresse au-delà de la tolérance.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(BENCH_DIR, "..")))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_services import PROFILS_DEFAUT, ProfilService, ServicesSimules
+
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+# Écart relatif toléré avant de signaler une régression
+TOLERANCE = 0.25
+# En dessous de ce temps, le bruit de mesure domine : pas de comparaison relative
+PLANCHER_MS = 0.05
+
+DEMANDES = [
+    "Paris → Bali du 15 au 30 décembre, 2 adultes",
+    "Je veux aller à Rome du 3 au 8 mai depuis Lyon en couple",
+    "Voyage à Tokyo du 10 au 20 avril, 2 adultes et 1 enfant, budget 4000 euros",
+    "Bali ou Phuket en décembre ? plutôt détente",
+]
+
+# --- OUTILS DE MESURE ---
+
+def mesurer_micro(fonction, repetitions: int, essais: int = 5) -> float:
+    """Meilleur temps moyen par appel (ms) sur plusieurs essais, à la manière de timeit."""
+    meilleur = float("inf")
+    for _ in range(essais):
+        debut = time.perf_counter()
+        for _ in range(repetitions):
+            fonction()
+        meilleur = min(meilleur, (time.perf_counter() - debut) / repetitions)
+    return meilleur * 1000
+
+def percentile(valeurs: list, p: float) -> float:
+    valeurs = sorted(valeurs)
+    rang = (len(valeurs) - 1) * p
+    bas = int(rang)
+    haut = min(bas + 1, len(valeurs) - 1)
+    return valeurs[bas] + (valeurs[haut] - valeurs[bas]) * (rang - bas)
+
+# --- BENCHMARKS ---
+
+def micro_benchmarks() -> dict:
+    from core.tools import comparer_vols, extraire_dates
+    from core.flight_records import RechercheVols
+    from exports.pdf_export import generate_trip_pdf, rendre_pdf
+    from models.trip_models import VoyageRequest
+    from bench_pdf import plan_long
+
+    dates = ["du 15 au 30 décembre", "2025-12-15", "mi-mars, flexible", "dans un mois"]
+    vols = [
+        {"source": "Skyscanner" if i % 2 else "Google Flights", "compagnie": f"Compagnie {i % 7}",
+         "prix": 400 + (i * 37) % 900, "devise": "EUR", "heure_dep": "08:00", "heure_arr": "17:30",
+         "lien": "#", "vol_id": f"vol_{i}"}
+        for i in range(40)
+    ]
+    # Centaines d'offres par fournisseur, avec doublons entre fournisseurs
+    offres = [
+        {"source": "Skyscanner" if i % 2 else "Google Flights", "compagnie": f"Compagnie {i % 7}",
+         "prix": 400 + (i * 37) % 900, "devise": "EUR", "heure_dep": f"{6 + i % 13:02d}:{i % 4 * 15:02d}",
+         "heure_arr": f"{i % 24:02d}:10", "numeros": f"C{i % 7}{(i // 2) % 150}", "escales": i % 3,
+         "duree": 600 + (i * 53) % 700, "lien": "#"}
+        for i in range(600)
+    ]
+    trip = VoyageRequest(
+        origin="Paris", destination="Bali", dates="du 15 au 30 décembre",
+        voyageurs={"adultes": 2, "enfants": 1}, preferences={"style": "détente", "budget": "moyen"},
+        raw_input="benchmark"
+    )
+    plan = plan_long(30)
+    generate_trip_pdf(trip, plan)
+
+    return {
+        "extraire_dates_ms": mesurer_micro(lambda: [extraire_dates(d) for d in dates], 2000),
+        "comparer_vols_ms": mesurer_micro(
+            lambda: RechercheVols("CDG", "DPS", "2025-12-15", "2025-12-30", 3, vols=comparer_vols(vols[:20], vols[20:])).resume(), 200),
+        "comparer_vols_600_offres_ms": mesurer_micro(lambda: comparer_vols(offres[1::2], offres[::2]), 20),
+        "rendre_pdf_30j_ms": mesurer_micro(lambda: rendre_pdf(trip, plan), 2, essais=5),
+        "generate_trip_pdf_cache_ms": mesurer_micro(lambda: generate_trip_pdf(trip, plan), 2000),
+    }
+
+def bout_en_bout(concurrences: list, nb_requetes: int, mode: str) -> dict:
+    from agents.travel_agent import TravelAgent
+
+    agent = TravelAgent(planning_mode=mode)
+    agent.process_request(DEMANDES[0])  # échauffement : index aéroports, sessions, imports
+    resultats = {}
+    for concurrence in concurrences:
+        demandes = [DEMANDES[i % len(DEMANDES)] for i in range(nb_requetes)]
+        latences = []
+
+        def executer(texte):
+            debut = time.perf_counter()
+            result = agent.process_request(texte)
+            latences.append(time.perf_counter() - debut)
+            return result["success"]
+
+        debut = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrence) as executor:
+            succes = sum(executor.map(executer, demandes))
+        duree = time.perf_counter() - debut
+        resultats[f"c{concurrence}"] = {
+            "p50_ms": percentile(latences, 0.50) * 1000,
+            "p95_ms": percentile(latences, 0.95) * 1000,
+            "debit_req_s": nb_requetes / duree,
+            "succes": succes / nb_requetes,
+        }
+    return resultats
+
+# --- RÉFÉRENCE ---
+
+def aplatir(mesures: dict, prefixe: str = "") -> dict:
+    plat = {}
+    for cle, valeur in mesures.items():
+        if isinstance(valeur, dict):
+            plat.update(aplatir(valeur, f"{prefixe}{cle}."))
+        else:
+            plat[f"{prefixe}{cle}"] = valeur
+    return plat
+
+def comparer(mesures: dict, reference: dict, tolerance: float) -> list:
+    """Régressions [(mesure, référence, actuel)] : temps plus longs, débit ou succès plus faibles."""
+    regressions = []
+    actuelles = aplatir(mesures)
+    for cle, ref in aplatir(reference).items():
+        actuel = actuelles.get(cle)
+        if actuel is None:
+            continue
+        plus_grand_est_mieux = cle.endswith(("debit_req_s", "succes"))
+        if plus_grand_est_mieux:
+            if actuel < ref * (1 - tolerance):
+                regressions.append((cle, ref, actuel))
+        elif max(actuel, ref) >= PLANCHER_MS and actuel > ref * (1 + tolerance):
+            regressions.append((cle, ref, actuel))
+    return regressions
+
+def _profil(valeur: str) -> tuple:
+    service, _, reglages = valeur.partition("=")
+    if service not in PROFILS_DEFAUT:
+        raise argparse.ArgumentTypeError(f"service inconnu : {service} ({', '.join(PROFILS_DEFAUT)})")
+    parties = [float(x) for x in reglages.split(":")] if reglages else []
+    return service, ProfilService(*parties)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks hors-ligne du planificateur.")
+    parser.add_argument("--concurrence", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requetes", type=int, default=8, help="Requêtes par niveau de concurrence")
+    parser.add_argument("--mode", choices=["prefetch", "react"], default="prefetch")
+    parser.add_argument("--service", type=_profil, action="append", default=[], metavar="SERVICE=LATENCE:GIGUE:ERREURS")
+    parser.add_argument("--micro-seulement", action="store_true")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    services = ServicesSimules(dict(args.service)).demarrer()
+    cache_dir = tempfile.mkdtemp(prefix="bench-cache-")
+    # Avant tout import du projet : les URLs et caches sont lus à l'import des modules
+    os.environ.update(services.variables_env())
+    os.environ.update({
+        "FLIGHT_CACHE_PATH": os.path.join(cache_dir, "flights.sqlite"),
+        "GEOCODE_CACHE_PATH": os.path.join(cache_dir, "geocode.sqlite"),
+        # Chaque recherche de vols va jusqu'aux fournisseurs (simulés)
+        "FLIGHT_CACHE_TTL": "0", "FLIGHT_CACHE_MAX_STALE": "0",
+        "TOOL_MAX_WORKERS": str(max(4, 3 * max(args.concurrence))),
+    })
+
+    try:
+        mesures = {"micro": micro_benchmarks()}
+        if not args.micro_seulement:
+            mesures["e2e"] = bout_en_bout(args.concurrence, args.requetes, args.mode)
+    finally:
+        services.arreter()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print("\n📊 Résultats")
+    for cle, valeur in aplatir(mesures).items():
+        print(f"  {cle:45} {valeur:12.3f}")
+    print(f"  appels simulés : {services.compteurs}")
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(mesures, f, indent=2)
+        print(f"💾 Référence enregistrée : {BASELINE_PATH}")
+        return 0
+
+    if not os.path.exists(BASELINE_PATH):
+        print("ℹ️ Pas de référence (--save-baseline pour en créer une)")
+        return 0
+    with open(BASELINE_PATH, encoding="utf-8") as f:
+        reference = json.load(f)
+    regressions = comparer(mesures, reference, args.tolerance)
+    for cle, ref, actuel in regressions:
+        print(f"❌ Régression {cle} : {ref:.3f} -> {actuel:.3f}")
+    if not regressions:
+        print(f"✅ Aucune régression (tolérance {args.tolerance:.0%})")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
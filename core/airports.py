@@ -0,0 +1,359 @@
+import bisect
+import difflib
+import math
+import os
+import pickle
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from core import normalisation
+from core.gazetteer import CACHE_DIR, DATA_DIR, GAZETTEER_PATH, lignes_gazetteer, lire_csv
+from core.normalisation import normaliser_ville
+
+# --- CONFIGURATION ---
+
+AIRPORTS_PATH = os.path.join(DATA_DIR, "airports.csv")
+METRO_CODES_PATH = os.path.join(DATA_DIR, "metro_codes.csv")
+# Index construit, sérialisé : reconstruit seulement si une source (données ou code) change
+AIRPORT_INDEX_CACHE_PATH = os.getenv("AIRPORT_INDEX_CACHE_PATH", os.path.join(CACHE_DIR, "airports.pickle"))
+SOURCES_INDEX = (AIRPORTS_PATH, METRO_CODES_PATH, GAZETTEER_PATH, __file__, normalisation.__file__)
+
+FUZZY_CUTOFF = 0.85
+# Noms courts : une faute de frappe y change trop le sens ("san" -> Sanaa)
+FUZZY_MIN_LEN = 5
+FUZZY_CUTOFF_COURT = 0.9
+FUZZY_COURT_LEN = 8
+FUZZY_MAX_ECART = 2
+PREFIX_MIN_LEN = 4
+# Précision de pays ou de région en fin de saisie : "Paris, France", "Tokyo (Japon)"
+PRECISION_PAYS = re.compile(r"\s*(?:,.*|\(.*)$")
+# Saisies approchées (préfixe, faute de frappe) mémorisées par processus (LRU)
+APPROCHES_MAX = 4096
+
+# Noms alternatifs d'une ville d'aéroport ("Chicago/Aurora", "Medan, Sumatra Island", "Sukarata(Solo)").
+# Le tiret lie un nom composé (Port-au-Prince, Wilkes-Barre), sauf devant une île ("Denpasar-Bali Island").
+SEPARATEURS_VILLE = re.compile(r"[/,(]|-(?=[^-]* islands?\b)", re.IGNORECASE)
+VARIANTE_MIN_LEN = 4
+
+# Rayon dans lequel un aéroport international est préféré à un aérodrome plus proche
+NEAREST_INTERNATIONAL_KM = 150
+# Rattachement d'une entrée du gazetteer sans aéroport à son nom (Kyoto, Bali, Toscane...)
+GAZETTEER_LOCAL_AIRPORT_KM = 10
+# L'aéroport international d'une ville est souvent hors les murs (San Juan -> SJU à 11 km, pas l'aérodrome SIG)
+GAZETTEER_LOCAL_INTERNATIONAL_KM = 20
+GAZETTEER_AIRPORT_KM = 80
+GAZETTEER_ANY_AIRPORT_KM = 25
+
+RANG_INCONNU = 10 ** 6
+
+@dataclass(frozen=True, slots=True)
+class Aeroport:
+    iata: str
+    nom: str
+    ville: str
+    pays: str
+    lat: float
+    lon: float
+
+    @property
+    def international(self) -> bool:
+        return "international" in self.nom.lower() or "intl" in self.nom.lower()
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distance orthodromique (haversine) en kilomètres."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(a))
+
+def _variantes_ville(ville: str) -> set:
+    """"Denpasar-Bali Island" -> {"denpasar bali island", "denpasar", "bali island", "bali"} ;
+    "Port-au-Prince" -> {"port au prince"} (pas de fragment "port")."""
+    complet = normaliser_ville(ville)
+    variantes = {complet, re.sub(r" city$", "", complet)}
+    parties = SEPARATEURS_VILLE.split(ville)
+    if len(parties) > 1:
+        # "Island" n'est retiré que d'un nom alternatif : "Grand Island" seul reste entier
+        for partie in map(normaliser_ville, (p.strip(" )") for p in parties)):
+            for variante in (partie, re.sub(r" (island|islands|city)$", "", partie)):
+                if len(variante) >= VARIANTE_MIN_LEN:
+                    variantes.add(variante)
+    return {v for v in variantes if v}
+
+# --- INDEX ---
+
+class AirportIndex:
+    """Index hors-ligne des aéroports : noms de villes multilingues -> code IATA.
+
+    Un code est soit un code métropolitain (PAR, LON, TYO...) pour les villes à
+    plusieurs aéroports, soit le code de l'aéroport. Recherche exacte, par préfixe,
+    approchée, et plus proche aéroport via une grille de 1° x 1°.
+    """
+
+    def __init__(self, aeroports: list, metros: dict, gazetteer: list):
+        self.par_code = {a.iata: a for a in aeroports}
+        self.metros = metros
+        self.grille = {}
+        for a in aeroports:
+            self.grille.setdefault((math.floor(a.lat), math.floor(a.lon)), []).append(a)
+
+        metro_par_ville = {(normaliser_ville(ville), pays): code for code, (ville, pays, _) in metros.items()}
+        metro_par_aeroport = {iata: code for code, (_, _, membres) in metros.items() for iata in membres}
+
+        groupes = {}
+        for a in aeroports:
+            groupes.setdefault((normaliser_ville(a.ville), a.pays), []).append(a)
+
+        def code_groupe(cle, membres):
+            code = metro_par_ville.get(cle)
+            if code is None:
+                principal = next((a for a in membres if a.international), membres[0])
+                code = metro_par_aeroport.get(principal.iata, principal.iata)
+            return code
+
+        # Priorité (plus petit = meilleur) : nom officiel avant alias, code métropolitain,
+        # rang du gazetteer (destinations puis population), aéroport international
+        candidats = {}
+        def ajouter(cle, priorite, code):
+            if cle:
+                candidats.setdefault(cle, []).append((priorite, code))
+
+        rangs = {}
+        for rang, (nom, pays, lat, lon, aliases) in enumerate(gazetteer):
+            cle = (normaliser_ville(nom), pays)
+            rangs.setdefault(cle, rang)
+            # Rattachement par nom local (Florence -> Firenze), sinon à l'aéroport le plus proche
+            groupe = next((g for g in [cle] + [(a, pays) for a in aliases] if g in groupes), None)
+            if groupe:
+                rangs.setdefault(groupe, rang)
+                code = code_groupe(groupe, groupes[groupe])
+            else:
+                proche = self._aeroport_de_rattachement(lat, lon)
+                if proche is None:
+                    continue
+                code = metro_par_aeroport.get(proche.iata, proche.iata)
+            metro = 0 if code in metros else 1
+            ajouter(cle[0], (0, metro, rang, 0), code)
+            for alias in aliases:
+                ajouter(alias, (1, metro, rang, 0), code)
+
+        for cle, membres in groupes.items():
+            code = code_groupe(cle, membres)
+            inter = 0 if any(a.international for a in membres) else 1
+            priorite = (0, 0 if code in metros else 1, rangs.get(cle, RANG_INCONNU), inter)
+            for variante in set().union(*(_variantes_ville(a.ville) for a in membres)):
+                ajouter(variante, priorite, code)
+
+        self.exact = {cle: min(options)[1] for cle, options in candidats.items()}
+        self._priorite = {cle: min(options)[0] for cle, options in candidats.items()}
+        self.cles = sorted(self.exact)
+        self._par_initiale = {}
+        for cle in self.cles:
+            self._par_initiale.setdefault((cle[:2], len(cle)), []).append(cle)
+        self._initialiser_approches()
+
+    def _initialiser_approches(self):
+        self._approches = OrderedDict()
+        self._approches_lock = threading.Lock()
+
+    def __getstate__(self):
+        # Index sérialisé sans le mémo des saisies approchées (ni son verrou)
+        etat = dict(self.__dict__)
+        del etat["_approches"], etat["_approches_lock"]
+        return etat
+
+    def __setstate__(self, etat):
+        self.__dict__.update(etat)
+        self._initialiser_approches()
+
+    # --- Recherche par nom ---
+
+    def chercher(self, ville: str):
+        """Code IATA (métropolitain ou aéroport) pour un nom de ville, ou None."""
+        brut = (ville or "").strip()
+        if len(brut) == 3 and brut.isupper() and (brut in self.par_code or brut in self.metros):
+            return brut
+        cle = normaliser_ville(brut)
+        if not cle:
+            return None
+        code = self._chercher_exact(cle)
+        # Sans correspondance telle quelle, le pays précisé est ignoré ("Bali, Indonésie" -> "bali")
+        ville = normaliser_ville(PRECISION_PAYS.sub("", brut))
+        if code is None and ville and ville != cle:
+            cle = ville
+            code = self._chercher_exact(cle)
+        if code is None:
+            code = self._approche(cle)
+        return code
+
+    def _chercher_exact(self, cle: str):
+        # Formes exactes avant toute approximation : telle quelle, sans espaces
+        # ("porto rico" -> alias "portorico"), abréviation de saint ("saint denis" -> "st denis")
+        formes = (cle, cle.replace(" ", ""), re.sub(r"\bsainte? ", "st ", cle))
+        return next((self.exact[f] for f in formes if f in self.exact), None)
+
+    def _approche(self, cle: str):
+        """Préfixe ou faute de frappe, mémorisés (LRU) : seule la première saisie coûte quelques ms."""
+        with self._approches_lock:
+            if cle in self._approches:
+                self._approches.move_to_end(cle)
+                return self._approches[cle]
+        codes = self._codes_prefixe(cle)
+        if len(codes) == 1:
+            code = codes.pop()
+        else:
+            # Préfixe ambigu : ni choix au hasard, ni faute de frappe supposée ("santa" -> "santan")
+            code = None if codes else self.chercher_approche(cle)
+        with self._approches_lock:
+            self._approches[cle] = code
+            while len(self._approches) > APPROCHES_MAX:
+                self._approches.popitem(last=False)
+        return code
+
+    def chercher_prefixe(self, cle: str):
+        """Code du début de nom saisi, s'il ne désigne qu'une ville ("marrak" -> RAK, "bangk" -> BKK) :
+        un préfixe ambigu ("port", "grand", "santa") ne choisit pas au hasard."""
+        codes = self._codes_prefixe(cle)
+        return codes.pop() if len(codes) == 1 else None
+
+    def _codes_prefixe(self, cle: str) -> set:
+        """Codes des noms commençant par `cle` ; un nom qui en prolonge un autre ("bangkok don
+        mueang" après "bangkok") désigne la même ville et n'ajoute pas de code."""
+        if len(cle) < PREFIX_MIN_LEN:
+            return set()
+        debut = bisect.bisect_left(self.cles, cle)
+        fin = bisect.bisect_left(self.cles, cle + "￿")
+        racines = []
+        for c in self.cles[debut:fin]:
+            if not (racines and c.startswith(racines[-1] + " ")):
+                racines.append(c)
+        return {self.exact[c] for c in racines}
+
+    def chercher_approche(self, cle: str):
+        if len(cle) < FUZZY_MIN_LEN:
+            return None
+        # Candidats de mêmes deux premières lettres et de longueur voisine (clés courtes exclues)
+        candidats = [
+            c for n in range(max(len(cle) - FUZZY_MAX_ECART, FUZZY_MIN_LEN), len(cle) + FUZZY_MAX_ECART + 1)
+            for c in self._par_initiale.get((cle[:2], n), ())
+        ]
+        cutoff = FUZZY_CUTOFF if len(cle) >= FUZZY_COURT_LEN else FUZZY_CUTOFF_COURT
+        proches = difflib.get_close_matches(cle, candidats, n=3, cutoff=cutoff)
+        if not proches:
+            return None
+        return self.exact[min(proches, key=lambda c: self._priorite[c])]
+
+    def est_ville(self, cle: str) -> bool:
+        """Correspondance exacte sur une clé déjà normalisée (utilisé par l'analyse rapide)."""
+        return cle in self.exact
+
+    # --- Codes et géographie ---
+
+    def aeroports(self, code: str) -> list:
+        """Codes aéroports couverts par un code : la liste du métropolitain, ou le code lui-même."""
+        if code in self.metros:
+            return list(self.metros[code][2])
+        return [code]
+
+    def aeroport_principal(self, code: str) -> str:
+        return self.aeroports(code)[0]
+
+    def _aeroport_de_rattachement(self, lat: float, lon: float):
+        """Aéroport de la destination elle-même (international à moins de 20 km, sinon tout aéroport
+        à moins de 10 km), sinon international à moins de 80 km, sinon tout aéroport à moins de 25 km."""
+        meilleur, meilleur_inter = self._voisins(lat, lon, range(0, 2))
+        if meilleur_inter and meilleur_inter[0] <= GAZETTEER_LOCAL_INTERNATIONAL_KM:
+            return meilleur_inter[1]
+        if meilleur and meilleur[0] <= GAZETTEER_LOCAL_AIRPORT_KM:
+            return meilleur[1]
+        if meilleur_inter and meilleur_inter[0] <= GAZETTEER_AIRPORT_KM:
+            return meilleur_inter[1]
+        if meilleur and meilleur[0] <= GAZETTEER_ANY_AIRPORT_KM:
+            return meilleur[1]
+        return None
+
+    def plus_proche(self, lat: float, lon: float):
+        """Aéroport le plus proche, en préférant un aéroport international à moins de 150 km."""
+        meilleur, meilleur_inter = self._voisins(lat, lon, range(0, 30))
+        if meilleur_inter and meilleur_inter[0] <= NEAREST_INTERNATIONAL_KM:
+            return meilleur_inter[1]
+        return meilleur[1] if meilleur else None
+
+    def _voisins(self, lat: float, lon: float, rayons):
+        """Parcourt la grille en anneaux : ((distance, aéroport), (distance, international)) les plus proches."""
+        cellule_lat, cellule_lon = math.floor(lat), math.floor(lon)
+        meilleur, meilleur_inter = None, None
+        for rayon in rayons:
+            for dlat in range(-rayon, rayon + 1):
+                for dlon in range(-rayon, rayon + 1):
+                    if max(abs(dlat), abs(dlon)) != rayon:
+                        continue
+                    for a in self.grille.get((cellule_lat + dlat, (cellule_lon + dlon + 180) % 360 - 180), ()):
+                        d = distance_km(lat, lon, a.lat, a.lon)
+                        if meilleur is None or d < meilleur[0]:
+                            meilleur = (d, a)
+                        if a.international and (meilleur_inter is None or d < meilleur_inter[0]):
+                            meilleur_inter = (d, a)
+            # Distance minimale jusqu'aux cellules non explorées (elles rétrécissent en longitude vers les pôles)
+            borne = rayon * 111 * max(math.cos(math.radians(min(abs(lat) + rayon, 89))), 0.1)
+            if meilleur and borne > max(meilleur[0], NEAREST_INTERNATIONAL_KM):
+                break
+        return meilleur, meilleur_inter
+
+# --- CHARGEMENT PARESSEUX ---
+
+def construire_index() -> AirportIndex:
+    """Construit l'index depuis les CSV de data/ (~0,8 s)."""
+    aeroports = [
+        Aeroport(r["iata"], r["nom"], r["ville"], r["pays"], float(r["lat"]), float(r["lon"]))
+        for r in lire_csv(AIRPORTS_PATH)
+    ]
+    metros = {
+        r["metro"]: (r["ville"], r["pays"], tuple(r["aeroports"].split("|")))
+        for r in lire_csv(METRO_CODES_PATH)
+    }
+
+    # Alias multilingues du gazetteer (Londres, Pékin, Genève...) rattachés aux villes desservies
+    gazetteer = [
+        (
+            row["nom"], row["pays"], float(row["lat"]), float(row["lon"]),
+            [normaliser_ville(a) for a in row["alias"].split("|")] if row["alias"] else []
+        )
+        for row in lignes_gazetteer()
+    ]
+    return AirportIndex(aeroports, metros, gazetteer)
+
+def _empreinte_sources() -> tuple:
+    return tuple((os.path.getmtime(p), os.path.getsize(p)) for p in SOURCES_INDEX)
+
+def _charger_index_serialise(empreinte: tuple):
+    try:
+        with open(AIRPORT_INDEX_CACHE_PATH, "rb") as f:
+            sauvegarde = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+        return None
+    return sauvegarde["index"] if sauvegarde.get("empreinte") == empreinte else None
+
+def _serialiser_index(index: AirportIndex, empreinte: tuple):
+    temporaire = f"{AIRPORT_INDEX_CACHE_PATH}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(AIRPORT_INDEX_CACHE_PATH), exist_ok=True)
+        with open(temporaire, "wb") as f:
+            pickle.dump({"empreinte": empreinte, "index": index}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # Remplacement atomique : un autre processus ne lit jamais un fichier à moitié écrit
+        os.replace(temporaire, AIRPORT_INDEX_CACHE_PATH)
+    except OSError as e:
+        print(f"⚠️ Index aéroports non sérialisé: {e}")
+
+@lru_cache(maxsize=1)
+def get_airport_index() -> AirportIndex:
+    """Index chargé au premier appel (une seule fois par processus) : depuis sa version
+    sérialisée si les sources n'ont pas changé, sinon construit puis sérialisé."""
+    empreinte = _empreinte_sources()
+    index = _charger_index_serialise(empreinte)
+    if index is None:
+        index = construire_index()
+        _serialiser_index(index, empreinte)
+    return index
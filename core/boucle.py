@@ -0,0 +1,43 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads de la boucle partagée pour les appels synchrones délégués (SerpAPI, géométrie d'itinéraire)
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "16"))
+
+_boucle = None
+_boucle_lock = threading.Lock()
+
+# --- BOUCLE PARTAGÉE (API SYNCHRONE) ---
+
+def boucle_partagee() -> asyncio.AbstractEventLoop:
+    """Boucle asyncio d'arrière-plan (un thread) qui exécute les requêtes synchrones du processus."""
+    global _boucle
+    with _boucle_lock:
+        if _boucle is None:
+            boucle = asyncio.new_event_loop()
+            boucle.set_default_executor(ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="agent-tool"))
+            threading.Thread(target=boucle.run_forever, name="agent-loop", daemon=True).start()
+            _boucle = boucle
+        return _boucle
+
+def executer(coroutine):
+    """Exécute une coroutine sur la boucle partagée et attend son résultat (API synchrone).
+
+    La tâche hérite des contextvars de l'appelant (trace, vols collectés pour la requête).
+    À appeler hors du thread de la boucle, qui se bloquerait sur elle-même.
+    """
+    boucle = boucle_partagee()
+    try:
+        courante = asyncio.get_running_loop()
+    except RuntimeError:
+        courante = None
+    if courante is boucle:
+        coroutine.close()
+        raise RuntimeError("Appel synchrone depuis la boucle partagée : utiliser la version asynchrone")
+    future = asyncio.run_coroutine_threadsafe(coroutine, boucle)
+    try:
+        return future.result()
+    finally:
+        future.cancel()
@@ -0,0 +1,154 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# --- CONFIGURATION ---
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+FLIGHT_CACHE_PATH = os.getenv("FLIGHT_CACHE_PATH", os.path.join(ROOT_DIR, ".cache", "flights.sqlite"))
+
+# Au-delà du TTL, l'entrée est servie telle quelle et rafraîchie en arrière-plan
+FLIGHT_CACHE_TTL = float(os.getenv("FLIGHT_CACHE_TTL", str(6 * 3600)))
+# Entrée partielle (un fournisseur en échec ou hors délai) : rafraîchie bien plus tôt
+FLIGHT_CACHE_TTL_PARTIEL = float(os.getenv("FLIGHT_CACHE_TTL_PARTIEL", str(10 * 60)))
+# Au-delà de cet âge, l'entrée est considérée trop vieille pour être servie
+FLIGHT_CACHE_MAX_STALE = float(os.getenv("FLIGHT_CACHE_MAX_STALE", str(48 * 3600)))
+
+# --- CACHE ---
+
+class FlightCache:
+    """Cache SQLite des résultats fournisseurs, avec stale-while-revalidate.
+
+    Clé : (IATA départ, IATA arrivée, date aller, date retour, adultes, enfants).
+    Payload : {fournisseur: vols}, None pour un fournisseur en échec ou hors délai. Une entrée
+    complète (aucun None) vit `ttl` ; une entrée partielle `ttl_partiel`, et ne remplace jamais
+    une entrée complète encore servable.
+    """
+
+    def __init__(self, path: str, ttl: float = FLIGHT_CACHE_TTL, max_stale: float = FLIGHT_CACHE_MAX_STALE,
+                 ttl_partiel: float = FLIGHT_CACHE_TTL_PARTIEL):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl
+        self.ttl_partiel = ttl_partiel
+        self.max_stale = max_stale
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS flights (cle TEXT PRIMARY KEY, payload TEXT, fetched_at REAL, complet INTEGER DEFAULT 0)"
+        )
+        colonnes = {row[1] for row in self._conn.execute("PRAGMA table_info(flights)")}
+        if "complet" not in colonnes:
+            # Entrées antérieures : complétude inconnue, traitées comme partielles
+            self._conn.execute("ALTER TABLE flights ADD COLUMN complet INTEGER DEFAULT 0")
+        self._conn.commit()
+        self._refreshing = set()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="flight-cache-refresh")
+        self._stats = {
+            "hits": 0, "stale_hits": 0, "misses": 0,
+            "refreshes": 0, "refresh_errors": 0,
+            "age_total": 0.0, "age_max": 0.0
+        }
+
+    @staticmethod
+    def _cle(cle: tuple) -> str:
+        return "|".join("" if part is None else str(part) for part in cle)
+
+    @staticmethod
+    def est_complet(payload: dict) -> bool:
+        """Vrai si tous les fournisseurs du payload ont répondu (aucun échec ni retard)."""
+        return all(vols is not None for vols in payload.values())
+
+    def get(self, cle: tuple):
+        """Retourne (payload, âge en secondes, complet) ou None si absent."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, fetched_at, complet FROM flights WHERE cle = ?", (self._cle(cle),)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), time.time() - row[1], bool(row[2])
+
+    def set(self, cle: tuple, payload: dict):
+        """Écrit l'entrée, sauf un payload partiel sur une entrée complète encore servable (False)."""
+        complet = self.est_complet(payload)
+        with self._lock:
+            if not complet:
+                row = self._conn.execute(
+                    "SELECT fetched_at, complet FROM flights WHERE cle = ?", (self._cle(cle),)
+                ).fetchone()
+                if row is not None and row[1] and time.time() - row[0] <= self.max_stale:
+                    return False
+            self._conn.execute(
+                "INSERT OR REPLACE INTO flights (cle, payload, fetched_at, complet) VALUES (?, ?, ?, ?)",
+                (self._cle(cle), json.dumps(payload), time.time(), int(complet))
+            )
+            self._conn.commit()
+        return True
+
+    def lookup(self, cle: tuple, fetch):
+        """Payload servable (frais, ou périmé et rafraîchi en arrière-plan via fetch), sinon None."""
+        entree = self.get(cle)
+        if entree is None or entree[1] > self.max_stale:
+            self._compter("misses")
+            return None
+        payload, age, complet = entree
+        frais = age <= (self.ttl if complet else self.ttl_partiel)
+        self._compter("hits" if frais else "stale_hits", age)
+        if not frais:
+            self._rafraichir(cle, fetch)
+        print(f"💾 Cache vols {'frais' if frais else 'périmé'}{'' if complet else ' partiel'} ({age / 60:.0f} min): {self._cle(cle)}")
+        return payload
+
+    def store(self, cle: tuple, payload: dict):
+        """Mémorise un résultat s'il contient au moins un vol (voir set pour les entrées partielles)."""
+        if any(payload.values()):
+            self.set(cle, payload)
+
+    def get_or_fetch(self, cle: tuple, fetch) -> dict:
+        """Sert le cache si possible, sinon appelle fetch() et mémorise un résultat non vide."""
+        payload = self.lookup(cle, fetch)
+        if payload is None:
+            payload = fetch()
+            self.store(cle, payload)
+        return payload
+
+    def _rafraichir(self, cle: tuple, fetch):
+        with self._lock:
+            if cle in self._refreshing:
+                return
+            self._refreshing.add(cle)
+        self._executor.submit(self._tache_rafraichissement, cle, fetch)
+
+    def _tache_rafraichissement(self, cle: tuple, fetch):
+        try:
+            self.store(cle, fetch())
+            self._compter("refreshes")
+        except Exception as e:
+            print(f"❌ Rafraîchissement cache vols {self._cle(cle)}: {e}")
+            self._compter("refresh_errors")
+        finally:
+            with self._lock:
+                self._refreshing.discard(cle)
+
+    def _compter(self, compteur: str, age: float = None):
+        with self._lock:
+            self._stats[compteur] += 1
+            if age is not None:
+                self._stats["age_total"] += age
+                self._stats["age_max"] = max(self._stats["age_max"], age)
+
+    def statistiques(self) -> dict:
+        """Compteurs hit/miss/âge, pour ajuster le TTL face à la facture des fournisseurs."""
+        with self._lock:
+            stats = dict(self._stats)
+        servis = stats["hits"] + stats["stale_hits"]
+        total = servis + stats["misses"]
+        stats["hit_rate"] = servis / total if total else 0.0
+        stats["age_moyen"] = stats.pop("age_total") / servis if servis else 0.0
+        stats["ttl"] = self.ttl
+        return stats
+
+flight_cache = FlightCache(FLIGHT_CACHE_PATH)
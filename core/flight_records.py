@@ -0,0 +1,202 @@
+import contextvars
+import queue
+import re
+import threading
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+
+# Références de vols citées par le modèle dans le plan : [V1], [V2]... (hors liens markdown)
+REFERENCE_PATTERN = re.compile(r"\[(V\d+)\](?!\()")
+
+# Vols listés dans le résumé envoyé au modèle (le tableau affiché les contient tous)
+RESUME_MAX_VOLS = 6
+
+_collecte_courante = contextvars.ContextVar("collecte_vols", default=None)
+_file_partiels = contextvars.ContextVar("vols_partiels", default=None)
+_suivi_courant = contextvars.ContextVar("suivi_recherches", default=None)
+
+# --- ENREGISTREMENTS ---
+
+@dataclass(slots=True)
+class Vol:
+    compagnie: str
+    prix: int
+    devise: str
+    heure_dep: str
+    heure_arr: str
+    source: str
+    id: str = ""
+    # Dates de la combinaison (calendrier de prix en dates flexibles)
+    aller: str = None
+    retour: str = None
+    # Escales et durée totale (minutes), quand le fournisseur les donne
+    escales: int = None
+    duree: int = None
+
+    @classmethod
+    def depuis_fournisseur(cls, vol: dict, aller: str = None, retour: str = None) -> "Vol":
+        """Vol à partir du dictionnaire renvoyé (et mis en cache) par un fournisseur."""
+        return cls(
+            compagnie=vol["compagnie"], prix=int(vol["prix"]), devise=vol.get("devise", "EUR"),
+            heure_dep=vol.get("heure_dep", "N/A"), heure_arr=vol.get("heure_arr", "N/A"),
+            source=vol["source"], aller=aller, retour=retour,
+            escales=_entier(vol.get("escales")), duree=_entier(vol.get("duree"))
+        )
+
+    def details(self) -> str:
+        """", direct, 13h40" (vide si le fournisseur ne donne ni escales ni durée)."""
+        details = ""
+        if self.escales is not None:
+            details += ", direct" if self.escales == 0 else f", {self.escales} escale(s)"
+        if self.duree:
+            details += f", {self.duree // 60}h{self.duree % 60:02d}"
+        return details
+
+    def libelle(self) -> str:
+        return f"**{self.compagnie}, {self.prix} {self.devise}** ({self.id})"
+
+@dataclass(slots=True)
+class RechercheVols:
+    """Résultat d'une recherche de vols : affiché tel quel par l'interface et le PDF."""
+    code_dep: str
+    code_arr: str
+    date_dep: str
+    date_ret: str
+    voyageurs: int
+    vols: list = field(default_factory=list)
+    liens: dict = field(default_factory=dict)  # {"Skyscanner": url, "Google Flights": url}
+    estimation: bool = False
+    # Dates flexibles : ±jours explorés et "n/total" combinaisons avec un prix
+    flexibilite: int = 0
+    couverture: str = None
+
+    def resume(self) -> str:
+        """Résumé court destiné au modèle : une ligne par vol, référencée par identifiant."""
+        trajet = f"{self.code_dep} → {self.code_arr}"
+        if not self.vols:
+            return f"⚠️ Aucun vol trouvé {trajet}. Liens de recherche ajoutés automatiquement au plan."
+
+        if self.flexibilite:
+            entete = f"📅 Meilleures dates {trajet} (±{self.flexibilite} jours, {self.couverture} combinaisons avec un prix)"
+        else:
+            entete = f"✈️ Vols {trajet}, {_jour(self.date_dep)}" + (f" → {_jour(self.date_ret)}" if self.date_ret else "")
+        entete += f", prix total pour {self.voyageurs} voyageur(s)"
+        if self.estimation:
+            entete += " — ESTIMATIONS (aucun fournisseur n'a répondu)"
+
+        prix_min = min(v.prix for v in self.vols)
+        lignes = [entete + " :"]
+        for v in self.vols[:RESUME_MAX_VOLS]:
+            dates = f"{_jour(v.aller)} → {_jour(v.retour) if v.retour else 'aller simple'} : " if v.aller else ""
+            badge = " 🟢 meilleur prix" if v.prix == prix_min else ""
+            lignes.append(f"[{v.id}] {dates}{v.compagnie} {v.prix} {v.devise}, {v.heure_dep}→{v.heure_arr}{v.details()} ({v.source}){badge}")
+        if len(self.vols) > RESUME_MAX_VOLS:
+            lignes.append(f"(+{len(self.vols) - RESUME_MAX_VOLS} autres, plus chers, dans le tableau)")
+        lignes.append("Cite les vols par identifiant ([V1]...) : tableau détaillé et liens de réservation sont ajoutés automatiquement.")
+        return "\n".join(lignes)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def depuis_dict(cls, donnees: dict) -> "RechercheVols":
+        return cls(**{**donnees, "vols": [Vol(**v) for v in donnees["vols"]]})
+
+def _entier(valeur) -> int:
+    # None ou NaN (colonne vide de la table de classement) -> None
+    return None if valeur is None or valeur != valeur else int(valeur)
+
+def _jour(date: str) -> str:
+    return f"{date[8:10]}/{date[5:7]}" if date and date[:1].isdigit() else (date or "")
+
+# --- COLLECTE PAR REQUÊTE ---
+
+class CollecteVols:
+    """Recherches de vols d'une requête ; les identifiants V1, V2... y sont uniques."""
+
+    def __init__(self):
+        self.recherches = []
+        self._lock = threading.Lock()
+
+    def ajouter(self, recherche: RechercheVols):
+        with self._lock:
+            numero = sum(len(r.vols) for r in self.recherches)
+            for i, vol in enumerate(recherche.vols, numero + 1):
+                vol.id = f"V{i}"
+            self.recherches.append(recherche)
+
+@contextmanager
+def collecter_vols():
+    """Rattache les recherches de vols suivantes (y compris dans les threads lancés via
+    core.tracing.propager) à une collecte, renvoyée au gestionnaire de contexte."""
+    collecte = CollecteVols()
+    jeton = _collecte_courante.set(collecte)
+    try:
+        yield collecte
+    finally:
+        _collecte_courante.reset(jeton)
+
+@contextmanager
+def suivre_recherches():
+    """Liste des recherches enregistrées dans le bloc (ex: par un seul appel d'outil),
+    en plus de la collecte de la requête."""
+    recherches = []
+    jeton = _suivi_courant.set(recherches)
+    try:
+        yield recherches
+    finally:
+        _suivi_courant.reset(jeton)
+
+def enregistrer_recherche(recherche: RechercheVols) -> RechercheVols:
+    """Numérote les vols et les ajoute à la collecte active (V1, V2... localement sinon)."""
+    suivi = _suivi_courant.get()
+    if suivi is not None:
+        suivi.append(recherche)
+    collecte = _collecte_courante.get()
+    if collecte is not None:
+        collecte.ajouter(recherche)
+    else:
+        for i, vol in enumerate(recherche.vols, 1):
+            vol.id = f"V{i}"
+    return recherche
+
+def developper_references(texte: str, recherches: list) -> str:
+    """Remplace les références [V1] du plan par la compagnie et le prix du vol."""
+    vols = {v.id: v for r in recherches or [] for v in r.vols}
+    if not vols:
+        return texte
+    return REFERENCE_PATTERN.sub(
+        lambda m: vols[m.group(1)].libelle() if m.group(1) in vols else m.group(0), texte
+    )
+
+# --- RÉSULTATS PARTIELS ---
+
+@contextmanager
+def ecouter_vols_partiels():
+    """File (queue.Queue) recevant des (fournisseur, [Vol]) pendant les recherches de vols
+    suivantes, dès qu'un fournisseur (ou un lot Skyscanner) répond. Chaque élément contient
+    tous les vols reçus de ce fournisseur jusque-là."""
+    file = queue.Queue()
+    jeton = _file_partiels.set(file)
+    try:
+        yield file
+    finally:
+        _file_partiels.reset(jeton)
+
+@contextmanager
+def sans_vols_partiels():
+    """Coupe la publication des résultats partiels (ex: exploration d'une grille de dates)."""
+    jeton = _file_partiels.set(None)
+    try:
+        yield
+    finally:
+        _file_partiels.reset(jeton)
+
+def file_vols_partiels():
+    return _file_partiels.get()
+
+def publier_vols_partiels(fournisseur: str, vols: list):
+    """Publie les vols (dictionnaires fournisseur) reçus jusqu'ici ; sans écoute, ne fait rien."""
+    file = _file_partiels.get()
+    if file is not None:
+        file.put((fournisseur, [Vol.depuis_fournisseur(v) for v in vols if v.get("prix")]))
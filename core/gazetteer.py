@@ -0,0 +1,18 @@
+import csv
+import os
+
+# Fichiers de données hors-ligne (sans dépendance : importable sans client HTTP ni SDK)
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATA_DIR = os.path.join(ROOT_DIR, "data")
+CACHE_DIR = os.path.join(ROOT_DIR, ".cache")
+GAZETTEER_PATH = os.path.join(DATA_DIR, "gazetteer.csv")
+
+def lire_csv(path: str):
+    """Lignes (dict) d'un CSV de data/, commentaires (#) ignorés."""
+    with open(path, encoding="utf-8") as f:
+        yield from csv.DictReader(l for l in f if not l.startswith("#"))
+
+def lignes_gazetteer():
+    """Lignes du gazetteer (dict nom, pays, lat, lon, alias), dans l'ordre du fichier."""
+    yield from lire_csv(GAZETTEER_PATH)
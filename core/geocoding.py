@@ -0,0 +1,156 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from core.boucle import executer
+from core.gazetteer import CACHE_DIR, GAZETTEER_PATH, lignes_gazetteer
+from core.http import http_get_async
+from core.normalisation import normaliser_ville
+
+# --- CONFIGURATION ---
+
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", os.path.join(CACHE_DIR, "geocode.sqlite"))
+GEOCODE_LRU_SIZE = 4096
+# Un échec Nominatim mémorisé est retenté après ce délai (secondes) : nouvelle ville, faute de frappe corrigée côté OSM
+GEOCODE_NEGATIF_TTL = float(os.getenv("GEOCODE_NEGATIF_TTL", str(7 * 24 * 3600)))
+
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+NOMINATIM_USER_AGENT = "TravelPlanner_2025"
+
+def _parametres_nominatim(requete: str) -> dict:
+    return {"params": {"q": requete, "format": "json", "limit": 1}, "headers": {"User-Agent": NOMINATIM_USER_AGENT}}
+
+def _coordonnees(response):
+    response.raise_for_status()
+    resultats = response.json()
+    if not resultats:
+        return None
+    return float(resultats[0]["lat"]), float(resultats[0]["lon"])
+
+async def _nominatim_search(requete: str):
+    # Politique d'usage Nominatim (1 requête/s) : tenue par le seau à jetons du fournisseur (core.http)
+    return _coordonnees(await http_get_async("nominatim", NOMINATIM_URL, **_parametres_nominatim(requete)))
+
+# --- GAZETTEER HORS-LIGNE ---
+
+@lru_cache(maxsize=1)
+def charger_gazetteer() -> dict:
+    """Charge le gazetteer (nom normalisé -> (lat, lon)) une seule fois par processus.
+
+    Les noms officiels sont prioritaires sur les alias ; à nom égal, la première
+    ligne (destination touristique ou ville la plus peuplée) l'emporte.
+    """
+    index = {}
+    alias_rows = []
+    try:
+        for row in lignes_gazetteer():
+            coords = (float(row["lat"]), float(row["lon"]))
+            index.setdefault(normaliser_ville(row["nom"]), coords)
+            if row["alias"]:
+                alias_rows.append((row["alias"].split("|"), coords))
+    except FileNotFoundError:
+        print(f"⚠️ Gazetteer absent: {GAZETTEER_PATH}")
+        return {}
+
+    for aliases, coords in alias_rows:
+        for alias in aliases:
+            index.setdefault(normaliser_ville(alias), coords)
+    return index
+
+# --- CACHE DISQUE (SQLITE) ---
+
+class GeocodeStore:
+    """Cache persistant des résultats Nominatim, partagé entre les threads du processus.
+
+    Les coordonnées trouvées n'expirent pas ; un échec mémorisé expire après `ttl_negatif`.
+    """
+
+    def __init__(self, path: str, ttl_negatif: float = GEOCODE_NEGATIF_TTL):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl_negatif = ttl_negatif
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocode (ville TEXT PRIMARY KEY, lat REAL, lon REAL, expire REAL)"
+        )
+        colonnes = {row[1] for row in self._conn.execute("PRAGMA table_info(geocode)")}
+        if "expire" not in colonnes:
+            # Cache créé avant l'expiration des échecs : ses échecs sont retentés au prochain appel
+            self._conn.execute("ALTER TABLE geocode ADD COLUMN expire REAL")
+            self._conn.execute("UPDATE geocode SET expire = 0 WHERE lat IS NULL")
+        self._conn.commit()
+
+    def get(self, ville_norm: str):
+        """Retourne (trouvé, (lat, lon)) ; (lat, lon) vaut (None, None) pour un échec mémorisé."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT lat, lon, expire FROM geocode WHERE ville = ?", (ville_norm,)
+            ).fetchone()
+        if row is None or (row[2] is not None and row[2] < time.time()):
+            return False, (None, None)
+        return True, (row[0], row[1])
+
+    def set(self, ville_norm: str, lat, lon):
+        expire = time.time() + self.ttl_negatif if lat is None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode (ville, lat, lon, expire) VALUES (?, ?, ?, ?)",
+                (ville_norm, lat, lon, expire)
+            )
+            self._conn.commit()
+
+@lru_cache(maxsize=1)
+def _get_store() -> GeocodeStore:
+    return GeocodeStore(GEOCODE_CACHE_PATH)
+
+# --- GÉOCODAGE À DEUX NIVEAUX ---
+
+# Résultats déjà résolus dans ce processus (LRU), avant le gazetteer et le cache SQLite
+_memoire = OrderedDict()
+_memoire_lock = threading.Lock()
+
+def _memorise(ville_norm: str):
+    with _memoire_lock:
+        coords = _memoire.get(ville_norm)
+        if coords is not None:
+            _memoire.move_to_end(ville_norm)
+        return coords
+
+def _memoriser(ville_norm: str, coords: tuple):
+    with _memoire_lock:
+        _memoire[ville_norm] = coords
+        _memoire.move_to_end(ville_norm)
+        if len(_memoire) > GEOCODE_LRU_SIZE:
+            _memoire.popitem(last=False)
+
+async def _geocoder(ville_norm: str, requete: str) -> tuple:
+    """Gazetteer -> cache SQLite -> Nominatim. Les erreurs réseau ne sont pas mises en cache."""
+    coords = _memorise(ville_norm) or charger_gazetteer().get(ville_norm)
+    if coords:
+        return coords
+
+    store = _get_store()
+    trouve, coords = store.get(ville_norm)
+    if not trouve:
+        print(f"🌐 Nominatim: {requete}")
+        coords = await _nominatim_search(requete) or (None, None)
+        store.set(ville_norm, *coords)
+    if coords[0] is not None:
+        _memoriser(ville_norm, coords)
+    return coords
+
+async def geocoder_ville_async(ville: str) -> tuple:
+    """Coordonnées (lat, lon) d'une ville, ou (None, None) si introuvable."""
+    ville_norm = normaliser_ville(ville or "")
+    if not ville_norm:
+        return None, None
+    try:
+        return await _geocoder(ville_norm, ville.strip())
+    except Exception as e:
+        print(f"❌ Erreur géocodage {ville}: {e}")
+        return None, None
+
+def geocoder_ville(ville: str) -> tuple:
+    return executer(geocoder_ville_async(ville))
@@ -0,0 +1,245 @@
+import asyncio
+import threading
+import weakref
+import httpx
+import requests
+from openai import AsyncOpenAI
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from core.resilience import CircuitBreaker, FournisseurIndisponible, TokenBucket, RATE_LIMIT_WAIT
+
+# --- CONFIGURATION PAR FOURNISSEUR ---
+
+# timeout = (connexion, lecture) en secondes ; retries = tentatives supplémentaires (GET uniquement)
+# max_concurrent = requêtes simultanées autorisées (les rafales, ex: calendrier de prix, font la queue)
+# rate / burst = seau à jetons (requêtes par seconde, rafale maximale) ; None = pas de quota local
+PROVIDERS = {
+    "rapidapi": {"timeout": (3.05, 15), "retries": 1, "max_concurrent": 4, "rate": 5, "burst": 5},
+    "serpapi": {"timeout": (3.05, 20), "retries": 2, "max_concurrent": 6, "rate": 5, "burst": 10},
+    # Recherche web contextuelle : même API que les vols, mais santé suivie séparément
+    "serpapi_web": {"timeout": (3.05, 10), "retries": 1, "max_concurrent": 4, "rate": 5, "burst": 10},
+    "open_meteo": {"timeout": (3.05, 10), "retries": 2, "max_concurrent": 8, "rate": 10, "burst": 20},
+    # Politique d'usage Nominatim : 1 requête/s maximum
+    "nominatim": {"timeout": (3.05, 10), "retries": 2, "max_concurrent": 1, "rate": 1, "burst": 1},
+    # Le SDK OpenAI a son propre client HTTP : seule la limite de concurrence s'applique
+    "openai": {"timeout": (3.05, 60), "retries": 0, "max_concurrent": 8, "rate": None, "burst": None},
+}
+DEFAULT_PROVIDER = {"timeout": (3.05, 15), "retries": 1, "max_concurrent": 4, "rate": None, "burst": None}
+
+POOL_MAXSIZE = 16
+RETRY_BACKOFF = 0.5
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+_sessions = {}
+_semaphores = {}
+_buckets = {}
+_breakers = {}
+_lock = threading.Lock()
+# Clients httpx, client OpenAI et sémaphores asyncio sont liés à la boucle qui les utilise
+_ressources_async = weakref.WeakKeyDictionary()
+
+# --- SESSIONS PARTAGÉES ---
+
+def get_session(provider: str) -> requests.Session:
+    """Session keep-alive propre à un fournisseur (pool de connexions + réutilisation TLS)."""
+    with _lock:
+        session = _sessions.get(provider)
+        if session is None:
+            config = PROVIDERS.get(provider, DEFAULT_PROVIDER)
+            # Seules les méthodes idempotentes sont rejouées, avec backoff exponentiel
+            retry = Retry(
+                total=config["retries"],
+                backoff_factor=RETRY_BACKOFF,
+                status_forcelist=RETRY_STATUS,
+                allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+                respect_retry_after_header=True,
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[provider] = session
+        return session
+
+def limite_fournisseur(provider: str) -> threading.BoundedSemaphore:
+    """Sémaphore partagé par tout le processus, à utiliser en `with` autour d'un appel au fournisseur."""
+    with _lock:
+        semaphore = _semaphores.get(provider)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(PROVIDERS.get(provider, DEFAULT_PROVIDER)["max_concurrent"])
+            _semaphores[provider] = semaphore
+        return semaphore
+
+def configurer_limite(provider: str, max_concurrent: int):
+    """Change la concurrence maximale d'un fournisseur (à appeler avant les premières requêtes)."""
+    with _lock:
+        PROVIDERS.setdefault(provider, dict(DEFAULT_PROVIDER))["max_concurrent"] = max_concurrent
+        _semaphores[provider] = threading.BoundedSemaphore(max_concurrent)
+
+# --- SANTÉ DES FOURNISSEURS ---
+
+def get_bucket(provider: str):
+    """Seau à jetons du fournisseur, ou None s'il n'a pas de quota local."""
+    with _lock:
+        if provider not in _buckets:
+            config = PROVIDERS.get(provider, DEFAULT_PROVIDER)
+            _buckets[provider] = TokenBucket(config["rate"], config["burst"]) if config.get("rate") else None
+        return _buckets[provider]
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    with _lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = _breakers[provider] = CircuitBreaker()
+        return breaker
+
+def etat_fournisseurs() -> dict:
+    """Métriques par fournisseur déjà sollicité : circuit, échecs, rejets, jetons, file d'attente."""
+    with _lock:
+        noms = sorted(set(_breakers) | set(_buckets))
+    etats = {}
+    for provider in noms:
+        bucket = get_bucket(provider)
+        etats[provider] = {**get_breaker(provider).metriques(), **(bucket.metriques() if bucket else {})}
+    return etats
+
+def _est_echec(response: requests.Response) -> bool:
+    return response.status_code == 429 or response.status_code >= 500
+
+def http_request(provider: str, method: str, url: str, **kwargs) -> requests.Response:
+    """Requête HTTP via la session du fournisseur : quota, disjoncteur, timeout et concurrence.
+
+    Lève FournisseurIndisponible immédiatement si le circuit est ouvert ou le quota épuisé.
+    """
+    kwargs.setdefault("timeout", PROVIDERS.get(provider, DEFAULT_PROVIDER)["timeout"])
+    breaker = get_breaker(provider)
+    if breaker.est_ouvert():
+        raise FournisseurIndisponible(f"{provider} : circuit ouvert, appel ignoré")
+    bucket = get_bucket(provider)
+    if bucket and not bucket.acquerir(RATE_LIMIT_WAIT):
+        raise FournisseurIndisponible(f"{provider} : quota local épuisé")
+    if not breaker.autoriser():
+        raise FournisseurIndisponible(f"{provider} : sonde de rétablissement déjà en cours")
+
+    try:
+        with limite_fournisseur(provider):
+            response = get_session(provider).request(method, url, **kwargs)
+    except requests.RequestException as e:
+        breaker.echec(f"{type(e).__name__}: {e}")
+        raise
+    except BaseException:
+        # Erreur locale (ex: interruption) : ne préjuge pas de la santé du fournisseur
+        breaker.liberer()
+        raise
+    if _est_echec(response):
+        breaker.echec(f"HTTP {response.status_code}")
+    else:
+        breaker.succes()
+    return response
+
+def http_get(provider: str, url: str, **kwargs) -> requests.Response:
+    return http_request(provider, "GET", url, **kwargs)
+
+def http_post(provider: str, url: str, **kwargs) -> requests.Response:
+    return http_request(provider, "POST", url, **kwargs)
+
+# --- CLIENTS ASYNCHRONES (PAR BOUCLE ASYNCIO) ---
+
+def _ressources_boucle() -> dict:
+    boucle = asyncio.get_running_loop()
+    with _lock:
+        return _ressources_async.setdefault(boucle, {"clients": {}, "semaphores": {}, "openai": None})
+
+def _timeout_httpx(timeout) -> httpx.Timeout:
+    if isinstance(timeout, tuple):
+        connexion, lecture = timeout
+        return httpx.Timeout(lecture, connect=connexion)
+    return httpx.Timeout(timeout)
+
+def get_client_async(provider: str) -> httpx.AsyncClient:
+    """Client httpx keep-alive d'un fournisseur pour la boucle courante."""
+    ressources = _ressources_boucle()
+    client = ressources["clients"].get(provider)
+    if client is None:
+        config = PROVIDERS.get(provider, DEFAULT_PROVIDER)
+        client = httpx.AsyncClient(
+            timeout=_timeout_httpx(config["timeout"]),
+            limits=httpx.Limits(max_connections=POOL_MAXSIZE, max_keepalive_connections=POOL_MAXSIZE),
+            # Rejoue les échecs de connexion ; les statuts 429/5xx sont rejoués par http_request_async
+            transport=httpx.AsyncHTTPTransport(retries=config["retries"])
+        )
+        ressources["clients"][provider] = client
+    return client
+
+def get_openai_async() -> AsyncOpenAI:
+    """Client AsyncOpenAI de la boucle courante (son pool de connexions ne change pas de boucle)."""
+    ressources = _ressources_boucle()
+    if ressources["openai"] is None:
+        ressources["openai"] = AsyncOpenAI()
+    return ressources["openai"]
+
+def limite_fournisseur_async(provider: str) -> asyncio.Semaphore:
+    """Équivalent asyncio de limite_fournisseur (`async with`), borné par boucle.
+
+    Seau à jetons et disjoncteur restent communs aux appels synchrones et asynchrones.
+    """
+    semaphores = _ressources_boucle()["semaphores"]
+    semaphore = semaphores.get(provider)
+    if semaphore is None:
+        semaphore = semaphores[provider] = asyncio.Semaphore(PROVIDERS.get(provider, DEFAULT_PROVIDER)["max_concurrent"])
+    return semaphore
+
+async def fermer_clients_async():
+    """Ferme les clients de la boucle courante (à appeler avant la fin d'un asyncio.run)."""
+    ressources = _ressources_boucle()
+    for client in ressources["clients"].values():
+        await client.aclose()
+    if ressources["openai"] is not None:
+        await ressources["openai"].close()
+    with _lock:
+        _ressources_async.pop(asyncio.get_running_loop(), None)
+
+async def http_request_async(provider: str, method: str, url: str, **kwargs) -> httpx.Response:
+    """Version asyncio de http_request (mêmes quotas, disjoncteur et timeouts).
+
+    Les GET sont rejoués avec backoff exponentiel sur 429/5xx, comme les sessions requests.
+    """
+    if "timeout" in kwargs:
+        kwargs["timeout"] = _timeout_httpx(kwargs["timeout"])
+    breaker = get_breaker(provider)
+    if breaker.est_ouvert():
+        raise FournisseurIndisponible(f"{provider} : circuit ouvert, appel ignoré")
+    bucket = get_bucket(provider)
+    if bucket and not await bucket.acquerir_async(RATE_LIMIT_WAIT):
+        raise FournisseurIndisponible(f"{provider} : quota local épuisé")
+    if not breaker.autoriser():
+        raise FournisseurIndisponible(f"{provider} : sonde de rétablissement déjà en cours")
+
+    tentatives = 1 + (PROVIDERS.get(provider, DEFAULT_PROVIDER)["retries"] if method == "GET" else 0)
+    try:
+        async with limite_fournisseur_async(provider):
+            client = get_client_async(provider)
+            for tentative in range(tentatives):
+                response = await client.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUS or tentative == tentatives - 1:
+                    break
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** tentative)
+    except httpx.HTTPError as e:
+        breaker.echec(f"{type(e).__name__}: {e}")
+        raise
+    except BaseException:
+        # Annulation (délai d'un outil) ou erreur locale : ne préjuge pas de la santé du fournisseur
+        breaker.liberer()
+        raise
+    if _est_echec(response):
+        breaker.echec(f"HTTP {response.status_code}")
+    else:
+        breaker.succes()
+    return response
+
+async def http_get_async(provider: str, url: str, **kwargs) -> httpx.Response:
+    return await http_request_async(provider, "GET", url, **kwargs)
+
+async def http_post_async(provider: str, url: str, **kwargs) -> httpx.Response:
+    return await http_request_async(provider, "POST", url, **kwargs)
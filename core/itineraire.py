@@ -0,0 +1,90 @@
+import itertools
+from datetime import datetime, timedelta
+from core.airports import distance_km
+from core.tools import extraire_dates, get_lat_lon
+
+# --- CONFIGURATION ---
+
+# Jusqu'à ce nombre d'étapes, toutes les permutations sont essayées (8! = 40 320 circuits)
+ORDRE_EXACT_MAX = 8
+# Nuits par étape quand la demande ne donne pas de date de retour
+NUITS_PAR_ETAPE = 3
+
+# --- DISTANCES ---
+
+def longueur_circuit(distances: list, ordre: list) -> float:
+    """Longueur du circuit origine (indice 0) -> étapes dans `ordre` -> origine."""
+    chemin = [0, *ordre, 0]
+    return sum(distances[i][j] for i, j in zip(chemin, chemin[1:]))
+
+# --- ORDRE DE VISITE ---
+
+def _ordre_exact(distances: list, n: int) -> list:
+    return list(min(itertools.permutations(range(1, n + 1)), key=lambda ordre: longueur_circuit(distances, ordre)))
+
+def _plus_proche_voisin(distances: list, n: int) -> list:
+    ordre, restantes, courant = [], set(range(1, n + 1)), 0
+    while restantes:
+        courant = min(restantes, key=lambda j: distances[courant][j])
+        ordre.append(courant)
+        restantes.remove(courant)
+    return ordre
+
+def _deux_opt(distances: list, ordre: list) -> list:
+    """Inverse des segments tant que le circuit raccourcit (origine fixe aux deux bouts)."""
+    chemin = [0, *ordre, 0]
+    ameliore = True
+    while ameliore:
+        ameliore = False
+        for i in range(1, len(chemin) - 2):
+            for j in range(i + 1, len(chemin) - 1):
+                a, b, c, d = chemin[i - 1], chemin[i], chemin[j], chemin[j + 1]
+                if distances[a][c] + distances[b][d] < distances[a][b] + distances[c][d] - 1e-9:
+                    chemin[i:j + 1] = reversed(chemin[i:j + 1])
+                    ameliore = True
+    return chemin[1:-1]
+
+def ordonner_etapes(origine: str, etapes: list) -> list:
+    """Ordre de visite des étapes qui minimise le circuit au départ et au retour de `origine`.
+
+    Coordonnées via get_lat_lon ; exact jusqu'à ORDRE_EXACT_MAX étapes, au-delà plus proche
+    voisin amélioré par 2-opt. Si une ville n'est pas localisée, l'ordre donné est conservé.
+    """
+    if len(etapes) < 3:
+        return list(etapes)
+    points = [get_lat_lon(ville) for ville in [origine, *etapes]]
+    if any(lat is None for lat, _ in points):
+        print("⚠️ Étapes non localisées : ordre de la demande conservé")
+        return list(etapes)
+
+    distances = [[distance_km(*a, *b) for b in points] for a in points]
+    n = len(etapes)
+    ordre = _ordre_exact(distances, n) if n <= ORDRE_EXACT_MAX else _deux_opt(distances, _plus_proche_voisin(distances, n))
+    print(f"🗺️ Circuit optimisé : {longueur_circuit(distances, ordre):.0f} km "
+          f"(ordre demandé : {longueur_circuit(distances, range(1, n + 1)):.0f} km)")
+    return [etapes[i - 1] for i in ordre]
+
+# --- TRONÇONS ---
+
+def repartir_dates(date_dep: str, date_ret: str, nb_etapes: int) -> list:
+    """Dates (ISO) des nb_etapes + 1 vols du circuit : arrivée à chaque étape puis retour.
+
+    Les nuits sont réparties équitablement (les premières étapes reçoivent le reste).
+    """
+    debut = datetime.strptime(date_dep, "%Y-%m-%d")
+    fin = datetime.strptime(date_ret, "%Y-%m-%d") if date_ret else debut + timedelta(days=NUITS_PAR_ETAPE * nb_etapes)
+    nuits, reste = divmod(max((fin - debut).days, nb_etapes), nb_etapes)
+    dates, jour = [debut], debut
+    for i in range(nb_etapes):
+        jour += timedelta(days=nuits + (i < reste))
+        dates.append(jour)
+    return [d.strftime("%Y-%m-%d") for d in dates]
+
+def troncons(trip_data) -> list:
+    """Vols aller simple du circuit : [{"depart", "arrivee", "date"}], origine -> étapes -> origine."""
+    villes = [trip_data.origin, *trip_data.etapes, trip_data.origin]
+    dates = repartir_dates(*extraire_dates(trip_data.dates), len(trip_data.etapes))
+    return [
+        {"depart": depart, "arrivee": arrivee, "date": date}
+        for depart, arrivee, date in zip(villes, villes[1:], dates)
+    ]
@@ -0,0 +1,8 @@
+from unidecode import unidecode
+
+def normaliser_ville(ville: str) -> str:
+    """Clé de recherche d'une ville : minuscules, sans accents ni tirets, espaces compactés."""
+    if not ville.isascii():
+        ville = unidecode(ville)
+    ville = ville.lower().replace("-", " ")
+    return " ".join(ville.split())
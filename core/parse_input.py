@@ -1,18 +1,193 @@
 import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
 from openai import OpenAI
 from dotenv import load_dotenv
 import json
 from models.trip_models import VoyageRequest
+from core.airports import get_airport_index
+from core.http import get_openai_async, limite_fournisseur, limite_fournisseur_async
+from core.tracing import span
+from core.tools import DATES_PATTERN, MOIS_MAP, normaliser_ville
 
 load_dotenv()
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def analyze_travel_request(user_input: str) -> VoyageRequest:
-    """
-    Analyse le texte utilisateur et extrait les informations structurées.
+# --- PRÉ-ANALYSE LOCALE (SANS LLM) ---
+
+NOMBRES = {"un": 1, "une": 1, "deux": 2, "trois": 3, "quatre": 4, "cinq": 5, "six": 6}
+_NOMBRE = r"(\d{1,2}|" + "|".join(NOMBRES) + r")"
+
+ADULTES_PATTERN = re.compile(_NOMBRE + r"\s+adultes?\b")
+ENFANTS_PATTERN = re.compile(_NOMBRE + r"\s+enfants?\b")
+COUPLE_PATTERN = re.compile(r"\b(en couple|a deux|amoureux)\b")
+# Accompagnants sans effectif explicite ("avec ma femme", "mes enfants") : l'effectif est laissé au LLM
+COMPAGNONS_PATTERN = re.compile(
+    r"\b(avec\b(?!\s+" + _NOMBRE + r"\b)|enfants?|bebes?|femme|mari|epou\w*|conjoint\w*|compagn\w*|"
+    r"copine|copain|partenaire|fils|filles?|parents?|famille|amis?|groupe|romanti\w*)\b"
+)
+BUDGET_PATTERN = re.compile(r"(\d[\d\s.]*\d|\d)\s*(?:€|euros?\b|eur\b)")
+MOT_PATTERN = re.compile(r"[a-z]+")
+FLECHE_PATTERN = re.compile(r"→|->|=>|⇒")
+ORIGINE_AVANT = re.compile(r"(?:\b(?:depuis|au depart de|en partant de|from|de)|\bd')\s*$")
+DESTINATION_AVANT = re.compile(r"\b(?:a|au|en|vers|pour|to|visiter|decouvrir)\s*$")
+
+# Marqueurs que seule l'analyse LLM sait interpréter correctement
+AMBIGUITE_PATTERN = re.compile(r"\b(ou|puis|flexible|environ|vers le|mi|fin|debut|semaine|week end)\b|\?")
+
+STYLES = [
+    ("détente", re.compile(r"\b(detente|relax\w*|repos|plage|farniente)\b")),
+    ("culturel", re.compile(r"\b(cultur\w*|musees?|histoire|patrimoine)\b")),
+    ("aventure", re.compile(r"\b(aventure|randonnees?|trek\w*|sport\w*)\b")),
+    ("romantique", re.compile(r"\b(romanti\w*|lune de miel|amoureux)\b")),
+    ("dynamique", re.compile(r"\b(dynamique|fete|nightlife|sorties?)\b")),
+]
+BUDGETS = [
+    ("faible", re.compile(r"\b(petit budget|pas cher|economique|low cost)\b")),
+    ("élevé", re.compile(r"\b(luxe|luxueux|haut de gamme|premium)\b")),
+]
+
+def _plier(texte: str) -> str:
+    """Minuscules sans accents, caractère par caractère (les positions restent alignées sur le texte brut)."""
+    resultat = []
+    for c in texte.lower():
+        base = unicodedata.normalize("NFD", c)[0]
+        resultat.append(base if base.isascii() else c)
+    return "".join(resultat)
+
+# Mots courants qui sont aussi des noms de lieux desservis (Sur, Plage, Grand, Bon...)
+MOTS_VIDES = set("""
+a au aux avec bon bien ce ces cet cette dans de des du en et grand grande il iles je la le les leur
+lune ma mes miel mon mois nos notre nous on ou par pas petit petite plage pour puis sa se seul seule
+ses solo son sud nord est ouest sur ta tes ton tous tout tres trois un une vers vos votre vous
+""".split()) | set(NOMBRES) | set(MOIS_MAP)
+
+# Nombre maximal de mots d'un nom de ville ("rio de janeiro", "saint martin")
+VILLE_MAX_MOTS = 3
+
+def _mentions_villes(plie: str) -> list:
+    """Villes connues de l'index aéroports citées dans le texte plié : [(début, fin, clé)].
+
+    Correspondance exacte, la plus longue d'abord (jusqu'à trois mots).
     """
-    system_prompt = """
+    index = get_airport_index()
+    mots = list(MOT_PATTERN.finditer(plie))
+    mentions = []
+    i = 0
+    while i < len(mots):
+        for n in range(min(VILLE_MAX_MOTS, len(mots) - i), 0, -1):
+            groupe = mots[i:i + n]
+            cle = " ".join(m.group() for m in groupe)
+            if all(m.group() in MOTS_VIDES for m in groupe) or not index.est_ville(cle):
+                continue
+            mentions.append((groupe[0].start(), groupe[-1].end(), cle))
+            i += n
+            break
+        else:
+            i += 1
+    return mentions
+
+def _nombre(valeur: str) -> int:
+    return int(valeur) if valeur.isdigit() else NOMBRES[valeur]
+
+def _extraire_trajet(texte: str, plie: str):
+    """Retourne (origine, destination) telles qu'écrites par l'utilisateur, ou None si ambigu."""
+    villes = _mentions_villes(plie)
+    if len({cle for _, _, cle in villes}) != len(villes) or not 1 <= len(villes) <= 2:
+        return None
+
+    def brut(mention):
+        return texte[mention[0]:mention[1]].strip().title()
+
+    if len(villes) == 1:
+        ville = villes[0]
+        if ORIGINE_AVANT.search(plie[:ville[0]]):
+            return None
+        return "Paris", brut(ville)
+
+    premiere, seconde = villes
+    entre = plie[premiere[1]:seconde[0]]
+    if FLECHE_PATTERN.search(entre) or (ORIGINE_AVANT.search(plie[:premiere[0]]) and DESTINATION_AVANT.search(entre)):
+        return brut(premiere), brut(seconde)
+    if ORIGINE_AVANT.search(plie[:seconde[0]]) and DESTINATION_AVANT.search(plie[:premiere[0]]):
+        return brut(seconde), brut(premiere)
+    return None
+
+def analyse_rapide(user_input: str):
+    """Construit la VoyageRequest par règles locales si la demande est sans ambiguïté, sinon None."""
+    plie = _plier(user_input)
+    if AMBIGUITE_PATTERN.search(plie):
+        return None
+
+    trajet = _extraire_trajet(user_input, plie)
+    dates = DATES_PATTERN.search(plie)
+    if not trajet or not dates or dates.group(3) not in MOIS_MAP:
+        return None
+
+    adultes = ADULTES_PATTERN.search(plie)
+    enfants = ENFANTS_PATTERN.search(plie)
+    if not adultes and enfants:
+        return None
+    # Accompagnants cités hors des effectifs comptés : 1 adulte par défaut serait faux.
+    # Les effectifs comptés sont remplacés par un nombre ("avec 1 enfant" reste accepté).
+    reste = COUPLE_PATTERN.sub(" ", ENFANTS_PATTERN.sub(" 0 ", ADULTES_PATTERN.sub(" 0 ", plie)))
+    if COMPAGNONS_PATTERN.search(reste):
+        return None
+    if adultes:
+        nb_adultes = _nombre(adultes.group(1))
+    elif COUPLE_PATTERN.search(plie):
+        nb_adultes = 2
+    else:
+        nb_adultes = 1
+
+    montant = BUDGET_PATTERN.search(plie)
+    if montant:
+        budget = re.sub(r"[\s.]", "", montant.group(1)) + " EUR"
+    else:
+        budget = next((nom for nom, motif in BUDGETS if motif.search(plie)), "moyen")
+    style = next((nom for nom, motif in STYLES if motif.search(plie)), "non précisé")
+
+    origin, destination = trajet
+    return VoyageRequest(
+        origin=origin,
+        destination=destination,
+        dates=user_input[dates.start():dates.end()],
+        voyageurs={"adultes": nb_adultes, "enfants": _nombre(enfants.group(1)) if enfants else 0},
+        preferences={"style": style, "budget": budget},
+        raw_input=user_input
+    )
+
+# --- CACHE DES EXTRACTIONS LLM ---
+
+LLM_CACHE_SIZE = 512
+_llm_cache = OrderedDict()
+_llm_cache_lock = threading.Lock()
+
+def _cle_cache(user_input: str) -> str:
+    return normaliser_ville(user_input)
+
+def _lire_cache(cle: str):
+    with _llm_cache_lock:
+        parsed_data = _llm_cache.get(cle)
+        if parsed_data is not None:
+            _llm_cache.move_to_end(cle)
+        return parsed_data
+
+def _ecrire_cache(cle: str, parsed_data: dict):
+    with _llm_cache_lock:
+        _llm_cache[cle] = parsed_data
+        _llm_cache.move_to_end(cle)
+        while len(_llm_cache) > LLM_CACHE_SIZE:
+            _llm_cache.popitem(last=False)
+
+# --- ANALYSE ---
+
+MODELE_EXTRACTION = "gpt-3.5-turbo-0125" # ou gpt-4o
+
+EXTRACTION_PROMPT = """
     Tu es un expert en extraction de données de voyage.
     Tu dois convertir la demande de l'utilisateur en un objet JSON STRICT correspondant exactement à ce schéma :
 
@@ -27,37 +202,92 @@ def analyze_travel_request(user_input: str) -> VoyageRequest:
         "preferences": {
             "style": "string",
             "budget": "string"
-        }
+        },
+        "etapes": ["string"],
+        "ordre_libre": bool
     }
 
     RÈGLES IMPORTANTES :
     1. Si l'utilisateur ne précise pas la ville de départ, la valeur par défaut DOIT être "Paris".
     2. Le champ "dates" DOIT être une simple chaîne de caractères.
     3. Imbrique bien voyageurs et preferences.
+    4. Circuit en plusieurs villes (ex: "Bangkok, Phuket puis Singapour") : "etapes" liste les villes
+       dans l'ordre donné et "destination" vaut la première. Sinon "etapes" est une liste vide.
+    5. "ordre_libre" vaut true seulement si l'utilisateur laisse l'ordre des étapes libre
+       (ex: "dans l'ordre qui vous arrange", "peu importe l'ordre").
     """
 
+def _analyse_sans_llm(user_input: str):
+    """Chemin rapide local puis cache des extractions ; None si le LLM est nécessaire."""
+    trip_request = analyse_rapide(user_input)
+    if trip_request:
+        print(f"⚡ Analyse locale : {trip_request.origin} -> {trip_request.destination}")
+        return trip_request
+
+    parsed_data = _lire_cache(_cle_cache(user_input))
+    if parsed_data is not None:
+        print("💾 Analyse LLM en cache")
+        return VoyageRequest(raw_input=user_input, **parsed_data)
+    return None
+
+def _requete_extraction(user_input: str) -> dict:
+    return {
+        "model": MODELE_EXTRACTION,
+        "response_format": {"type": "json_object"},
+        "messages": [
+            {"role": "system", "content": EXTRACTION_PROMPT},
+            {"role": "user", "content": f"Voici la demande : '{user_input}'. Génère le JSON."}
+        ]
+    }
+
+def _voyage_depuis_reponse(response, user_input: str, attributs: dict) -> VoyageRequest:
+    if response.usage:
+        attributs["prompt_tokens"] = response.usage.prompt_tokens
+        attributs["completion_tokens"] = response.usage.completion_tokens
+
+    json_content = response.choices[0].message.content
+    
+    # Debug : Afficher ce que le LLM a renvoyé pour comprendre les erreurs si elles persistent
+    print(f"DEBUG JSON REÇU : {json_content}")
+
+    parsed_data = json.loads(json_content)
+    parsed_data.pop("raw_input", None)
+    
+    # Création de l'objet Pydantic
+    trip_request = VoyageRequest(raw_input=user_input, **parsed_data)
+    _ecrire_cache(_cle_cache(user_input), parsed_data)
+    return trip_request
+
+def analyze_travel_request(user_input: str) -> VoyageRequest:
+    """
+    Analyse le texte utilisateur et extrait les informations structurées.
+    Chemin rapide local d'abord ; le LLM n'est appelé qu'en cas d'ambiguïté.
+    """
+    trip_request = _analyse_sans_llm(user_input)
+    if trip_request:
+        return trip_request
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo-0125", # ou gpt-4o
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Voici la demande : '{user_input}'. Génère le JSON."}
-            ]
-        )
-
-        json_content = response.choices[0].message.content
-        
-        # Debug : Afficher ce que le LLM a renvoyé pour comprendre les erreurs si elles persistent
-        print(f"DEBUG JSON REÇU : {json_content}")
-
-        parsed_data = json.loads(json_content)
-        
-        # Création de l'objet Pydantic
-        trip_request = VoyageRequest(raw_input=user_input, **parsed_data)
-        
+        with limite_fournisseur("openai"), span("llm.parse", categorie="llm", model=MODELE_EXTRACTION) as attributs:
+            response = client.chat.completions.create(**_requete_extraction(user_input))
+            return _voyage_depuis_reponse(response, user_input, attributs)
+
+    except Exception as e:
+        print(f"Erreur lors de l'analyse : {e}")
+        raise e
+
+async def analyze_travel_request_async(user_input: str) -> VoyageRequest:
+    """Version asyncio d'analyze_travel_request (client AsyncOpenAI de la boucle courante)."""
+    trip_request = _analyse_sans_llm(user_input)
+    if trip_request:
         return trip_request
 
+    try:
+        async with limite_fournisseur_async("openai"):
+            with span("llm.parse", categorie="llm", model=MODELE_EXTRACTION) as attributs:
+                response = await get_openai_async().chat.completions.create(**_requete_extraction(user_input))
+                return _voyage_depuis_reponse(response, user_input, attributs)
+
     except Exception as e:
         print(f"Erreur lors de l'analyse : {e}")
-        raise e
\ No newline at end of file
+        raise e
@@ -0,0 +1,162 @@
+import asyncio
+import os
+import threading
+import time
+
+# --- CONFIGURATION ---
+
+# Échecs consécutifs (timeout, connexion, 429, 5xx) avant ouverture du circuit
+BREAKER_SEUIL = int(os.getenv("BREAKER_SEUIL", "3"))
+# Durée (secondes) pendant laquelle un circuit ouvert rejette les appels avant une sonde
+BREAKER_REOUVERTURE = float(os.getenv("BREAKER_REOUVERTURE", "30"))
+# Attente maximale d'un jeton avant d'abandonner l'appel (secondes)
+RATE_LIMIT_WAIT = float(os.getenv("RATE_LIMIT_WAIT", "5"))
+
+FERME, OUVERT, SEMI_OUVERT = "fermé", "ouvert", "semi-ouvert"
+
+class FournisseurIndisponible(Exception):
+    """Appel refusé sans réseau : circuit ouvert ou quota local épuisé."""
+
+# --- LIMITATION DE DÉBIT ---
+
+class TokenBucket:
+    """Seau à jetons : `debit` requêtes/s en régime établi, rafales jusqu'à `capacite`."""
+
+    def __init__(self, debit: float, capacite: int):
+        self.debit = debit
+        self.capacite = capacite
+        self._jetons = float(capacite)
+        self._maj = time.monotonic()
+        self._lock = threading.Lock()
+        self._en_attente = 0
+        self._refus = 0
+
+    def _remplir(self):
+        maintenant = time.monotonic()
+        self._jetons = min(self.capacite, self._jetons + (maintenant - self._maj) * self.debit)
+        self._maj = maintenant
+
+    def _prendre(self) -> float:
+        """Prend un jeton si possible (0.0), sinon renvoie l'attente estimée du prochain."""
+        with self._lock:
+            self._remplir()
+            if self._jetons >= 1:
+                self._jetons -= 1
+                return 0.0
+            return (1 - self._jetons) / self.debit
+
+    def _suivre(self, delta: int = 0, refus: bool = False):
+        with self._lock:
+            self._en_attente += delta
+            self._refus += refus
+
+    def acquerir(self, timeout: float = RATE_LIMIT_WAIT) -> bool:
+        """Prend un jeton, en attendant au plus `timeout` secondes ; False si le délai est dépassé."""
+        limite = time.monotonic() + timeout
+        self._suivre(+1)
+        try:
+            while (attente := self._prendre()):
+                if time.monotonic() + attente > limite:
+                    self._suivre(refus=True)
+                    return False
+                time.sleep(attente)
+            return True
+        finally:
+            self._suivre(-1)
+
+    async def acquerir_async(self, timeout: float = RATE_LIMIT_WAIT) -> bool:
+        """Comme acquerir, sans bloquer la boucle asyncio (même seau que les appels synchrones)."""
+        limite = time.monotonic() + timeout
+        self._suivre(+1)
+        try:
+            while (attente := self._prendre()):
+                if time.monotonic() + attente > limite:
+                    self._suivre(refus=True)
+                    return False
+                await asyncio.sleep(attente)
+            return True
+        finally:
+            self._suivre(-1)
+
+    def metriques(self) -> dict:
+        with self._lock:
+            self._remplir()
+            return {
+                "jetons": round(self._jetons, 2), "debit": self.debit, "capacite": self.capacite,
+                "file_attente": self._en_attente, "refus_quota": self._refus
+            }
+
+# --- DISJONCTEUR ---
+
+class CircuitBreaker:
+    """Fermé -> ouvert après `seuil` échecs consécutifs -> semi-ouvert après `reouverture` s.
+
+    En semi-ouvert, une seule requête sonde passe : succès -> fermé, échec -> ouvert.
+    """
+
+    def __init__(self, seuil: int = BREAKER_SEUIL, reouverture: float = BREAKER_REOUVERTURE):
+        self.seuil = seuil
+        self.reouverture = reouverture
+        self._etat = FERME
+        self._echecs = 0
+        self._ouvert_depuis = 0.0
+        self._sonde_en_cours = False
+        self._lock = threading.Lock()
+        self._stats = {"ouvertures": 0, "rejets": 0, "sondes": 0}
+        self._derniere_erreur = None
+
+    def _etat_courant(self) -> str:
+        if self._etat == OUVERT and time.monotonic() - self._ouvert_depuis >= self.reouverture:
+            self._etat = SEMI_OUVERT
+        return self._etat
+
+    def est_ouvert(self) -> bool:
+        """Vrai si les appels sont rejetés d'office (sans consommer la sonde)."""
+        with self._lock:
+            etat = self._etat_courant()
+            ouvert = etat == OUVERT or (etat == SEMI_OUVERT and self._sonde_en_cours)
+            if ouvert:
+                self._stats["rejets"] += 1
+            return ouvert
+
+    def autoriser(self) -> bool:
+        """Réserve le passage ; en semi-ouvert, seul le premier appelant obtient la sonde."""
+        with self._lock:
+            etat = self._etat_courant()
+            if etat == FERME:
+                return True
+            if etat == SEMI_OUVERT and not self._sonde_en_cours:
+                self._sonde_en_cours = True
+                self._stats["sondes"] += 1
+                return True
+            self._stats["rejets"] += 1
+            return False
+
+    def succes(self):
+        with self._lock:
+            self._etat = FERME
+            self._echecs = 0
+            self._sonde_en_cours = False
+
+    def liberer(self):
+        """Rend la sonde sans verdict (appel interrompu avant toute réponse du fournisseur)."""
+        with self._lock:
+            self._sonde_en_cours = False
+
+    def echec(self, erreur: str):
+        with self._lock:
+            self._echecs += 1
+            self._derniere_erreur = erreur
+            if self._sonde_en_cours or self._echecs >= self.seuil:
+                if self._etat != OUVERT:
+                    self._stats["ouvertures"] += 1
+                self._etat = OUVERT
+                self._ouvert_depuis = time.monotonic()
+                self._sonde_en_cours = False
+
+    def metriques(self) -> dict:
+        with self._lock:
+            return {
+                "circuit": self._etat_courant(), "echecs_consecutifs": self._echecs,
+                "derniere_erreur": self._derniere_erreur, **self._stats
+            }
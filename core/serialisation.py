@@ -0,0 +1,59 @@
+from dataclasses import asdict
+from core.flight_records import RechercheVols, Vol
+from core.tracing import Trace
+from models.trip_models import VoyageRequest
+
+# Format JSON des résultats et des événements de TravelAgent (service HTTP, lots JSONL).
+# Les fonctions *_depuis_json reconstruisent les objets attendus par l'interface.
+
+# --- RÉSULTAT ---
+
+def resultat_vers_json(result: dict) -> dict:
+    """Résultat de process_request en dictionnaire sérialisable (champs de batch_cli)."""
+    donnees = {"success": result["success"], "message": result.get("message")}
+    if result["success"]:
+        donnees["voyage"] = result["data"].model_dump()
+        donnees["plan"] = result["plan"]
+        donnees["initial_plan"] = result["initial_plan"]
+        donnees["vols"] = [r.to_dict() for r in result.get("vols", [])]
+        donnees["timings"] = result.get("timings", {})
+        if "replanification" in result:
+            donnees["replanification"] = result["replanification"]
+    else:
+        donnees["error"] = result.get("error")
+    if "trace" in result:
+        donnees["trace"] = result["trace"].to_dict()
+    return donnees
+
+def resultat_depuis_json(donnees: dict) -> dict:
+    """Inverse de resultat_vers_json : même dictionnaire que process_request."""
+    result = {"success": donnees["success"], "message": donnees.get("message")}
+    if donnees["success"]:
+        result["data"] = VoyageRequest.model_validate(donnees["voyage"])
+        result["plan"] = donnees["plan"]
+        result["initial_plan"] = donnees["initial_plan"]
+        result["vols"] = [RechercheVols.depuis_dict(r) for r in donnees.get("vols", [])]
+        result["timings"] = donnees.get("timings", {})
+        if "replanification" in donnees:
+            result["replanification"] = donnees["replanification"]
+    else:
+        result["error"] = donnees.get("error")
+    if donnees.get("trace"):
+        result["trace"] = Trace.depuis_dict(donnees["trace"])
+    return result
+
+# --- ÉVÉNEMENTS ---
+
+def evenement_vers_json(event: dict) -> dict:
+    if event["type"] == "flights_partial":
+        return {**event, "vols": [asdict(v) for v in event["vols"]]}
+    if event["type"] == "done":
+        return {"type": "done", "result": resultat_vers_json(event["result"])}
+    return event
+
+def evenement_depuis_json(donnees: dict) -> dict:
+    if donnees["type"] == "flights_partial":
+        return {**donnees, "vols": [Vol(**v) for v in donnees["vols"]]}
+    if donnees["type"] == "done":
+        return {"type": "done", "result": resultat_depuis_json(donnees["result"])}
+    return donnees
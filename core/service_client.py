@@ -0,0 +1,107 @@
+import json
+import os
+import time
+import requests
+from core.serialisation import evenement_depuis_json
+
+# URL du service de planification (app/planning_service.py) ; vide = agent dans le processus
+PLANNER_SERVICE_URL = os.getenv("PLANNER_SERVICE_URL", "").rstrip("/")
+# (connexion, lecture) : la lecture couvre l'intervalle entre deux keep-alive SSE du service
+SERVICE_TIMEOUT = (3.05, 30)
+# Reconnexions du flux d'événements (reprise via Last-Event-ID) avant abandon
+SSE_RECONNEXIONS = 3
+
+class ServiceSature(Exception):
+    """Le service refuse le travail (file pleine) ; réessayer après `retry_after` secondes."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Service de planification saturé, réessayez dans {retry_after}s")
+        self.retry_after = retry_after
+
+class ClientPlanification:
+    """Client HTTP du service : mêmes événements et résultats que TravelAgent.process_request_stream."""
+
+    def __init__(self, url: str = PLANNER_SERVICE_URL):
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+
+    def soumettre(self, texte: str, session: str = None) -> dict:
+        """`session` : identifiant choisi par le client pour enchaîner des demandes modifiées."""
+        corps = {"request": texte}
+        if session:
+            corps["session"] = session
+        response = self.session.post(f"{self.url}/jobs", json=corps, timeout=SERVICE_TIMEOUT)
+        if response.status_code == 429:
+            raise ServiceSature(int(response.headers.get("Retry-After", 5)))
+        response.raise_for_status()
+        return response.json()
+
+    def statut(self, id_travail: str) -> dict:
+        response = self.session.get(f"{self.url}/jobs/{id_travail}", timeout=SERVICE_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def annuler(self, id_travail: str):
+        try:
+            self.session.delete(f"{self.url}/jobs/{id_travail}", timeout=SERVICE_TIMEOUT)
+        except requests.RequestException as e:
+            print(f"⚠️ Annulation du travail {id_travail} impossible : {e}")
+
+    def sante(self) -> dict:
+        response = self.session.get(f"{self.url}/health", timeout=SERVICE_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def evenements(self, id_travail: str):
+        """Événements JSON du travail (flux SSE), avec reprise après une coupure réseau."""
+        dernier = None
+        essais = 0
+        while True:
+            entetes = {"Accept": "text/event-stream"}
+            if dernier is not None:
+                entetes["Last-Event-ID"] = dernier
+            try:
+                with self.session.get(f"{self.url}/jobs/{id_travail}/events", headers=entetes,
+                                      stream=True, timeout=SERVICE_TIMEOUT) as response:
+                    response.raise_for_status()
+                    champs = {}
+                    for ligne in response.iter_lines(decode_unicode=True):
+                        if ligne:
+                            nom, _, valeur = ligne.partition(":")
+                            if nom:
+                                champs[nom] = valeur.lstrip(" ")
+                            continue
+                        # Ligne vide : fin d'un événement (les commentaires keep-alive n'ont pas de champ)
+                        if champs.get("event") == "cancelled":
+                            return
+                        if "data" in champs:
+                            dernier = champs.get("id", dernier)
+                            event = json.loads(champs["data"])
+                            yield event
+                            if event["type"] == "done":
+                                return
+                        champs = {}
+                return
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                essais += 1
+                if essais > SSE_RECONNEXIONS:
+                    raise
+                print(f"⚠️ Flux du travail {id_travail} interrompu, reprise ({essais}/{SSE_RECONNEXIONS})")
+                time.sleep(0.5 * essais)
+
+    def process_request_stream(self, user_input: str, session: str = None):
+        """Soumet la demande puis relaie ses événements, reconstruits comme ceux de l'agent local.
+
+        Lève ServiceSature si le service refuse le travail. Si le consommateur abandonne le
+        flux avant la fin (ex: rerun Streamlit), le travail est annulé côté service.
+        """
+        travail = self.soumettre(user_input, session)
+        termine = False
+        try:
+            for donnees in self.evenements(travail["id"]):
+                event = evenement_depuis_json(donnees)
+                termine = event["type"] == "done"
+                yield event
+        finally:
+            if not termine:
+                self.annuler(travail["id"])
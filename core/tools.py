@@ -1,29 +1,51 @@
+import asyncio
+import hashlib
 import os
-import requests
-from serpapi import GoogleSearch
-from geopy.geocoders import Nominatim
 from dotenv import load_dotenv
 import re
+import time
 from datetime import datetime, timedelta
 import json
+import numpy as np
+import pandas as pd
+from core.airports import get_airport_index
+from core.boucle import executer
+from core.normalisation import normaliser_ville
+from core.geocoding import geocoder_ville, geocoder_ville_async
+from core.weather import get_forecast_async
+from core.flight_cache import flight_cache
+from core.flight_records import RechercheVols, Vol, enregistrer_recherche, publier_vols_partiels, sans_vols_partiels
+from core.http import http_get, http_post_async
+from core.tracing import span
 
 load_dotenv()
 
 SERPAPI_KEY = os.getenv("SERPAPI_API_KEY")
 RAPIDAPI_KEY = os.getenv("RAPIDAPI_KEY")
 
-# --- CODES IATA ---
-IATA_MAPPING = {
-    "paris": "CDG", "lyon": "LYS", "nice": "NCE", "marseille": "MRS",
-    "londres": "LON", "london": "LON", "rome": "FCO", "milan": "MXP",
-    "madrid": "MAD", "barcelone": "BCN", "barcelona": "BCN",
-    "lisbonne": "LIS", "porto": "OPO", "berlin": "BER", "munich": "MUC",
-    "amsterdam": "AMS", "bruxelles": "BRU", "geneve": "GVA", "zurich": "ZRH",
-    "bali": "DPS", "denpasar": "DPS", "tokyo": "NRT", "osaka": "KIX",
-    "bangkok": "BKK", "phuket": "HKT", "singapour": "SIN", "singapore": "SIN",
-    "dubai": "DXB", "new york": "JFK", "los angeles": "LAX", "miami": "MIA",
-    "sydney": "SYD", "hong kong": "HKG", "seoul": "ICN"
-}
+# URLs surchargeables (ex: services simulés de benchmarks/fake_services.py)
+SERPAPI_URL = os.getenv("SERPAPI_URL", "https://serpapi.com/search.json")
+SKYSCANNER_API_URL = os.getenv("SKYSCANNER_API_URL", "https://skyscanner-api.p.rapidapi.com/v3/flights/live/search/create")
+SKYSCANNER_POLL_URL = os.getenv("SKYSCANNER_POLL_URL", "https://skyscanner-api.p.rapidapi.com/v3/flights/live/search/poll")
+
+# Recherche live Skyscanner : intervalle entre deux polls, et délai total (inférieur à
+# FLIGHT_SEARCH_DEADLINE pour rendre les résultats partiels avant d'être abandonné)
+SKYSCANNER_POLL_INTERVAL = float(os.getenv("SKYSCANNER_POLL_INTERVAL", "1"))
+SKYSCANNER_DEADLINE = float(os.getenv("SKYSCANNER_DEADLINE", "10"))
+
+# Délai global (secondes) accordé à l'ensemble des fournisseurs de vols
+FLIGHT_SEARCH_DEADLINE = float(os.getenv("FLIGHT_SEARCH_DEADLINE", "12"))
+
+# Classement des vols : toute la frontière de Pareto (prix, durée, escales), au plus PARETO_MAX
+# vols, complétée par les meilleurs scores jusqu'à NB_VOLS_MAX vols par recherche
+NB_VOLS_MAX = 6
+PARETO_MAX = 12
+# Poids du score, en écart relatif au meilleur prix / à la durée la plus courte
+POIDS_DUREE = 0.5
+POIDS_ESCALE = 0.15
+
+# Heure (HH:MM) en fin de champ : "08:30" (Skyscanner) ou "2025-12-15 8:30" (Google Flights)
+HEURE_PATTERN = r"(\d{1,2}):(\d{2})\s*$"
 
 CITY_TO_COUNTRY = {
     "bali": "Indonesia", "paris": "France", "tokyo": "Japan",
@@ -33,49 +55,68 @@ CITY_TO_COUNTRY = {
 
 # --- UTILITAIRES ---
 
-def normaliser_ville(ville: str) -> str:
-    ville = ville.lower().strip()
-    replacements = {"é": "e", "è": "e", "ê": "e", "à": "a", "ï": "i", "ç": "c"}
-    for old, new in replacements.items():
-        ville = ville.replace(old, new)
-    return ville
+def _code_proche(lat, lon):
+    """Ville hors index : aéroport le plus proche de ses coordonnées."""
+    aeroport = get_airport_index().plus_proche(lat, lon) if lat is not None else None
+    return aeroport.iata if aeroport else None
 
-def trouver_code_iata(ville: str) -> str:
-    ville_norm = normaliser_ville(ville)
-    code = IATA_MAPPING.get(ville_norm)
+def _annoncer_code(ville: str, code: str):
     if code:
         print(f"✅ IATA: {ville} -> {code}")
         return code
     print(f"❌ IATA non trouvé: {ville}")
-    return None
+
+async def trouver_code_iata_async(ville: str) -> str:
+    """Code IATA d'une ville (code métropolitain si plusieurs aéroports, ex: PAR, LON)."""
+    code = get_airport_index().chercher(ville) or _code_proche(*await geocoder_ville_async(ville))
+    return _annoncer_code(ville, code)
+
+def trouver_code_iata(ville: str) -> str:
+    return executer(trouver_code_iata_async(ville))
+
+MOIS_MAP = {
+    "janvier": "01", "fevrier": "02", "février": "02", "mars": "03",
+    "avril": "04", "mai": "05", "juin": "06", "juillet": "07",
+    "aout": "08", "août": "08", "septembre": "09", "octobre": "10",
+    "novembre": "11", "decembre": "12", "décembre": "12"
+}
+
+# "du 15 au 30 décembre", "du 3 - 10 mars"
+DATES_PATTERN = re.compile(r'du?\s+(\d{1,2})\s+(?:au|-)\s+(\d{1,2})\s+(\w+)')
+# "mi-décembre", "début mars", "fin juillet" : séjour d'une semaine autour de ce jour
+PERIODE_PATTERN = re.compile(r'\b(debut|début|mi|fin)[\s-]+(\w+)')
+JOUR_PERIODE = {"debut": "05", "début": "05", "mi": "15", "fin": "25"}
+# Dates annoncées comme flexibles sans écart précis
+FLEXIBLE_PATTERN = re.compile(r'flexible|±|\+/-|à peu près|environ')
+
+def _annee_pour(mois: str) -> int:
+    """Année de la prochaine occurrence du mois (l'an prochain si le mois est passé)."""
+    maintenant = datetime.now()
+    return maintenant.year + 1 if int(mois) < maintenant.month else maintenant.year
 
 def extraire_dates(dates_texte: str) -> tuple:
     if re.match(r'\d{4}-\d{2}-\d{2}', dates_texte):
         return dates_texte, None
     
-    mois_map = {
-        "janvier": "01", "fevrier": "02", "février": "02", "mars": "03",
-        "avril": "04", "mai": "05", "juin": "06", "juillet": "07",
-        "aout": "08", "août": "08", "septembre": "09", "octobre": "10",
-        "novembre": "11", "decembre": "12", "décembre": "12"
-    }
-    
-    match = re.search(r'du?\s+(\d{1,2})\s+(?:au|-)\s+(\d{1,2})\s+(\w+)', dates_texte.lower())
+    match = DATES_PATTERN.search(dates_texte.lower())
     if match:
         jour_dep = match.group(1).zfill(2)
         jour_ret = match.group(2).zfill(2)
         mois_txt = match.group(3)
-        mois = mois_map.get(mois_txt)
+        mois = MOIS_MAP.get(mois_txt)
         
         if mois:
-            annee_actuelle = datetime.now().year
-            mois_actuel = datetime.now().month
-            annee = annee_actuelle + 1 if int(mois) < mois_actuel else annee_actuelle
-            
+            annee = _annee_pour(mois)
             date_dep = f"{annee}-{mois}-{jour_dep}"
             date_ret = f"{annee}-{mois}-{jour_ret}"
             return date_dep, date_ret
     
+    match = PERIODE_PATTERN.search(dates_texte.lower())
+    if match and match.group(2) in MOIS_MAP:
+        mois = MOIS_MAP[match.group(2)]
+        dep = datetime.strptime(f"{_annee_pour(mois)}-{mois}-{JOUR_PERIODE[match.group(1)]}", "%Y-%m-%d")
+        return dep.strftime("%Y-%m-%d"), (dep + timedelta(days=7)).strftime("%Y-%m-%d")
+    
     dep = datetime.now() + timedelta(days=30)
     ret = dep + timedelta(days=7)
     return dep.strftime("%Y-%m-%d"), ret.strftime("%Y-%m-%d")
@@ -116,22 +157,61 @@ def get_google_flights_link(code_dep: str, code_arr: str, date_dep: str, date_re
         return "https://www.google.com/travel/flights"
 
 def get_lat_lon(city_name: str):
-    try:
-        geo = Nominatim(user_agent="TravelPlanner_2025")
-        loc = geo.geocode(city_name)
-        if loc: return loc.latitude, loc.longitude
-    except: pass
-    return None, None
+    # Gazetteer hors-ligne + LRU + cache SQLite : Nominatim seulement en dernier recours
+    return geocoder_ville(city_name)
 
 # --- API SKYSCANNER ---
 
-def search_skyscanner_api(code_dep: str, code_arr: str, date_dep: str, date_ret: str = None, adultes: int = 1, enfants: int = 0) -> list:
-    if not RAPIDAPI_KEY:
-        print("⚠️ RAPIDAPI_KEY manquante")
-        return []
-    
-    print(f"🔍 Skyscanner API: {code_dep} → {code_arr}")
-    url = "https://skyscanner-api.p.rapidapi.com/v3/flights/live/search/create"
+def _vols_skyscanner(data: dict, deja_vus: set) -> list:
+    """Vols des itinéraires d'une réponse create/poll qui n'ont pas encore été vus."""
+    results = data.get("content", {}).get("results", {})
+    carriers_section = results.get("carriers", {})
+    segments = results.get("segments", {})
+    vols = []
+    for itin_id, itin_data in results.get("itineraries", {}).items():
+        if itin_id in deja_vus:
+            continue
+        try:
+            price = itin_data.get("pricingOptions", [{}])[0].get("price", {}).get("amount", 0)
+            legs = itin_data.get("legs", [])
+            if not legs or not price:
+                # Itinéraire sans prix (encore en cours de tarification) : repris au poll suivant
+                continue
+            leg = legs[0]
+            carrier_ids = leg.get("carriers", {}).get("marketing", [])
+            carrier_name = carriers_section.get(carrier_ids[0], {}).get("name", "Compagnie") if carrier_ids else "Compagnie"
+            dep_time = leg.get("departure", "N/A")
+            arr_time = leg.get("arrival", "N/A")
+            numeros = []
+            for segment_id in leg.get("segmentIds", []):
+                segment = segments.get(segment_id, {})
+                if segment.get("marketingFlightNumber"):
+                    iata = carriers_section.get(segment.get("marketingCarrierId"), {}).get("iata", "")
+                    numeros.append(f"{iata}{segment['marketingFlightNumber']}")
+            
+            vol = {
+                "source": "Skyscanner",
+                "compagnie": carrier_name,
+                "prix": int(price / 1000),
+                "devise": "EUR",
+                "heure_dep": dep_time[:5] if isinstance(dep_time, str) else "N/A",
+                "heure_arr": arr_time[:5] if isinstance(arr_time, str) else "N/A",
+                "numeros": "/".join(numeros),
+                "escales": leg.get("stopCount"),
+                "duree": leg.get("durationInMinutes"),
+                "lien": "#" # Lien ignoré ici car on utilise le global
+            }
+            vol["vol_id"] = cle_vol(vol)
+            vols.append(vol)
+            deja_vus.add(itin_id)
+        except: continue
+    return vols
+
+def _requete_skyscanner(code_dep: str, code_arr: str, date_dep: str, date_ret: str = None, adultes: int = 1, enfants: int = 0) -> tuple:
+    """(payload, headers) de la requête /create."""
+    # Skyscanner attend un aéroport : code principal pour les codes métropolitains
+    index = get_airport_index()
+    code_dep, code_arr = index.aeroport_principal(code_dep), index.aeroport_principal(code_arr)
     
     query_legs = [{
         "originPlaceId": {"iata": code_dep},
@@ -160,39 +240,59 @@ def search_skyscanner_api(code_dep: str, code_arr: str, date_dep: str, date_ret:
         "Content-Type": "application/json"
     }
     
-    try:
-        response = requests.post(url, json=payload, headers=headers, timeout=15)
+    return payload, headers
+
+async def skyscanner_live_async(code_dep: str, code_arr: str, date_dep: str, date_ret: str = None, adultes: int = 1, enfants: int = 0, deadline: float = None):
+    """Recherche live Skyscanner : create, puis poll du sessionToken jusqu'à
+    RESULT_STATUS_COMPLETE ou au délai. Génère les lots de vols nouveaux à mesure qu'ils arrivent."""
+    deadline = SKYSCANNER_DEADLINE if deadline is None else deadline
+    limite = time.monotonic() + deadline
+    payload, headers = _requete_skyscanner(code_dep, code_arr, date_dep, date_ret, adultes, enfants)
+    response = await http_post_async("rapidapi", SKYSCANNER_API_URL, json=payload, headers=headers)
+    response.raise_for_status()
+    data = response.json()
+    deja_vus = set()
+    token = None
+    polls = 0
+    while True:
+        lot = _vols_skyscanner(data, deja_vus)
+        if lot:
+            yield lot
+        token = data.get("sessionToken") or token
+        if data.get("status") != "RESULT_STATUS_INCOMPLETE" or not token:
+            return
+        restant = limite - time.monotonic() - SKYSCANNER_POLL_INTERVAL
+        if restant <= 0:
+            print(f"⏱️ Skyscanner : résultats incomplets après {polls} poll(s), délai de {deadline}s atteint")
+            return
+        await asyncio.sleep(SKYSCANNER_POLL_INTERVAL)
+        polls += 1
+        # Le poll ne doit pas dépasser le délai restant (lecture bornée)
+        response = await http_post_async("rapidapi", f"{SKYSCANNER_POLL_URL}/{token}", headers=headers,
+                                         timeout=(3.05, max(1.0, restant)))
+        response.raise_for_status()
         data = response.json()
-        itineraries = data.get("content", {}).get("results", {}).get("itineraries", {})
-        
-        vols = []
-        for itin_id, itin_data in list(itineraries.items())[:5]:
-            try:
-                price = itin_data.get("pricingOptions", [{}])[0].get("price", {}).get("amount", 0)
-                legs = itin_data.get("legs", [])
-                if legs:
-                    leg = legs[0]
-                    carrier_ids = leg.get("carriers", {}).get("marketing", [])
-                    carriers_section = data.get("content", {}).get("results", {}).get("carriers", {})
-                    carrier_name = carriers_section.get(carrier_ids[0], {}).get("name", "Compagnie") if carrier_ids else "Compagnie"
-                    dep_time = leg.get("departure", "N/A")
-                    arr_time = leg.get("arrival", "N/A")
-                    
-                    vols.append({
-                        "source": "Skyscanner",
-                        "compagnie": carrier_name,
-                        "prix": int(price / 1000) if price else 0,
-                        "devise": "EUR",
-                        "heure_dep": dep_time[:5] if isinstance(dep_time, str) else "N/A",
-                        "heure_arr": arr_time[:5] if isinstance(arr_time, str) else "N/A",
-                        "lien": "#", # Lien ignoré ici car on utilise le global
-                        "vol_id": itin_id
-                    })
-            except: continue
-        return vols
+
+async def search_skyscanner_api_async(code_dep: str, code_arr: str, date_dep: str, date_ret: str = None, adultes: int = 1, enfants: int = 0) -> list:
+    if not RAPIDAPI_KEY:
+        print("⚠️ RAPIDAPI_KEY manquante")
+        return []
+    
+    print(f"🔍 Skyscanner API: {code_dep} → {code_arr}")
+    vols = []
+    try:
+        async for lot in skyscanner_live_async(code_dep, code_arr, date_dep, date_ret, adultes, enfants):
+            vols.extend(lot)
+            # Résultats partiels remontés à l'agent (section vols affichée au fil de l'eau)
+            publier_vols_partiels("Skyscanner", vols)
     except Exception as e:
+        # Échec (y compris après des lots partiels) : None, à distinguer de "aucun vol"
         print(f"❌ Erreur Skyscanner API: {e}")
-        return []
+        return None
+    return vols
+
+def search_skyscanner_api(code_dep: str, code_arr: str, date_dep: str, date_ret: str = None, adultes: int = 1, enfants: int = 0) -> list:
+    return executer(search_skyscanner_api_async(code_dep, code_arr, date_dep, date_ret, adultes, enfants))
 
 # --- SERPAPI ---
 
@@ -201,8 +301,12 @@ def search_serpapi(code_dep: str, code_arr: str, date_dep: str, date_ret: str =
     print(f"🔍 SerpAPI: {code_dep} → {code_arr}")
     
     try:
+        # Google Flights accepte une liste d'aéroports : tous ceux du code métropolitain
+        index = get_airport_index()
         params = {
-            "engine": "google_flights", "departure_id": code_dep, "arrival_id": code_arr,
+            "engine": "google_flights",
+            "departure_id": ",".join(index.aeroports(code_dep)),
+            "arrival_id": ",".join(index.aeroports(code_arr)),
             "outbound_date": date_dep, "currency": "EUR", "hl": "fr",
             "adults": adultes, "children": enfants, "api_key": SERPAPI_KEY
         }
@@ -212,33 +316,40 @@ def search_serpapi(code_dep: str, code_arr: str, date_dep: str, date_ret: str =
         else:
             params["type"] = "2"
         
-        search = GoogleSearch(params)
-        results = search.get_dict()
-        flights = results.get("best_flights", []) or results.get("other_flights", [])
+        response = http_get("serpapi", SERPAPI_URL, params=params)
+        response.raise_for_status()
+        results = response.json()
+        # Toutes les offres : le classement (comparer_vols) se fait sur l'ensemble des fournisseurs
+        flights = results.get("best_flights", []) + results.get("other_flights", [])
         
         vols = []
-        for vol in flights[:5]:
+        for offre in flights:
             try:
-                compagnie = vol['flights'][0].get('airline', 'Compagnie')
-                prix = int(vol.get('price', 0))
-                heure_dep = vol['flights'][0]['departure_airport'].get('time', 'N/A')
-                heure_arr = vol['flights'][0]['arrival_airport'].get('time', 'N/A')
-                
-                vols.append({
+                segments = offre['flights']
+                vol = {
                     "source": "Google Flights",
-                    "compagnie": compagnie,
-                    "prix": prix,
+                    "compagnie": segments[0].get('airline', 'Compagnie'),
+                    "prix": int(offre.get('price', 0)),
                     "devise": "EUR",
-                    "heure_dep": heure_dep,
-                    "heure_arr": heure_arr,
-                    "lien": "#", 
-                    "vol_id": f"serp_{hash(compagnie + str(prix))}"
-                })
+                    "heure_dep": segments[0]['departure_airport'].get('time', 'N/A'),
+                    # Arrivée du dernier segment (vols avec escale)
+                    "heure_arr": segments[-1]['arrival_airport'].get('time', 'N/A'),
+                    "numeros": "/".join(s['flight_number'].replace(" ", "") for s in segments if s.get('flight_number')),
+                    "escales": len(segments) - 1,
+                    "duree": offre.get('total_duration'),
+                    "lien": "#"
+                }
+                vol["vol_id"] = cle_vol(vol)
+                vols.append(vol)
             except: continue
         return vols
     except Exception as e:
         print(f"❌ Erreur SerpAPI: {e}")
-        return []
+        return None
+
+async def search_serpapi_async(*args) -> list:
+    # Client requests synchrone : délégué à un thread (asyncio.to_thread propage les contextvars)
+    return await asyncio.to_thread(search_serpapi, *args)
 
 # --- FALLBACK ---
 
@@ -263,102 +374,342 @@ def generer_vols_exemple(code_dep: str, code_arr: str, date_dep: str, date_ret:
         })
     return vols
 
-# --- FORMATAGE FINAL ---
+# --- COMPARAISON ---
+
+COLONNES_VOLS = ["source", "compagnie", "prix", "devise", "heure_dep", "heure_arr", "numeros", "escales", "duree"]
+
+def _heure(valeur) -> str:
+    m = re.search(HEURE_PATTERN, str(valeur))
+    return f"{int(m[1]):02d}:{m[2]}" if m else ""
+
+def cle_vol(vol: dict) -> str:
+    """Identifiant stable d'un vol (compagnie, numéros de vol, horaires) : le même d'un
+    processus et d'un fournisseur à l'autre, contrairement à hash()."""
+    brut = "|".join((
+        vol["compagnie"].strip().lower(), (vol.get("numeros") or "").upper().replace(" ", ""),
+        _heure(vol.get("heure_dep")), _heure(vol.get("heure_arr"))
+    ))
+    return hashlib.sha1(brut.encode()).hexdigest()[:16]
+
+def tableau_vols(*listes: list) -> pd.DataFrame:
+    """Offres de tous les fournisseurs en une table triée par prix, une ligne par vol distinct.
+
+    Les doublons (même cle_vol) gardent le prix le plus bas ; `source` liste les fournisseurs
+    qui proposent le vol, escales et durée sont reprises du premier qui les donne.
+    Les offres sans prix sont écartées.
+    """
+    distincts = {}
+    for vol in sorted((v for liste in listes for v in liste if v.get("prix")), key=lambda v: v["prix"]):
+        cle = cle_vol(vol)
+        retenu = distincts.get(cle)
+        if retenu is None:
+            distincts[cle] = {"devise": "EUR", "heure_dep": "N/A", "heure_arr": "N/A", **vol, "cle": cle}
+            continue
+        if vol["source"] not in retenu["source"]:
+            retenu["source"] += f", {vol['source']}"
+        for champ in ("escales", "duree"):
+            if retenu.get(champ) is None:
+                retenu[champ] = vol.get(champ)
+    return pd.DataFrame(list(distincts.values()), columns=[*COLONNES_VOLS, "cle"])
+
+def classer_vols(df: pd.DataFrame) -> pd.DataFrame:
+    """Ajoute les colonnes `pareto` (aucun autre vol n'est au moins aussi bon en prix, durée et
+    escales, et meilleur sur l'un) et `score` (plus bas = meilleur).
+
+    Une durée ou un nombre d'escales inconnu compte pour la médiane des vols connus.
+    """
+    x = df[["prix", "duree", "escales"]].to_numpy(dtype=float, na_value=np.nan)
+    inconnus = np.isnan(x)
+    if inconnus.any():
+        # Colonne entièrement inconnue : critère neutre (0)
+        medianes = [np.median(colonne[~manque]) if not manque.all() else 0 for colonne, manque in zip(x.T, inconnus.T)]
+        x = np.where(inconnus, medianes, x)
+    # domine[i, j] : le vol i domine le vol j (toutes les paires d'un coup, n x n x 3)
+    domine = (x[:, None, :] <= x[None, :, :]).all(axis=2) & (x[:, None, :] < x[None, :, :]).any(axis=2)
+    prix_min, duree_min, _ = x.min(axis=0)
+    df["pareto"] = ~domine.any(axis=0)
+    df["score"] = (
+        x[:, 0] / prix_min
+        + POIDS_DUREE * (x[:, 1] / duree_min if duree_min else 1)
+        + POIDS_ESCALE * x[:, 2]
+    )
+    return df
+
+def comparer_vols(*listes: list) -> list:
+    """Vols de tous les fournisseurs dédupliqués et classés, en enregistrements typés triés par prix.
+
+    Retient la frontière de Pareto (ses PARETO_MAX meilleurs scores), complétée par les
+    meilleurs scores hors frontière jusqu'à NB_VOLS_MAX vols.
+    """
+    df = tableau_vols(*listes)
+    if df.empty:
+        return []
+    df = classer_vols(df)
+    pareto = df["pareto"].to_numpy()
+    # Positions par frontière d'abord, puis score croissant
+    ordre = np.lexsort((df["score"].to_numpy(), ~pareto))
+    nb_pareto = int(pareto.sum())
+    frontiere = ordre[:min(nb_pareto, PARETO_MAX)]
+    reste = ordre[nb_pareto:nb_pareto + max(0, NB_VOLS_MAX - len(frontiere))]
+    # La table est triée par prix : positions croissantes = prix croissants
+    retenus = df.iloc[np.sort(np.concatenate([frontiere, reste]))]
+    return [Vol.depuis_fournisseur(vol) for vol in retenus.to_dict("records")]
+
+# --- RECHERCHE PARALLÈLE ---
+
+# Chaque fournisseur renvoie sa liste de vols ([] : aucun vol, ou fournisseur non configuré),
+# ou None en cas d'échec (erreur HTTP, quota local épuisé, circuit ouvert)
+FLIGHT_PROVIDERS = {
+    "Skyscanner": search_skyscanner_api_async,
+    "Google Flights": search_serpapi_async
+}
+
+async def _appel_fournisseur(nom: str, *args) -> list:
+    with span(f"provider.{nom}", categorie="provider") as attributs:
+        vols = await FLIGHT_PROVIDERS[nom](*args)
+        attributs["vols"] = len(vols or [])
+        publier_vols_partiels(nom, vols or [])
+        return vols
+
+async def interroger_fournisseurs_vols_async(code_dep: str, code_arr: str, date_dep: str, date_ret: str = None, adultes: int = 1, enfants: int = 0, deadline: float = None) -> dict:
+    """Interroge tous les fournisseurs en parallèle sous un délai commun.
 
-def compare_and_format_flights(vols_skyscanner: list, vols_serpapi: list, link_skyscanner: str, link_google: str, adultes: int, enfants: int) -> str:
-    """Compare et formate SANS lien individuel"""
-    all_flights = vols_skyscanner + vols_serpapi
+    Retourne {nom_fournisseur: vols} pour tous les fournisseurs ; vols vaut None pour un
+    fournisseur en échec ou hors délai (les retardataires sont annulés).
+    """
+    deadline = FLIGHT_SEARCH_DEADLINE if deadline is None else deadline
+    taches = {
+        asyncio.create_task(_appel_fournisseur(nom, code_dep, code_arr, date_dep, date_ret, adultes, enfants)): nom
+        for nom in FLIGHT_PROVIDERS
+    }
+    done, pending = await asyncio.wait(taches, timeout=deadline)
+    
+    resultats = {}
+    for tache in done:
+        nom = taches[tache]
+        try:
+            resultats[nom] = tache.result()
+        except Exception as e:
+            print(f"❌ Erreur {nom}: {e}")
+            resultats[nom] = None
     
-    if not all_flights:
-        return (f"⚠️ Aucun vol trouvé.\n\n"
-                f"🔗 [Rechercher sur Skyscanner]({link_skyscanner})\n"
-                f"🔗 [Rechercher sur Google Flights]({link_google})")
+    for tache in pending:
+        tache.cancel()
+        resultats[taches[tache]] = None
+        print(f"⏱️ {taches[tache]} hors délai ({deadline}s), ignoré")
     
-    # Déduplication
-    seen = set()
-    unique_flights = []
-    for vol in all_flights:
-        vol_id = vol.get('vol_id')
-        if vol_id not in seen:
-            seen.add(vol_id)
-            unique_flights.append(vol)
+    return resultats
+
+def interroger_fournisseurs_vols(code_dep: str, code_arr: str, date_dep: str, date_ret: str = None, adultes: int = 1, enfants: int = 0, deadline: float = None) -> dict:
+    # Rafraîchissement du cache de vols (pool de threads du cache, hors de la boucle partagée)
+    return executer(interroger_fournisseurs_vols_async(code_dep, code_arr, date_dep, date_ret, adultes, enfants, deadline))
+
+# --- DATES FLEXIBLES ---
+
+FLEX_MAX_JOURS = 3
+FLEX_JOURS_DEFAUT = 2
+# Budget global (secondes) de l'exploration : doit tenir dans le timeout de l'outil côté agent
+FLEX_TIME_BUDGET = float(os.getenv("FLEX_TIME_BUDGET", "15"))
+
+def grille_dates(date_dep: str, date_ret: str = None, jours: int = FLEX_JOURS_DEFAUT) -> list:
+    """Combinaisons (aller, retour) à ±jours, les plus proches des dates demandées en premier."""
+    aller = datetime.strptime(date_dep, "%Y-%m-%d")
+    retour = datetime.strptime(date_ret, "%Y-%m-%d") if date_ret else None
+    aujourd_hui = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     
-    unique_flights.sort(key=lambda x: x['prix'])
-    min_prix = unique_flights[0]['prix'] if unique_flights else 0
+    combinaisons = []
+    for i in range(-jours, jours + 1):
+        dep = aller + timedelta(days=i)
+        if dep < aujourd_hui:
+            continue
+        if retour is None:
+            combinaisons.append((abs(i), dep.strftime("%Y-%m-%d"), None))
+            continue
+        for j in range(-jours, jours + 1):
+            ret = retour + timedelta(days=j)
+            if ret > dep:
+                combinaisons.append((abs(i) + abs(j), dep.strftime("%Y-%m-%d"), ret.strftime("%Y-%m-%d")))
+    combinaisons.sort(key=lambda c: c[0])
+    return [(dep, ret) for _, dep, ret in combinaisons]
+
+async def explorer_grille_prix_async(code_dep: str, code_arr: str, combinaisons: list, adultes: int = 1, enfants: int = 0, budget: float = None) -> dict:
+    """Résultats fournisseurs par combinaison {(aller, retour): {fournisseur: vols}}.
+
+    Les combinaisons en cache sont servies directement ; les autres partent en un seul lot
+    (une tâche par fournisseur et par combinaison) sous un budget de temps global.
+    Un fournisseur en échec (quota local compris) ou hors budget vaut None ; seules les
+    combinaisons où tous ont répondu sont mises en cache.
+    """
+    budget = FLEX_TIME_BUDGET if budget is None else budget
+    resultats = {}
+    taches = {}
+    for combinaison in combinaisons:
+        cle = (code_dep, code_arr, *combinaison, adultes, enfants)
+        payload = flight_cache.lookup(cle, lambda cle=cle: interroger_fournisseurs_vols(*cle))
+        if payload is not None:
+            resultats[combinaison] = payload
+            continue
+        # Créées dans l'ordre de la grille : les dates proches de la demande passent d'abord
+        # (une grille ±3 jours représente jusqu'à 49 combinaisons x 2 fournisseurs, la
+        # concurrence réelle reste bornée par fournisseur dans core.http).
+        # Pas de résultats partiels : ils mélangeraient des dates différentes.
+        with sans_vols_partiels():
+            for nom in FLIGHT_PROVIDERS:
+                taches[asyncio.create_task(_appel_fournisseur(nom, *cle))] = (combinaison, nom)
+    if not taches:
+        return resultats
     
-    total = adultes + enfants
-    output = f"## ✈️ Vols pour {total} voyageur(s)\n\n"
+    done, pending = await asyncio.wait(taches, timeout=budget)
+    recus = {}
+    for tache in pending:
+        tache.cancel()
+        combinaison, nom = taches[tache]
+        recus.setdefault(combinaison, {})[nom] = None
+    if pending:
+        print(f"⏱️ Calendrier de prix : {len(pending)} requêtes hors budget ({budget}s), ignorées")
     
-    for i, vol in enumerate(unique_flights[:6], 1):
-        prix = vol['prix']
-        icon = "🟦" if vol['source'] == "Skyscanner" else "🔍" if vol['source'] == "Google Flights" else "📊"
-        
-        # Affichage Prix
-        badge = " 🟢 **MEILLEUR PRIX**" if prix == min_prix and prix > 0 else ""
-        prix_fmt = f"**🟢 {prix} EUR**" if prix == min_prix else f"**{prix} EUR**"
-        
-        output += f"### {icon} Vol {i} - {vol['compagnie']}{badge}\n"
-        output += f"- **Prix total**: {prix_fmt}\n"
-        output += f"- **Horaires**: Départ {vol['heure_dep']} → Arrivée {vol['heure_arr']}\n"
-        output += f"- **Source**: {vol['source']}\n\n"
-        # AUCUN LIEN INDIVIDUEL ICI (C'est ce qui corrige votre problème)
+    for tache in done:
+        combinaison, nom = taches[tache]
+        try:
+            recus.setdefault(combinaison, {})[nom] = tache.result()
+        except Exception as e:
+            print(f"❌ Erreur {nom} {combinaison}: {e}")
+            recus.setdefault(combinaison, {})[nom] = None
     
-    output += f"---\n"
-    output += f"🔗 [Comparer toutes les options sur Skyscanner]({link_skyscanner})\n"
-    output += f"🔗 [Voir sur Google Flights]({link_google})\n"
+    echecs = 0
+    for combinaison, payload in recus.items():
+        resultats[combinaison] = payload
+        # Un fournisseur refusé (quota) ou hors délai n'est pas "sans vol" : rien en cache
+        if flight_cache.est_complet(payload):
+            flight_cache.store((code_dep, code_arr, *combinaison, adultes, enfants), payload)
+        else:
+            echecs += 1
+    if echecs:
+        print(f"⚠️ Calendrier de prix : {echecs} combinaisons incomplètes, non mises en cache")
+    return resultats
+
+def tableau_prix(resultats: dict) -> pd.DataFrame:
+    """Meilleur vol (prix > 0) de chaque combinaison : colonnes aller, retour, prix, vol."""
+    lignes = []
+    for (date_dep, date_ret), payload in resultats.items():
+        vols = [v for liste in payload.values() if liste for v in liste if v.get("prix")]
+        if vols:
+            meilleur = min(vols, key=lambda v: v["prix"])
+            lignes.append({"aller": date_dep, "retour": date_ret, "prix": meilleur["prix"], "vol": meilleur})
+    return pd.DataFrame(lignes, columns=["aller", "retour", "prix", "vol"])
+
+async def rechercher_vols_flexibles_async(code_dep: str, code_arr: str, date_dep: str, date_ret: str = None, adultes: int = 1, enfants: int = 0, jours: int = FLEX_JOURS_DEFAUT) -> RechercheVols:
+    """Calendrier de prix : le meilleur vol de chaque combinaison, les moins chères en premier."""
+    jours = max(1, min(jours, FLEX_MAX_JOURS))
+    combinaisons = grille_dates(date_dep, date_ret, jours)
+    print(f"📅 Calendrier de prix ±{jours}j : {len(combinaisons)} combinaisons")
     
-    return output
+    tableau = tableau_prix(await explorer_grille_prix_async(code_dep, code_arr, combinaisons, adultes, enfants))
+    vols = [
+        Vol.depuis_fournisseur(ligne.vol, aller=ligne.aller, retour=ligne.retour)
+        for ligne in tableau.sort_values("prix", kind="stable").itertuples()
+    ]
+    return RechercheVols(
+        code_dep, code_arr, date_dep, date_ret, adultes + enfants, vols=vols,
+        flexibilite=jours, couverture=f"{len(tableau)}/{len(combinaisons)}"
+    )
 
 # --- OUTIL PRINCIPAL ---
 
-def rechercher_vols(depart: str, arrivee: str, date_depart: str, adultes: int = 1, enfants: int = 0) -> str:
+def _flexibilite(date_depart: str, flexibilite_jours: int) -> int:
+    if not flexibilite_jours and FLEXIBLE_PATTERN.search(date_depart.lower()):
+        return FLEX_JOURS_DEFAUT
+    return flexibilite_jours
+
+def _recherche_depuis_resultats(resultats: dict, code_dep: str, code_arr: str, date_dep: str, date_ret: str, adultes: int, enfants: int) -> RechercheVols:
+    listes = [resultats.get(nom) or [] for nom in FLIGHT_PROVIDERS]
+    
+    estimation = not any(listes)
+    if estimation:
+        listes = [generer_vols_exemple(code_dep, code_arr, date_dep, date_ret, adultes, enfants)]
+    return RechercheVols(
+        code_dep, code_arr, date_dep, date_ret, adultes + enfants,
+        vols=comparer_vols(*listes), estimation=estimation
+    )
+
+def _publier_recherche(recherche: RechercheVols, adultes: int, enfants: int) -> str:
+    """Ajoute les liens, enregistre la recherche pour la requête et renvoie le résumé du modèle."""
+    args = (recherche.code_dep, recherche.code_arr, recherche.date_dep, recherche.date_ret, adultes, enfants)
+    recherche.liens = {
+        "Skyscanner": get_skyscanner_link(*args),
+        "Google Flights": get_google_flights_link(*args)
+    }
+    return enregistrer_recherche(recherche).resume()
+
+async def rechercher_vols_async(depart: str, arrivee: str, date_depart: str, adultes: int = 1, enfants: int = 0, flexibilite_jours: int = 0) -> str:
+    """Recherche de vols : les vols typés sont enregistrés pour la requête en cours
+    (tableau de l'interface et du PDF) ; le modèle ne reçoit qu'un résumé court."""
     date_dep, date_ret = extraire_dates(date_depart)
-    code_dep = trouver_code_iata(depart)
-    code_arr = trouver_code_iata(arrivee)
+    code_dep = await trouver_code_iata_async(depart)
+    code_arr = await trouver_code_iata_async(arrivee)
     
     if not code_dep or not code_arr: return f"❌ Codes introuvables."
     
-    print(f"🚀 RECHERCHE: {code_dep} -> {code_arr}")
-    
-    link_sky = get_skyscanner_link(code_dep, code_arr, date_dep, date_ret, adultes, enfants)
-    link_google = get_google_flights_link(code_dep, code_arr, date_dep, date_ret, adultes, enfants)
-    
-    vols_sky = search_skyscanner_api(code_dep, code_arr, date_dep, date_ret, adultes, enfants)
-    vols_serp = search_serpapi(code_dep, code_arr, date_dep, date_ret, adultes, enfants)
-    
-    if not vols_sky and not vols_serp:
-        vols_ex = generer_vols_exemple(code_dep, code_arr, date_dep, date_ret, adultes, enfants)
-        return compare_and_format_flights(vols_ex, [], link_sky, link_google, adultes, enfants)
-    
-    return compare_and_format_flights(vols_sky, vols_serp, link_sky, link_google, adultes, enfants)
+    flexibilite_jours = _flexibilite(date_depart, flexibilite_jours)
+    if flexibilite_jours:
+        recherche = await rechercher_vols_flexibles_async(code_dep, code_arr, date_dep, date_ret, adultes, enfants, flexibilite_jours)
+    else:
+        print(f"🚀 RECHERCHE: {code_dep} -> {code_arr}")
+        cle = (code_dep, code_arr, date_dep, date_ret, adultes, enfants)
+        # Une entrée périmée est rafraîchie en arrière-plan par le pool du cache (API synchrone)
+        resultats = flight_cache.lookup(cle, lambda: interroger_fournisseurs_vols(*cle))
+        if resultats is None:
+            resultats = await interroger_fournisseurs_vols_async(*cle)
+            flight_cache.store(cle, resultats)
+        recherche = _recherche_depuis_resultats(resultats, *cle)
+    return _publier_recherche(recherche, adultes, enfants)
+
+def rechercher_vols(depart: str, arrivee: str, date_depart: str, adultes: int = 1, enfants: int = 0, flexibilite_jours: int = 0) -> str:
+    return executer(rechercher_vols_async(depart, arrivee, date_depart, adultes, enfants, flexibilite_jours))
 
 # --- AUTRES OUTILS ---
 
-def consulter_meteo_reelle(destination: str) -> str:
-    lat, lon = get_lat_lon(destination)
+async def consulter_meteo_async(destination: str) -> str:
+    lat, lon = await geocoder_ville_async(destination)
     if not lat: return "Météo introuvable"
     try:
-        url = "https://api.open-meteo.com/v1/forecast"
-        p = {"latitude": lat, "longitude": lon, "current": "temperature_2m", "daily": "temperature_2m_max,temperature_2m_min"}
-        r = requests.get(url, params=p).json()
-        return f"Météo {destination}: Actu {r['current']['temperature_2m']}°C, Demain Max {r['daily']['temperature_2m_max'][1]}°C"
-    except: return "Erreur Météo"
+        # Même résultat (mis en cache) que le widget météo de l'interface
+        return _formater_meteo(destination, await get_forecast_async(lat, lon))
+    except Exception: return "Erreur Météo"
+
+def consulter_meteo_reelle(destination: str) -> str:
+    return executer(consulter_meteo_async(destination))
+
+def _formater_meteo(destination: str, r: dict) -> str:
+    return f"Météo {destination}: Actu {r['current']['temperature_2m']}°C, Demain Max {r['daily']['temperature_2m_max'][1]}°C"
 
 def recherche_web_contextuelle(requete: str, destination: str = None) -> str:
     if not SERPAPI_KEY: return "Pas de clé API"
     q = f"{requete} {destination or ''} tourism".strip()
     try:
         params = {"engine": "google", "q": q, "api_key": SERPAPI_KEY, "num": 3}
-        res = GoogleSearch(params).get_dict().get("organic_results", [])
+        response = http_get("serpapi_web", SERPAPI_URL, params=params)
+        response.raise_for_status()
+        res = response.json().get("organic_results", [])
         return "\n".join([f"- [{r['title']}]({r['link']})" for r in res]) if res else "Rien trouvé"
     except: return "Erreur Web"
 
+async def recherche_web_async(requete: str, destination: str = None) -> str:
+    return await asyncio.to_thread(recherche_web_contextuelle, requete, destination)
+
 AVAILABLE_TOOLS_MAP = {
     "consulter_meteo": consulter_meteo_reelle,
     "rechercher_infos_voyage": recherche_web_contextuelle,
     "rechercher_vols": rechercher_vols
 }
 
+# Même registre, en coroutines (mêmes noms et mêmes schémas)
+ASYNC_TOOLS_MAP = {
+    "consulter_meteo": consulter_meteo_async,
+    "rechercher_infos_voyage": recherche_web_async,
+    "rechercher_vols": rechercher_vols_async
+}
+
 TRAVEL_TOOL_SCHEMAS = [
     {
         "type": "function",
@@ -387,7 +738,11 @@ TRAVEL_TOOL_SCHEMAS = [
                     "depart": {"type": "string"}, "arrivee": {"type": "string"},
                     "date_depart": {"type": "string"},
                     "adultes": {"type": "integer", "default": 1},
-                    "enfants": {"type": "integer", "default": 0}
+                    "enfants": {"type": "integer", "default": 0},
+                    "flexibilite_jours": {
+                        "type": "integer", "default": 0,
+                        "description": "Dates flexibles : écart en jours (1 à 3) exploré autour de l'aller et du retour."
+                    }
                 },
                 "required": ["depart", "arrivee", "date_depart"]
             }
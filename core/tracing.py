@@ -0,0 +1,203 @@
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+# --- CONFIGURATION ---
+
+# Si défini, chaque trace terminée y est écrite au format Chrome (chrome://tracing, Perfetto)
+TRACE_EXPORT_DIR = os.getenv("TRACE_EXPORT_DIR")
+
+# Durées conservées par étape pour les percentiles (fenêtre glissante)
+STATS_FENETRE = 1000
+
+_trace_courante = contextvars.ContextVar("trace_courante", default=None)
+_span_courant = contextvars.ContextVar("span_courant", default=None)
+_ids = itertools.count(1)
+
+# --- SPANS ---
+
+@dataclass(slots=True)
+class Span:
+    id: int
+    nom: str
+    categorie: str
+    debut: float
+    parent: int = None
+    fin: float = None
+    thread: str = ""
+    attributs: dict = field(default_factory=dict)
+
+    @property
+    def duree(self) -> float:
+        return (self.fin if self.fin is not None else time.perf_counter()) - self.debut
+
+class Trace:
+    """Spans d'une requête. Les temps sont relatifs au début de la trace (perf_counter)."""
+
+    def __init__(self, nom: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.nom = nom
+        self.debut = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def ajouter(self, s: Span):
+        with self._lock:
+            self.spans.append(s)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "id": self.id,
+            "nom": self.nom,
+            "spans": [
+                {
+                    "id": s.id, "parent": s.parent, "nom": s.nom, "categorie": s.categorie,
+                    "debut_ms": round((s.debut - self.debut) * 1000, 3),
+                    "duree_ms": round(s.duree * 1000, 3),
+                    "thread": s.thread, "attributs": s.attributs
+                }
+                for s in sorted(spans, key=lambda s: s.debut)
+            ]
+        }
+
+    @classmethod
+    def depuis_dict(cls, donnees: dict) -> "Trace":
+        """Trace reconstruite depuis to_dict (ex: reçue d'un service de planification distant)."""
+        trace = cls(donnees["nom"])
+        trace.id = donnees["id"]
+        for s in donnees["spans"]:
+            debut = trace.debut + s["debut_ms"] / 1000
+            trace.spans.append(Span(
+                id=s["id"], nom=s["nom"], categorie=s["categorie"], debut=debut, parent=s["parent"],
+                fin=debut + s["duree_ms"] / 1000, thread=s["thread"], attributs=s["attributs"]
+            ))
+        return trace
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, default=str)
+
+    def to_chrome(self) -> dict:
+        """Format Chrome Trace Event (événements complets "X", en microsecondes)."""
+        threads = {}
+        evenements = []
+        for s in self.to_dict()["spans"]:
+            evenements.append({
+                "name": s["nom"], "cat": s["categorie"], "ph": "X",
+                "ts": round(s["debut_ms"] * 1000), "dur": round(s["duree_ms"] * 1000),
+                "pid": 1, "tid": threads.setdefault(s["thread"], len(threads) + 1),
+                "args": s["attributs"]
+            })
+        evenements += [
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": nom}}
+            for nom, tid in threads.items()
+        ]
+        return {"traceEvents": evenements, "displayTimeUnit": "ms", "otherData": {"trace": self.id, "nom": self.nom}}
+
+    @contextmanager
+    def activer(self):
+        """Rattache les spans suivants à cette trace (ex: export PDF après la fin de la requête)."""
+        jeton = _trace_courante.set(self)
+        try:
+            yield self
+        finally:
+            _trace_courante.reset(jeton)
+
+@contextmanager
+def span(nom: str, categorie: str = "etape", **attributs):
+    """Mesure un bloc. Le dictionnaire renvoyé accepte des attributs (usage tokens, cache...).
+
+    Sans trace active, rien n'est enregistré.
+    """
+    trace = _trace_courante.get()
+    if trace is None:
+        yield attributs
+        return
+    s = Span(
+        id=next(_ids), nom=nom, categorie=categorie, debut=time.perf_counter(),
+        parent=_span_courant.get(), thread=threading.current_thread().name, attributs=attributs
+    )
+    jeton = _span_courant.set(s.id)
+    try:
+        yield s.attributs
+    except BaseException as e:
+        s.attributs["erreur"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.fin = time.perf_counter()
+        _span_courant.reset(jeton)
+        trace.ajouter(s)
+
+@contextmanager
+def nouvelle_trace(nom: str):
+    """Trace d'une requête : à la sortie, durées agrégées et export éventuel."""
+    trace = Trace(nom)
+    jeton = _trace_courante.set(trace)
+    try:
+        with span(nom, categorie="requete"):
+            yield trace
+    finally:
+        _trace_courante.reset(jeton)
+        statistiques_spans.enregistrer(trace)
+        if TRACE_EXPORT_DIR:
+            exporter_chrome(trace, os.path.join(TRACE_EXPORT_DIR, f"{trace.id}.json"))
+
+def propager(fonction):
+    """Enveloppe `fonction` pour qu'elle s'exécute, dans un pool de threads, avec la trace et
+    le span parent de l'appelant (les contextvars ne suivent pas un executor.submit)."""
+    return functools.partial(contextvars.copy_context().run, fonction)
+
+def exporter_chrome(trace: Trace, chemin: str):
+    os.makedirs(os.path.dirname(chemin) or ".", exist_ok=True)
+    with open(chemin, "w", encoding="utf-8") as f:
+        json.dump(trace.to_chrome(), f, ensure_ascii=False, default=str)
+
+# --- AGRÉGATS PAR ÉTAPE ---
+
+def _percentile(valeurs: list, p: float) -> float:
+    """Percentile par interpolation linéaire sur une liste triée."""
+    if len(valeurs) == 1:
+        return valeurs[0]
+    rang = (len(valeurs) - 1) * p
+    bas = int(rang)
+    haut = min(bas + 1, len(valeurs) - 1)
+    return valeurs[bas] + (valeurs[haut] - valeurs[bas]) * (rang - bas)
+
+class StatistiquesSpans:
+    """Durées récentes par nom de span, pour les p50/p95 du processus."""
+
+    def __init__(self, fenetre: int = STATS_FENETRE):
+        self.fenetre = fenetre
+        self._durees = {}
+        self._lock = threading.Lock()
+
+    def enregistrer(self, trace: Trace):
+        with self._lock:
+            for s in trace.spans:
+                if s.fin is not None:
+                    self._durees.setdefault(s.nom, deque(maxlen=self.fenetre)).append(s.duree * 1000)
+
+    def percentiles(self) -> dict:
+        """{nom: {"n", "p50_ms", "p95_ms", "max_ms"}}."""
+        with self._lock:
+            durees = {nom: sorted(valeurs) for nom, valeurs in self._durees.items()}
+        return {
+            nom: {
+                "n": len(valeurs),
+                "p50_ms": round(_percentile(valeurs, 0.50), 1),
+                "p95_ms": round(_percentile(valeurs, 0.95), 1),
+                "max_ms": round(valeurs[-1], 1)
+            }
+            for nom, valeurs in durees.items()
+        }
+
+statistiques_spans = StatistiquesSpans()
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future
+from core.boucle import executer
+from core.geocoding import geocoder_ville_async
+from core.http import http_get_async
+
+# --- CONFIGURATION ---
+
+OPEN_METEO_URL = os.getenv("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+# Délai d'attente d'un appelant sur une requête déjà en vol (le timeout HTTP est dans core/http.py)
+OPEN_METEO_WAIT = 30
+
+# Open-Meteo recalcule les conditions "current" toutes les 15 minutes
+WEATHER_TTL = 15 * 60
+
+# Sur-ensemble des champs utilisés par l'outil consulter_meteo et par le widget Streamlit
+WEATHER_PARAMS = {
+    "current": "temperature_2m,weather_code,wind_speed_10m",
+    "daily": "temperature_2m_max,temperature_2m_min",
+    "timezone": "auto"
+}
+
+_cache = {}
+_inflight = {}
+_lock = threading.Lock()
+
+# --- SERVICE MÉTÉO ---
+
+class _RequeteAbandonnee(Exception):
+    """Le propriétaire d'une requête en vol a été annulé : ses attentes la relancent."""
+
+def _cle(lat: float, lon: float) -> tuple:
+    # ~1 km de précision : deux géocodages d'une même ville tombent sur la même entrée
+    return round(lat, 2), round(lon, 2)
+
+def _reserver(cle: tuple):
+    """(données en cache, None, False) si fraîches ; sinon (None, requête en vol, propriétaire ?)."""
+    with _lock:
+        entree = _cache.get(cle)
+        if entree and entree[0] > time.monotonic():
+            return entree[1], None, False
+        future = _inflight.get(cle)
+        proprietaire = future is None
+        if proprietaire:
+            future = Future()
+            _inflight[cle] = future
+        return None, future, proprietaire
+
+def _publier(cle: tuple, future: Future, data: dict = None, erreur: Exception = None):
+    with _lock:
+        if erreur is None:
+            _cache[cle] = (time.monotonic() + WEATHER_TTL, data)
+        _inflight.pop(cle, None)
+    if erreur is None:
+        future.set_result(data)
+    else:
+        future.set_exception(erreur)
+
+async def get_forecast_async(lat: float, lon: float) -> dict:
+    """Prévisions Open-Meteo pour (lat, lon), servies depuis le cache si encore fraîches.
+
+    Les appels concurrents pour un même point partagent une seule requête en vol, y compris
+    depuis une autre boucle (attendue via asyncio.wrap_future).
+    Lève une exception si Open-Meteo échoue.
+    """
+    cle = _cle(lat, lon)
+    while True:
+        data, future, proprietaire = _reserver(cle)
+        if data is not None:
+            return data
+        if proprietaire:
+            break
+        try:
+            # shield : un appelant qui abandonne n'annule pas la requête partagée
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), OPEN_METEO_WAIT)
+        except _RequeteAbandonnee:
+            continue
+
+    try:
+        params = {"latitude": cle[0], "longitude": cle[1], **WEATHER_PARAMS}
+        response = await http_get_async("open_meteo", OPEN_METEO_URL, params=params)
+        response.raise_for_status()
+        data = response.json()
+    except Exception as e:
+        _publier(cle, future, erreur=e)
+        raise
+    except BaseException:
+        # Annulation du propriétaire (ex: délai de son outil) : pas propagée aux autres appelants,
+        # l'entrée en vol est libérée et le prochain à se réveiller relance la requête
+        _publier(cle, future, erreur=_RequeteAbandonnee())
+        raise
+    _publier(cle, future, data)
+    return data
+
+def get_forecast(lat: float, lon: float) -> dict:
+    return executer(get_forecast_async(lat, lon))
+
+async def get_forecast_ville_async(ville: str):
+    """Prévisions pour une ville, ou None si la ville est introuvable ou l'API en erreur."""
+    lat, lon = await geocoder_ville_async(ville)
+    if lat is None:
+        return None
+    try:
+        return await get_forecast_async(lat, lon)
+    except Exception as e:
+        print(f"❌ Erreur Open-Meteo {ville}: {e}")
+        return None
+
+def get_forecast_ville(ville: str):
+    return executer(get_forecast_ville_async(ville))
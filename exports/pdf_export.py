@@ -1,67 +1,277 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from core.flight_records import developper_references
+from core.tracing import span
 from fpdf import FPDF
-from datetime import datetime
-from io import BytesIO
+
+# --- CONFIGURATION ---
+
+# Police Unicode optionnelle (ex: DejaVuSans.ttf) ; à défaut, Helvetica + table Latin-1
+PDF_FONT_PATH = os.getenv("PDF_FONT_PATH")
+PDF_FONT_BOLD_PATH = os.getenv("PDF_FONT_BOLD_PATH")
+
+PDF_CACHE_SIZE = 32
+
+TAILLES_TITRES = {1: 15, 2: 14, 3: 12}
+TAILLE_TEXTE = 11
+INTERLIGNE = 6
+RETRAIT_LISTE = 5
+
+TITRE_PATTERN = re.compile(r"^(#{1,6})\s+(.*)$")
+LISTE_PATTERN = re.compile(r"^(\s*)([-*+]|\d+[.)])\s+(.*)$")
+REGLE_PATTERN = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+SEPARATEUR_TABLEAU_PATTERN = re.compile(r"^\|?[\s:|-]+\|?$")
+# Italique markdown (*x* ou _x_) -> marqueur italique fpdf2 (__x__)
+ITALIQUE_PATTERN = re.compile(r"(?<![*\w])\*(?!\*)([^*\n]+?)\*(?!\*)|(?<![_\w])_(?!_)([^_\n]+?)_(?!_)")
+BALISAGE_PATTERN = re.compile(r"[*_\[]")
+# Marqueurs fpdf2 sans équivalent dans le plan (souligné, barré) : échappés pour rester littéraux
+MARQUEURS_FPDF_PATTERN = re.compile(r"(--|~~|__)")
+# Lien markdown ; l'URL accepte un niveau de parenthèses équilibrées (.../wiki/Bali_(province))
+_URL = r"((?:[^()\s]|\([^()\s]*\))+)"
+LIEN_PATTERN = re.compile(r"\[([^\]\[]+)\]\(" + _URL + r"\)")
+
+# --- TRANSLITTÉRATION (UNE SEULE PASSE str.translate) ---
+
+class _TableTraduction(dict):
+    """Table str.translate : remplacements connus, puis suppression à la volée des
+    caractères non affichables (mémorisée dans la table au premier passage)."""
+
+    def __init__(self, remplacements: dict, affichable):
+        super().__init__({ord(c): r for c, r in remplacements.items()})
+        self._affichable = affichable
+
+    def __missing__(self, code: int):
+        valeur = code if self._affichable(code) else None
+        self[code] = valeur
+        return valeur
+
+REMPLACEMENTS_LATIN1 = {
+    "€": " EUR", "œ": "oe", "Œ": "OE", "’": "'", "‘": "'", "“": '"', "”": '"',
+    "…": "...", "–": "-", "—": "-", "→": "->", "←": "<-", "•": "·", "≈": "~",
+    " ": " ", " ": " "
+}
+
+TABLE_LATIN1 = _TableTraduction(REMPLACEMENTS_LATIN1, lambda code: code <= 0xFF)
+
+# Tables des polices Unicode, par fichiers de police (remplies au fil des documents)
+_TABLES_POLICE = {}
+_tables_lock = threading.Lock()
+
+def table_police(chemins: tuple, glyphes_police) -> _TableTraduction:
+    """Table d'une police Unicode : garde ce que la police dessine (emojis compris s'ils y sont),
+    translittère le reste quand c'est possible (€, →...) et supprime ce qui ne s'affiche pas."""
+    with _tables_lock:
+        table = _TABLES_POLICE.get(chemins)
+        if table is None:
+            glyphes = glyphes_police()
+            remplacements = {c: r for c, r in REMPLACEMENTS_LATIN1.items() if ord(c) not in glyphes}
+            table = _TABLES_POLICE[chemins] = _TableTraduction(
+                remplacements, lambda code: code < 0x20 or code in glyphes
+            )
+        return table
+
+def sanitize_text(text: str, table: dict = TABLE_LATIN1) -> str:
+    """Nettoie le texte pour la police utilisée (Latin-1 par défaut), en une passe."""
+    return text.translate(table)
+
+# --- DOCUMENT ---
 
 class PDF(FPDF):
     """Classe personnalisée pour le PDF avec en-tête et pied de page."""
+    # Liens dont l'URL contient des parenthèses (le motif par défaut de fpdf2 les refuse)
+    MARKDOWN_LINK_REGEX = re.compile(r"^\[([^][]+)\]\(" + _URL + r"\)(.*)$", re.DOTALL)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.police = "Helvetica"
+        self.table_texte = TABLE_LATIN1
+        if PDF_FONT_PATH and os.path.exists(PDF_FONT_PATH):
+            gras = PDF_FONT_BOLD_PATH if PDF_FONT_BOLD_PATH and os.path.exists(PDF_FONT_BOLD_PATH) else PDF_FONT_PATH
+            for style, chemin in (("", PDF_FONT_PATH), ("I", PDF_FONT_PATH), ("B", gras), ("BI", gras)):
+                self.add_font("Unicode", style, chemin)
+            self.police = "Unicode"
+            # Caractères dessinés à la fois par la police normale et par la grasse
+            self.table_texte = table_police(
+                (PDF_FONT_PATH, gras), lambda: set(self.fonts["unicode"].cmap) & set(self.fonts["unicodeB"].cmap)
+            )
+
     def header(self):
-        # Utilisation de Helvetica (standard core font) pour éviter les warnings
-        self.set_font('Helvetica', 'B', 15)
+        self.set_font(self.police, 'B', 15)
         self.set_fill_color(200, 220, 255)
-        self.cell(0, 10, 'Plan de Voyage Autonome', border=0, new_x="LMARGIN", new_y="NEXT", align='C', fill=True) 
+        self.cell(0, 10, 'Plan de Voyage Autonome', border=0, new_x="LMARGIN", new_y="NEXT", align='C', fill=True)
         self.ln(5)
 
     def footer(self):
         self.set_y(-15)
-        self.set_font('Helvetica', 'I', 8)
+        self.set_font(self.police, 'I', 8)
         self.cell(0, 10, f'Page {self.page_no()}/{{nb}}', align='C')
 
-def sanitize_text(text: str) -> str:
-    """Nettoie le texte pour l'encodage Latin-1."""
-    replacements = {
-        "€": " EUR", "œ": "oe", "Œ": "OE", "’": "'", "…": "...",
-        "–": "-", "—": "-", "«": '"', "»": '"',
-        "ç": "c", "Ç": "C"
-    }
-    for char, replacement in replacements.items():
-        text = text.replace(char, replacement)
-    return text
-
-def generate_trip_pdf(trip_data, final_plan: str) -> bytes:
+# --- RENDU MARKDOWN ---
+
+def _ecrire(pdf: PDF, texte: str):
+    """Paragraphe ; l'analyse markdown de fpdf2 (coûteuse) n'est activée que si la ligne en contient."""
+    if BALISAGE_PATTERN.search(texte):
+        pdf.multi_cell(0, INTERLIGNE, _en_ligne(texte), markdown=True, new_x="LMARGIN", new_y="NEXT")
+    else:
+        pdf.multi_cell(0, INTERLIGNE, texte, new_x="LMARGIN", new_y="NEXT")
+
+def _texte_en_ligne(texte: str) -> str:
+    texte = texte.replace("\\", "\\\\")
+    texte = MARQUEURS_FPDF_PATTERN.sub(r"\\\1", texte)
+    return ITALIQUE_PATTERN.sub(lambda m: f"__{m.group(1) or m.group(2)}__", texte)
+
+def _en_ligne(texte: str) -> str:
+    """Markdown en ligne -> balisage fpdf2 : **gras**, *italique*, [liens](url) cliquables.
+
+    Seul le texte visible est échappé : l'URL des liens est transmise telle quelle.
+    """
+    morceaux, debut = [], 0
+    for lien in LIEN_PATTERN.finditer(texte):
+        morceaux.append(_texte_en_ligne(texte[debut:lien.start()]))
+        morceaux.append(f"[{_texte_en_ligne(lien.group(1))}]({lien.group(2)})")
+        debut = lien.end()
+    morceaux.append(_texte_en_ligne(texte[debut:]))
+    return "".join(morceaux)
+
+def _rendre_tableau(pdf: PDF, lignes: list):
+    cellules = [[c.strip() for c in ligne.strip().strip("|").split("|")] for ligne in lignes]
+    largeur = max(len(r) for r in cellules)
+    pdf.set_font(pdf.police, '', 9)
+    with pdf.table(markdown=True, line_height=5, text_align="CENTER", first_row_as_headings=True) as tableau:
+        for ligne in cellules:
+            rangee = tableau.row()
+            for cellule in ligne + [""] * (largeur - len(ligne)):
+                rangee.cell(_en_ligne(cellule))
+    pdf.set_font(pdf.police, '', TAILLE_TEXTE)
+    pdf.ln(2)
+
+def rendre_vols(pdf: PDF, recherches: list):
+    """Tableaux des vols construits directement depuis les enregistrements (pas depuis le plan)."""
+    table = pdf.table_texte
+    for recherche in recherches:
+        trajet = f"{recherche.code_dep} -> {recherche.code_arr}"
+        if recherche.estimation:
+            trajet += " (estimations)"
+        pdf.set_font(pdf.police, 'B', TAILLES_TITRES[3])
+        pdf.cell(0, 8, f"Vols {trajet} - prix total, {recherche.voyageurs} voyageur(s)", new_x="LMARGIN", new_y="NEXT")
+        if recherche.vols:
+            dates = any(v.aller for v in recherche.vols)
+            entetes = ["N°", *(["Aller", "Retour"] if dates else []), "Compagnie", "Prix", "Départ", "Arrivée", "Source"]
+            pdf.set_font(pdf.police, '', 9)
+            with pdf.table(line_height=5, text_align="CENTER", first_row_as_headings=True) as tableau:
+                tableau.row(entetes)
+                for v in recherche.vols:
+                    cellules = [v.id, *([v.aller or "", v.retour or "aller simple"] if dates else []),
+                                v.compagnie, f"{v.prix} {v.devise}", v.heure_dep, v.heure_arr, v.source]
+                    tableau.row([sanitize_text(str(c), table) for c in cellules])
+        pdf.set_font(pdf.police, '', TAILLE_TEXTE)
+        liens = " | ".join(f"[{nom}]({url})" for nom, url in recherche.liens.items())
+        if liens:
+            _ecrire(pdf, liens)
+        pdf.ln(3)
+
+def rendre_markdown(pdf: PDF, texte: str):
+    """Rendu ligne à ligne (une seule passe) : titres, listes, règles, tableaux, paragraphes."""
+    pdf.set_font(pdf.police, '', TAILLE_TEXTE)
+    tableau = []
+    for ligne in texte.splitlines():
+        if ligne.lstrip().startswith("|"):
+            if not SEPARATEUR_TABLEAU_PATTERN.match(ligne.strip()):
+                tableau.append(ligne)
+            continue
+        if tableau:
+            _rendre_tableau(pdf, tableau)
+            tableau = []
+
+        if not ligne.strip():
+            pdf.ln(INTERLIGNE / 2)
+        elif (m := TITRE_PATTERN.match(ligne)):
+            niveau = len(m.group(1))
+            pdf.ln(2)
+            pdf.set_font(pdf.police, 'B', TAILLES_TITRES.get(niveau, TAILLE_TEXTE))
+            pdf.multi_cell(0, INTERLIGNE + 2, m.group(2).replace("**", "").strip(), new_x="LMARGIN", new_y="NEXT")
+            pdf.set_font(pdf.police, '', TAILLE_TEXTE)
+        elif REGLE_PATTERN.match(ligne):
+            y = pdf.get_y() + 1
+            pdf.line(pdf.l_margin, y, pdf.w - pdf.r_margin, y)
+            pdf.ln(3)
+        elif (m := LISTE_PATTERN.match(ligne)):
+            retrait, puce, contenu = m.groups()
+            niveau = len(retrait.expandtabs(4)) // 2
+            pdf.set_x(pdf.l_margin + RETRAIT_LISTE * niveau)
+            pdf.cell(RETRAIT_LISTE + 1, INTERLIGNE, "·" if not puce[0].isdigit() else puce)
+            _ecrire(pdf, contenu)
+        else:
+            _ecrire(pdf, ligne.strip())
+    if tableau:
+        _rendre_tableau(pdf, tableau)
+
+# --- CACHE PAR CONTENU ---
+
+_pdf_cache = OrderedDict()
+_pdf_cache_lock = threading.Lock()
+
+def empreinte_pdf(trip_data, final_plan: str, vols: list = None) -> str:
+    contenu = trip_data.model_dump_json() + "\n" + final_plan
+    if vols:
+        contenu += "\n" + json.dumps([r.to_dict() for r in vols], ensure_ascii=False)
+    return hashlib.sha256(contenu.encode("utf-8")).hexdigest()
+
+def generate_trip_pdf(trip_data, final_plan: str, vols: list = None) -> bytes:
+    """PDF du voyage, rendu une seule fois par contenu (voyage + plan + vols).
+
+    `vols` : recherches de vols de la requête (result["vols"]) ; leurs tableaux sont
+    rendus depuis les données et les références [V1] du plan sont développées.
+    """
+    with span("pdf", categorie="export") as attributs:
+        cle = empreinte_pdf(trip_data, final_plan, vols)
+        with _pdf_cache_lock:
+            pdf_bytes = _pdf_cache.get(cle)
+            if pdf_bytes is not None:
+                _pdf_cache.move_to_end(cle)
+                attributs["cache"] = True
+                return pdf_bytes
+
+        pdf_bytes = rendre_pdf(trip_data, final_plan, vols)
+        attributs.update(cache=False, octets=len(pdf_bytes))
+        with _pdf_cache_lock:
+            _pdf_cache[cle] = pdf_bytes
+            while len(_pdf_cache) > PDF_CACHE_SIZE:
+                _pdf_cache.popitem(last=False)
+        return pdf_bytes
+
+def rendre_pdf(trip_data, final_plan: str, vols: list = None) -> bytes:
     pdf = PDF('P', 'mm', 'A4')
     pdf.set_auto_page_break(auto=True, margin=15)
     pdf.alias_nb_pages()
     pdf.add_page()
-    
-    # Nettoyage
-    safe_plan = sanitize_text(final_plan)
-    safe_dest = sanitize_text(trip_data.destination)
-    safe_dates = sanitize_text(trip_data.dates)
-    
-    # Remplacer le markdown basique
-    content_for_pdf = safe_plan.replace("###", "\n\n").replace("**", "").replace("##", "\n")
+    table = pdf.table_texte
 
     # Métadonnées
-    pdf.set_font('Helvetica', 'B', 16)
-    pdf.cell(0, 10, f"Destination : {safe_dest}", new_x="LMARGIN", new_y="NEXT", align='L')
+    pdf.set_font(pdf.police, 'B', 16)
+    pdf.cell(0, 10, f"Destination : {sanitize_text(trip_data.destination, table)}", new_x="LMARGIN", new_y="NEXT", align='L')
     pdf.ln(2)
 
-    pdf.set_font('Helvetica', '', 12)
-    pdf.cell(0, 7, f"Dates : {safe_dates}", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font(pdf.police, '', 12)
+    if trip_data.multi_destinations:
+        circuit = " → ".join([trip_data.origin, *trip_data.etapes, trip_data.origin])
+        pdf.multi_cell(0, 7, f"Circuit : {sanitize_text(circuit, table)}", new_x="LMARGIN", new_y="NEXT")
+    pdf.cell(0, 7, f"Dates : {sanitize_text(trip_data.dates, table)}", new_x="LMARGIN", new_y="NEXT")
     pdf.cell(0, 7, f"Voyageurs : {trip_data.voyageurs.adultes} ad., {trip_data.voyageurs.enfants} enf.", new_x="LMARGIN", new_y="NEXT")
-    pdf.cell(0, 7, f"Budget : {trip_data.preferences.budget}", new_x="LMARGIN", new_y="NEXT")
+    pdf.cell(0, 7, f"Budget : {sanitize_text(trip_data.preferences.budget, table)}", new_x="LMARGIN", new_y="NEXT")
     pdf.ln(5)
 
+    if vols:
+        rendre_vols(pdf, vols)
+
     # Contenu
-    pdf.set_font('Helvetica', 'B', 14)
-    pdf.cell(0, 10, "Itineraire Detaille :", new_x="LMARGIN", new_y="NEXT")
-    pdf.set_font('Helvetica', '', 11)
-    
-    try:
-        pdf.multi_cell(0, 6, content_for_pdf)
-    except Exception:
-        # Fallback ASCII brutal si latin-1 échoue encore
-        pdf.multi_cell(0, 6, content_for_pdf.encode('ascii', 'ignore').decode('ascii'))
-    
+    pdf.set_font(pdf.police, 'B', 14)
+    pdf.cell(0, 10, "Itinéraire détaillé :", new_x="LMARGIN", new_y="NEXT")
+    rendre_markdown(pdf, sanitize_text(developper_references(final_plan, vols), table))
+
     # Output compatible Streamlit (sans dest='S')
-    return bytes(pdf.output())
\ No newline at end of file
+    return bytes(pdf.output())
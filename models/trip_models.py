@@ -16,4 +16,10 @@ class VoyageRequest(BaseModel):
     dates: str = Field(description="Dates ou période du voyage")
     voyageurs: Voyageur
     preferences: Preferences
-    raw_input: str = Field(description="Le texte brut saisi par l'utilisateur")
\ No newline at end of file
+    raw_input: str = Field(description="Le texte brut saisi par l'utilisateur")
+    etapes: List[str] = Field(default_factory=list, description="Villes d'un circuit multi-destinations, dans l'ordre de visite (vide pour un aller-retour simple)")
+    ordre_libre: bool = Field(default=False, description="Vrai si l'utilisateur laisse libre l'ordre des étapes")
+
+    @property
+    def multi_destinations(self) -> bool:
+        return len(self.etapes) > 1
\ No newline at end of file